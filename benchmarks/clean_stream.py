@@ -0,0 +1,64 @@
+# benchmarks/clean_stream.py - Peak memory of the streaming cleaner vs input size
+# Run from the repo root: python -m benchmarks.clean_stream [n_rows ...]
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from clean_311_data import RAW_COLUMNS
+
+def write_raw_export(path, n_rows, chunk=1_000_000, seed=0):
+    """Write a synthetic export with the real column names and date format"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2010-01-01').value // 10**9
+    end = pd.Timestamp('2025-12-21').value // 10**9
+    for offset in range(0, n_rows, chunk):
+        n = min(chunk, n_rows - offset)
+        seconds = rng.integers(start, end, n)
+        frame = pd.DataFrame({
+            'Unique Key': np.arange(offset, offset + n),
+            'Created Date': pd.to_datetime(seconds, unit='s').strftime('%m/%d/%Y %I:%M:%S %p'),
+            'Problem (formerly Complaint Type)': rng.choice(['Noise - Residential', 'Graffiti',
+                                                             'Heat/Hot Water', 'Street Condition'], n),
+            'Latitude': rng.uniform(40.3, 41.1, n),
+            'Longitude': rng.uniform(-74.4, -73.6, n),
+            'Borough': rng.choice(['MANHATTAN', 'BROOKLYN', 'QUEENS', 'BRONX', 'STATEN ISLAND'], n),
+            'Agency': 'NYPD',
+        })
+        frame.to_csv(path, mode='a' if offset else 'w', header=offset == 0, index=False)
+
+CHILD = """
+import sys
+from clean_311_data import clean_311_data, peak_rss_mb
+clean_311_data(sys.argv[1], sys.argv[2])
+print(peak_rss_mb())
+"""
+
+def run(n_rows, workdir):
+    raw = os.path.join(workdir, f'raw_{n_rows}.csv')
+    out = os.path.join(workdir, f'clean_{n_rows}')
+    # Generate in a separate process: Linux keeps ru_maxrss across exec, so
+    # the cleaner would otherwise inherit the generator's peak
+    writer = multiprocessing.Process(target=write_raw_export, args=(raw, n_rows))
+    writer.start()
+    writer.join()
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, raw, out],
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    peak = float(result.stdout.strip().splitlines()[-1])
+
+    size_mb = os.path.getsize(raw) / 1e6
+    print(f"{n_rows:>11,} rows ({size_mb:7.0f} MB) | {elapsed:7.1f}s | peak RSS {peak:6.0f} MB")
+    os.remove(raw)
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000_000, 5_000_000, 20_000_000]
+    print(f"⏱️  Streaming cleaner benchmark (columns: {', '.join(RAW_COLUMNS.values())})\n")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            run(n, workdir)
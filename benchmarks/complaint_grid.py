@@ -0,0 +1,48 @@
+# benchmarks/complaint_grid.py - Area counts: KD-tree over raw complaints vs the complaint grid
+# Run from the repo root: python -m benchmarks.complaint_grid [n_complaints ...]
+import sys
+import time
+import numpy as np
+from complaint_grid import ComplaintGrid, add_levels, count_cells, ledger_entries, pivot_counts
+from spatial import build_point_index, query_radius
+from benchmarks.spatial_index import random_centers
+from benchmarks.tiles import synthetic_complaints
+
+AREA_COUNTS = [500, 5000]
+
+def kd_tree_counts(complaints, centers, radius_km=1.0):
+    """What extract_311_features.py used to do: a KD-tree over every complaint, then count per area"""
+    tree = build_point_index(complaints['latitude'].values, complaints['longitude'].values)
+    codes, _ = complaints['complaint_type'].factorize(sort=True)
+    return np.array([np.bincount(codes[rows], minlength=codes.max() + 1)
+                     for rows in query_radius(tree, centers, radius_km)])
+
+def grid_counts(grid, centers, radius_km=1.0):
+    counts = grid.radius_counts([c['lat'] for c in centers], [c['lon'] for c in centers], radius_km)
+    by_family, _ = pivot_counts(counts, len(centers))
+    return by_family.to_numpy()
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000_000, 5_000_000]
+
+    print(f"⏱️  Complaints within 1 km per area: KD-tree vs complaint grid\n")
+    print(f"  {'complaints':>11}  {'grid rows':>10}  {'grid build':>10}  {'areas':>6}  "
+          f"{'KD-tree':>8}  {'grid':>8}  {'faster':>7}  {'mean error':>10}")
+    for n in sizes:
+        complaints = synthetic_complaints(n, '2025-01-01', 180)
+        cells, build_seconds = timed(lambda: add_levels(count_cells(ledger_entries(complaints, 0))))
+        grid = ComplaintGrid(cells)
+        for n_areas in AREA_COUNTS:
+            centers = random_centers(n_areas)
+            exact, kd_seconds = timed(kd_tree_counts, complaints, centers)
+            approx, grid_seconds = timed(grid_counts, grid, centers)
+            totals = exact.sum(axis=1)
+            error = np.mean(np.abs(approx.sum(axis=1) - totals) / np.maximum(totals, 1))
+            print(f"  {n:>11,}  {len(cells):>10,}  {build_seconds:>9.2f}s  {n_areas:>6,}  "
+                  f"{kd_seconds:>7.2f}s  {grid_seconds:>7.2f}s  {kd_seconds / grid_seconds:>6.1f}x  "
+                  f"{error:>9.2%}")
@@ -0,0 +1,78 @@
+# benchmarks/complaint_store.py - Memory per row and query time: complaint frame vs compact store
+# Run from the repo root: python -m benchmarks.complaint_store [n_complaints ...]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from complaint_store import ComplaintStore
+from storage import load_table, save_table
+from benchmarks.tiles import synthetic_complaints
+
+BOROUGHS = np.array(['BRONX', 'BROOKLYN', 'MANHATTAN', 'QUEENS', 'STATEN ISLAND'])
+
+def realistic_complaints(n, seed=0):
+    """synthetic_complaints with generator-style keys (REAL_<hood>_<i>_<stamp>) and all five boroughs"""
+    rng = np.random.default_rng(seed)
+    complaints = synthetic_complaints(n, '2025-01-01', 180, seed=seed)
+    stamps = (complaints['created_date'].astype('int64') // 10**9).astype(str).to_numpy()
+    hoods = np.array(['Midtown', 'Upper_East_Side', 'Williamsburg', 'Astoria', 'Mott_Haven'])[rng.integers(0, 5, n)]
+    keys = pd.Series(hoods, dtype=object) + '_' + pd.Series(np.arange(n).astype(str), dtype=object)
+    return complaints.assign(unique_key='REAL_' + keys + '_' + stamps,
+                             borough=BOROUGHS[rng.integers(0, len(BOROUGHS), n)])
+
+def frame_query(df, since, until, bbox, complaint_type):
+    lat0, lon0, lat1, lon1 = bbox
+    created = df['created_date']
+    return np.flatnonzero(((created >= since) & (created < until) &
+                           df['latitude'].between(lat0, lat1) & df['longitude'].between(lon0, lon1) &
+                           (df['complaint_type'] == complaint_type)).to_numpy())
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000_000, 5_000_000]
+    since, until = pd.Timestamp('2025-03-01'), pd.Timestamp('2025-04-01')
+    bbox = (40.70, -74.02, 40.80, -73.93)
+
+    print("⏱️  Complaint frame (load_table) vs compact store\n")
+    repo = os.getcwd()
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                save_table(realistic_complaints(n), 'complaints')
+                df = load_table('complaints')
+                frame_bytes = df.memory_usage(deep=True).sum()
+                object_bytes = df.astype({c: object for c in df.columns if c != 'created_date'}
+                                         ).memory_usage(deep=True).sum()
+                store, build_seconds = timed(ComplaintStore.from_frame, df)
+                store.save('store')
+
+                mapped, open_seconds = timed(ComplaintStore.open, 'store')
+                copied = sum(not isinstance(values, np.memmap) for values in mapped.columns.values())
+
+                rows, frame_seconds = timed(frame_query, df, since, until, bbox, 'Noise')
+                # Frame rows are in file order, the store's in time order: compare the keys
+                expected = np.sort(mapped.find(df['unique_key'].iloc[rows]))
+                found, store_seconds = timed(mapped.select, since=since, until=until, bbox=bbox, types=['Noise'])
+                radius, radius_seconds = timed(mapped.within, 40.75, -73.98, 1.0)
+            finally:
+                os.chdir(repo)
+
+        print(f"  {n:,} complaints")
+        print(f"    frame, pandas strings  {frame_bytes / n:6.0f} bytes/row  ({frame_bytes / 1e6:,.0f} MB)")
+        print(f"    frame, object strings  {object_bytes / n:6.0f} bytes/row  ({object_bytes / 1e6:,.0f} MB)")
+        print(f"    compact store          {store.nbytes / n:6.0f} bytes/row  ({store.nbytes / 1e6:,.0f} MB, "
+              f"built in {build_seconds:.2f}s)")
+        print(f"    memory-mapped open     {open_seconds * 1000:6.1f} ms, {copied} of {len(mapped.columns)} "
+              f"columns copied into memory")
+        # float32 coordinates can move a point sitting within ~0.5 m of the box edge across it
+        print(f"    1 month + bbox + type  frame {frame_seconds * 1000:7.1f} ms   store {store_seconds * 1000:7.1f} ms  "
+              f"({len(np.intersect1d(found, expected)):,} rows in both, {len(expected):,} frame, "
+              f"{len(found):,} store)")
+        print(f"    1 km radius            store {radius_seconds * 1000:7.1f} ms  ({len(radius):,} rows)\n")
@@ -0,0 +1,78 @@
+# benchmarks/delta_updates.py - Refreshing area counts: full recount vs applying the delta
+# Run from the repo root: python -m benchmarks.delta_updates [n_complaints] [n_areas]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import complaint_grid
+import extract_311_features
+from storage import append_table, load_table
+from sync_311 import PARTITION_BY
+from benchmarks.spatial_index import random_centers
+from benchmarks.tiles import synthetic_complaints
+
+DELTAS = [1_000, 10_000]
+
+def refresh(count, full=False):
+    """What a pipeline run does: bring the grid, then the per-area counts, up to date"""
+    complaint_grid.update_grid(full=full)
+    return extract_311_features.update_area_counts(count, {'benchmark': True}, full=full)
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def quietly(fn, *args, **kwargs):
+    """Call fn with the pipeline's progress output going nowhere"""
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sys.stdout = stdout
+
+def add_delta(history, n_new, seed):
+    """n_new complaints: 80% new, 15% fixes of earlier ones (moved / retyped / re-boroughed / re-dated),
+    5% retractions"""
+    rng = np.random.default_rng(seed)
+    n_fixes, n_retracted = n_new * 15 // 100, n_new * 5 // 100
+    new = synthetic_complaints(n_new - n_fixes - n_retracted, '2025-07-01', 1, seed=seed)
+    fixes = history.iloc[rng.choice(len(history), n_fixes, replace=False)].copy()
+    fixes['latitude'] += rng.normal(0, 0.005, n_fixes)
+    fixes['complaint_type'] = 'Noise'
+    # Moved to another borough, so the fix lands in an earlier partition than the original
+    fixes['borough'] = 'BROOKLYN'
+    # and half of them re-dated past everything counted so far
+    fixes.iloc[:n_fixes // 2, fixes.columns.get_loc('created_date')] = pd.Timestamp('2025-07-02')
+    append_table(new, 'complaints', partition_by=PARTITION_BY)
+    append_table(fixes, 'complaints', partition_by=PARTITION_BY)
+    complaint_grid.retract(history['unique_key'].iloc[rng.choice(len(history), n_retracted, replace=False)])
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_areas = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    repo = os.getcwd()
+
+    print(f"⏱️  Refreshing 1 km counts for {n_areas:,} areas over {n:,} complaints\n")
+    print(f"  {'delta':>7}  {'full':>8}  {'delta':>8}  {'faster':>7}  same counts")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            history = synthetic_complaints(n, '2025-01-01', 180)
+            append_table(history, 'complaints', partition_by=PARTITION_BY)
+            *_, count = quietly(extract_311_features.neighborhood_areas, random_centers(n_areas))
+            quietly(refresh, count)
+
+            for i, n_new in enumerate(DELTAS):
+                add_delta(history, n_new, seed=i + 1)
+                _, delta_seconds = quietly(timed, refresh, count)
+                incremental = load_table('area_counts')
+                _, full_seconds = quietly(timed, refresh, count, full=True)
+                differing = quietly(extract_311_features.check_area_counts, incremental, count)
+                print(f"  {n_new:>7,}  {full_seconds:>7.2f}s  {delta_seconds:>7.2f}s  "
+                      f"{full_seconds / delta_seconds:>6.1f}x  {len(differing) == 0}")
+        finally:
+            os.chdir(repo)
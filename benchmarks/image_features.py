@@ -0,0 +1,64 @@
+# benchmarks/image_features.py - Image feature extraction: legacy vs fused/multi-core/draft
+# Run from the repo root: python -m benchmarks.image_features [n_images]
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from extract_image_features import METRICS, batch_image_features
+
+def legacy_image_features(image_path):
+    """The original implementation: full decode plus several separate passes"""
+    img_array = np.array(Image.open(image_path).convert('RGB'))
+    avg_red = np.mean(img_array[:, :, 0])
+    avg_green = np.mean(img_array[:, :, 1])
+    avg_blue = np.mean(img_array[:, :, 2])
+    return {
+        'brightness': np.mean(img_array),
+        'green_ratio': avg_green / (avg_red + avg_blue + 1),
+        'blue_ratio': avg_blue / (avg_red + avg_green + 1),
+        'color_variance': np.var(img_array),
+        'brightness_variance': np.var(np.mean(img_array, axis=2)),
+    }
+
+def write_street_like_jpeg(path, seed):
+    """400x400 JPEG with a sky gradient, a green band and noise (Street View-ish)"""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, 400)[:, None, None]
+    base = np.concatenate([180 - 80 * y, 170 - 40 * y + 30 * (y > 0.6), 220 - 150 * y], axis=2)
+    img = np.clip(base + rng.normal(0, 25, (400, 400, 3)), 0, 255).astype(np.uint8)
+    Image.fromarray(img).save(path, quality=85)
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:7.1f}s  {n / elapsed:8.0f} images/s")
+    return result
+
+def max_rel_error(reference, results):
+    worst = 0.0
+    for ref, got in zip(reference, results):
+        for metric in METRICS:
+            worst = max(worst, abs(ref[metric] - got[metric]) / max(abs(ref[metric]), 1e-9))
+    return worst
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = [os.path.join(workdir, f'img_{i}.jpg') for i in range(n)]
+        with ProcessPoolExecutor() as pool:
+            list(pool.map(write_street_like_jpeg, paths, range(n), chunksize=64))
+
+        print(f"⏱️  Image feature benchmark: {n:,} images, {os.cpu_count()} CPUs\n")
+        reference = timed('legacy, 1 process', lambda: [legacy_image_features(p) for p in paths], n)
+        fused = timed('fused, 1 process', lambda: batch_image_features(paths, workers=1), n)
+        pooled = timed('fused, process pool', lambda: batch_image_features(paths), n)
+        draft2 = timed('fused + draft 1/2, pool', lambda: batch_image_features(paths, draft_scale=2), n)
+        draft4 = timed('fused + draft 1/4, pool', lambda: batch_image_features(paths, draft_scale=4), n)
+
+        print(f"\n  max relative error vs legacy: full decode {max_rel_error(reference, pooled):.1e}, "
+              f"draft 1/2 {max_rel_error(reference, draft2):.1e}, "
+              f"draft 1/4 {max_rel_error(reference, draft4):.1e}")
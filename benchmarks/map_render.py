@@ -0,0 +1,56 @@
+# benchmarks/map_render.py - Map HTML size and render time: per-area markers vs one clustered layer
+# Run from the repo root: python -m benchmarks.map_render [n_areas ...]
+import os
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+from create_map import build_map
+from benchmarks.quick_labels import synthetic_areas
+
+# Per-area markers get slow to build long before the browser gives up on them
+MARKER_MAX_AREAS = 10_000
+
+def synthetic_predictions(n, seed=0):
+    """Prediction table shaped like train_model.py's output, spread over the NYC bounding box"""
+    rng = np.random.default_rng(seed)
+    areas = synthetic_areas(n, seed)
+    return areas.assign(
+        lat=rng.uniform(40.50, 40.90, n),
+        lon=rng.uniform(-74.25, -73.70, n),
+        avg_green_ratio=rng.uniform(0.1, 0.5, n),
+        safety=rng.integers(1, 6, n),
+        liveliness=rng.integers(2, 6, n),
+        cleanliness=rng.integers(1, 6, n),
+        predicted_category=np.array(['negative', 'neutral', 'positive'])[rng.integers(0, 3, n)],
+    )
+
+def render(predictions, mode, path):
+    start = time.perf_counter()
+    build_map(predictions, mode).save(path)
+    return time.perf_counter() - start, os.path.getsize(path)
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [50, 1_000, 10_000, 100_000]
+    warnings.filterwarnings('ignore', message='CartoDB tiles')
+
+    print(f"⏱️  Map rendering benchmark\n")
+    print(f"  {'areas':>9}  {'markers':>21}  {'clustered layer':>21}  {'smaller':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'map.html')
+        for n in sizes:
+            predictions = synthetic_predictions(n)
+            if n <= MARKER_MAX_AREAS:
+                with open(os.devnull, 'w') as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        marker_seconds, marker_bytes = render(predictions, 'markers', path)
+                    finally:
+                        sys.stdout = stdout
+                markers = f"{marker_bytes / 1e6:>8.2f} MB {marker_seconds:>8.2f}s"
+            else:
+                marker_bytes, markers = None, f"{'(skipped)':>21}"
+            layer_seconds, layer_bytes = render(predictions, 'layer', path)
+            ratio = f"{marker_bytes / layer_bytes:>7.1f}x" if marker_bytes else ''
+            print(f"  {n:>9,}  {markers}  {layer_bytes / 1e6:>8.2f} MB {layer_seconds:>8.2f}s  {ratio}")
@@ -0,0 +1,141 @@
+# benchmarks/model_loading.py - Load time and per-worker memory: three pickles vs a memory-mapped bundle
+# Run from the repo root: python -m benchmarks.model_loading [--trees 100] [--samples 20000] [--workers 4]
+"""Starts several worker processes that each load the model and score a
+batch, the way several serve.py processes would, and reads every worker's
+RSS, PSS (shared pages split between the processes mapping them) and
+private memory from /proc/self/smaps_rollup while all of them are alive.
+
+Layouts compared:
+  pickles         atmosphere_model.pkl + scaler.pkl + feature_columns.pkl
+  pickles + mmap  the same files with joblib.load(mmap_mode='r'); sklearn
+                  copies the tree arrays when unpickling, so nothing is shared
+  bundle          model_bundle.load_bundle (flat node arrays, memory-mapped)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from model_bundle import load_bundle, save_bundle
+from benchmarks.serve_latency import FEATURE_COLUMNS
+
+LAYOUTS = ['pickles', 'pickles + mmap', 'bundle']
+
+# Loads one layout, scores a batch, waits until every worker has done the same, then reports
+WORKER = """
+import json, os, sys, time
+import numpy as np
+
+def memory_mb():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+layout, model_dir = sys.argv[1:3]
+rows = np.load(os.path.join(model_dir, 'rows.npy'))
+import joblib, pandas, sklearn.ensemble, model_bundle  # imports are not part of load time
+before = memory_mb()
+
+start = time.perf_counter()
+if layout == 'bundle':
+    bundle = model_bundle.load_bundle(os.path.join(model_dir, 'atmosphere_model.bundle'))
+    model, scaler = bundle['model'], bundle['scaler']
+else:
+    mmap_mode = 'r' if layout == 'pickles + mmap' else None
+    model, scaler, columns = (joblib.load(os.path.join(model_dir, name), mmap_mode=mmap_mode)
+                              for name in ['atmosphere_model.pkl', 'scaler.pkl', 'feature_columns.pkl'])
+    rows = pandas.DataFrame(rows, columns=columns)
+load_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+model.predict_proba(scaler.transform(rows))
+predict_seconds = time.perf_counter() - start
+
+print('ready', flush=True)
+sys.stdin.readline()
+after = memory_mb()
+print(json.dumps({'load': load_seconds, 'predict': predict_seconds, 'before': before, 'after': after}),
+      flush=True)
+"""
+
+def train(n_trees, n_samples, seed=0):
+    """A forest with full-depth trees, so the model is big enough for memory to matter"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_samples, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    score = (X['total_complaints'] + rng.normal(size=n_samples) > 0).astype(int) + (X['avg_brightness'] > 0.5)
+    y = np.array(['negative', 'neutral', 'positive'])[score.to_numpy()]
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=seed, n_jobs=-1)
+    model.fit(scaler.transform(X), y)
+    return model, scaler
+
+def run_workers(layout, model_dir, n_workers):
+    processes = [subprocess.Popen([sys.executable, '-c', WORKER, layout, model_dir],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(n_workers)]
+    for process in processes:
+        if process.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f"{layout} worker failed")
+    for process in processes:
+        process.stdin.write('\n')
+        process.stdin.flush()
+    results = [json.loads(process.stdout.readline()) for process in processes]
+    for process in processes:
+        process.wait()
+    return results
+
+if __name__ == "__main__":
+    import joblib
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1000, help="Rows each worker scores after loading")
+    args = parser.parse_args()
+
+    print(f"⏱️  Model loading: {args.workers} workers, {args.trees} full-depth trees "
+          f"trained on {args.samples:,} rows\n")
+    model, scaler = train(args.trees, args.samples)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        joblib.dump(model, os.path.join(model_dir, 'atmosphere_model.pkl'))
+        joblib.dump(scaler, os.path.join(model_dir, 'scaler.pkl'))
+        joblib.dump(FEATURE_COLUMNS, os.path.join(model_dir, 'feature_columns.pkl'))
+        bundle_path = os.path.join(model_dir, 'atmosphere_model.bundle')
+        save_bundle(model, scaler, FEATURE_COLUMNS, path=bundle_path)
+
+        rows = np.random.default_rng(1).normal(size=(args.rows, len(FEATURE_COLUMNS)))
+        np.save(os.path.join(model_dir, 'rows.npy'), rows)
+        bundle = load_bundle(bundle_path)
+        expected = model.predict_proba(scaler.transform(pd.DataFrame(rows, columns=FEATURE_COLUMNS)))
+        identical = np.array_equal(expected, bundle['model'].predict_proba(bundle['scaler'].transform(rows)))
+
+        pickles_mb = sum(os.path.getsize(os.path.join(model_dir, name)) for name in
+                         ['atmosphere_model.pkl', 'scaler.pkl', 'feature_columns.pkl']) / 1e6
+        print(f"  Nodes: {len(bundle['model'].feature):,} | pickles {pickles_mb:.0f} MB | "
+              f"bundle {os.path.getsize(bundle_path) / 1e6:.0f} MB | "
+              f"bundle predictions identical to sklearn: {'✓' if identical else '✗'}\n")
+        del bundle
+
+        print(f"  {'layout':<15} {'load':>8} {'predict':>8}   per worker: {'RSS':>7} {'PSS':>7} "
+              f"{'private':>8}   model (PSS)   all workers (PSS)")
+        for layout in LAYOUTS:
+            results = run_workers(layout, model_dir, args.workers)
+            mean = lambda f: sum(f(r) for r in results) / len(results)
+            model_pss = mean(lambda r: r['after']['pss'] - r['before']['pss'])
+            print(f"  {layout:<15} {mean(lambda r: r['load']) * 1000:>6.0f}ms "
+                  f"{mean(lambda r: r['predict']) * 1000:>6.0f}ms   "
+                  f"{'':>12}{mean(lambda r: r['after']['rss']):>5.0f}MB "
+                  f"{mean(lambda r: r['after']['pss']):>5.0f}MB {mean(lambda r: r['after']['private']):>6.0f}MB   "
+                  f"{model_pss:>8.0f} MB   {model_pss * len(results):>12.0f} MB")
@@ -0,0 +1,201 @@
+# benchmarks/pipeline.py - End-to-end benchmark of the pipeline stages on synthetic data
+# Run from the repo root: python -m benchmarks.pipeline [--scale small medium large]
+"""Runs every pipeline stage on synthetic inputs at several data scales.
+
+Each stage runs as a subprocess inside a scratch directory holding its own
+config.py with synthetic neighborhoods, so nothing in data/ is touched and
+no network or API key is needed. Wall time, peak RSS and rows/second go
+to a JSON-lines history file, and are compared against a saved baseline.
+
+This process deliberately imports only the standard library: Linux keeps
+ru_maxrss across exec, so a heavy parent would inflate every stage's peak.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'results', 'history.jsonl')
+BASELINE_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'results', 'baseline.json')
+
+# name → (complaints, neighborhoods)
+SCALES = {
+    'small': (10_000, 50),
+    'medium': (1_000_000, 500),
+    'large': (10_000_000, 5000),
+}
+
+# Stages in pipeline order; `rows` says which count to use for rows/second
+STAGES = [
+    ('complaint_grid', 'complaints'),
+    ('extract_311_features', 'neighborhoods'),
+    ('complaint_store', 'complaints'),
+    ('temporal_features', 'complaints'),
+    ('extract_image_features', 'images'),
+    ('quick_labels', 'neighborhoods'),
+    ('combine_features', 'neighborhoods'),
+    ('train_model', 'neighborhoods'),
+    ('create_map', 'neighborhoods'),
+]
+
+# Runs a script as __main__ and reports its own peak RSS
+STAGE_RUNNER = """
+import json, resource, runpy, sys, time
+script, metrics_path = sys.argv[1:3]
+sys.argv = [script]
+start = time.perf_counter()
+runpy.run_path(script, run_name='__main__')
+elapsed = time.perf_counter() - start
+with open(metrics_path, 'w') as f:
+    json.dump({'seconds': elapsed,
+               'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}, f)
+"""
+
+def write_config(workdir, n_neighborhoods, seed=0):
+    """config.py with synthetic neighborhoods spread over the NYC bounding box"""
+    rng = random.Random(seed)
+    lines = ['GOOGLE_MAPS_API_KEY = ""', 'NEIGHBORHOODS = [']
+    for i in range(n_neighborhoods):
+        lines.append(f"    {{'name': 'Area_{i}', 'lat': {rng.uniform(40.55, 40.88):.5f}, "
+                     f"'lon': {rng.uniform(-74.15, -73.75):.5f}}},")
+    lines.append(']')
+    with open(os.path.join(workdir, 'config.py'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def run_script(workdir, args, log):
+    """Run a repo script inside workdir (its config.py shadows the real one)"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([workdir, REPO_ROOT]))
+    log.flush()
+    result = subprocess.run([sys.executable] + args, cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        log.flush()
+        with open(log.name) as f:
+            tail = f.read()[-3000:]
+        label = args[0] if args[0] != '-c' else (args[2] if len(args) > 2 else 'inline script')
+        raise RuntimeError(f"{os.path.basename(label)} failed:\n{tail}")
+
+def prepare_inputs(workdir, n_complaints, n_neighborhoods, log):
+    """Synthetic complaints (via the generator) and one JPEG per neighborhood × heading"""
+    for folder in ['data/raw/images', 'data/processed', 'models', 'outputs']:
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+    write_config(workdir, n_neighborhoods)
+
+    # Unknown neighborhoods use the default profile: ~100 complaints each at scale 1
+    scale = n_complaints / (100 * n_neighborhoods)
+    run_script(workdir, [os.path.join(REPO_ROOT, 'generate_realistic_311.py'),
+                         '--seed', '0', '--scale', str(scale), '--workers', str(os.cpu_count())],
+               log)
+
+    images_code = (
+        "import sys; from concurrent.futures import ProcessPoolExecutor\n"
+        "from benchmarks.image_features import write_street_like_jpeg\n"
+        "from config import NEIGHBORHOODS\n"
+        "paths = [f'data/raw/images/{h[\"name\"]}_{d}.jpg' for h in NEIGHBORHOODS for d in (0, 90, 180, 270)]\n"
+        "with ProcessPoolExecutor() as pool:\n"
+        "    list(pool.map(write_street_like_jpeg, paths, range(len(paths)), chunksize=64))\n"
+    )
+    run_script(workdir, ['-c', images_code], log)
+
+def run_scale(scale_name, keep_logs=False):
+    n_complaints, n_neighborhoods = SCALES[scale_name]
+    counts = {'complaints': n_complaints, 'neighborhoods': n_neighborhoods,
+              'images': n_neighborhoods * 4}
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, 'bench.log')
+        with open(log_path, 'w') as log:
+            print(f"\n📦 {scale_name}: {n_complaints:,} complaints, {n_neighborhoods:,} neighborhoods")
+            start = time.perf_counter()
+            prepare_inputs(workdir, n_complaints, n_neighborhoods, log)
+            print(f"   inputs ready in {time.perf_counter() - start:.1f}s")
+
+            for stage, rows_key in STAGES:
+                metrics_path = os.path.join(workdir, f'{stage}.json')
+                run_script(workdir, ['-c', STAGE_RUNNER,
+                                     os.path.join(REPO_ROOT, f'{stage}.py'), metrics_path], log)
+                with open(metrics_path) as f:
+                    metrics = json.load(f)
+                rows = counts[rows_key]
+                metrics.update(stage=stage, scale=scale_name, rows=rows,
+                               rows_per_second=rows / metrics['seconds'] if metrics['seconds'] else None)
+                results.append(metrics)
+                print(f"   {stage:<24} {metrics['seconds']:8.2f}s  {metrics['peak_rss_mb']:7.0f} MB  "
+                      f"{metrics['rows_per_second']:12,.0f} {rows_key}/s")
+
+        if keep_logs:
+            print(open(log_path).read())
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def find_regressions(results, baseline, threshold):
+    """Stages whose time or memory grew more than `threshold` over the baseline"""
+    reference = {(r['scale'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        ref = reference.get((r['scale'], r['stage']))
+        if ref is None:
+            continue
+        for metric in ['seconds', 'peak_rss_mb']:
+            if ref[metric] and r[metric] > ref[metric] * (1 + threshold):
+                regressions.append(f"{r['scale']}/{r['stage']}: {metric} "
+                                   f"{ref[metric]:.2f} → {r[metric]:.2f} "
+                                   f"(+{r[metric] / ref[metric] - 1:.0%})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CitySense pipeline stages")
+    parser.add_argument("--scale", nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run as the baseline to compare future runs against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Relative slowdown/memory growth that counts as a regression")
+    parser.add_argument("--logs", action="store_true", help="Print the stages' own output")
+    args = parser.parse_args()
+
+    print(f"⏱️  CitySense pipeline benchmark ({platform.platform()}, {os.cpu_count()} CPUs)")
+    results = []
+    for scale in args.scale:
+        results.extend(run_scale(scale, keep_logs=args.logs))
+
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'results': results,
+    }
+
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    print(f"\n📁 Appended to {os.path.relpath(HISTORY_PATH, REPO_ROOT)}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"📌 Saved baseline to {os.path.relpath(BASELINE_PATH, REPO_ROOT)}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ No regressions vs baseline")
@@ -0,0 +1,38 @@
+# benchmarks/polygon_assign.py - Point-in-polygon assignment with a bulk STRtree query
+# Run from the repo root: python -m benchmarks.polygon_assign [n_points ...]
+import sys
+import time
+import numpy as np
+import shapely
+from spatial import assign_to_polygons, polygon_areas_km2
+from benchmarks.spatial_index import random_points
+
+def grid_polygons(n_cols=20, n_rows=13):
+    """~260 NTA-sized polygons tiling the NYC bounding box"""
+    lons = np.linspace(-74.25, -73.70, n_cols + 1)
+    lats = np.linspace(40.5, 40.9, n_rows + 1)
+    boxes = [shapely.box(lons[i], lats[j], lons[i + 1], lats[j + 1])
+             for i in range(n_cols) for j in range(n_rows)]
+    geoms = np.empty(len(boxes), dtype=object)
+    geoms[:] = boxes
+    return geoms
+
+def run(n_points, geoms):
+    lat, lon = random_points(n_points)
+
+    start = time.perf_counter()
+    assigned = assign_to_polygons(lat, lon, geoms)
+    elapsed = time.perf_counter() - start
+
+    counts = np.bincount(assigned[assigned >= 0], minlength=len(geoms))
+    print(f"{n_points:>11,} pts → {len(geoms)} polygons | {elapsed:7.2f}s | "
+          f"{n_points / elapsed / 1e6:5.2f}M pts/s | assigned {counts.sum():,} (each exactly once)")
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000_000, 5_000_000]
+    geoms = grid_polygons()
+    areas = polygon_areas_km2(geoms)
+    print(f"⏱️  Polygon assignment benchmark ({len(geoms)} polygons, "
+          f"mean area {areas.mean():.2f} km²)\n")
+    for n in sizes:
+        run(n, geoms)
@@ -0,0 +1,69 @@
+# benchmarks/quick_labels.py - Labeling: per-row iterrows loop vs whole-column rules
+# Run from the repo root: python -m benchmarks.quick_labels [n_areas ...]
+import sys
+import time
+import numpy as np
+import pandas as pd
+from quick_labels import load_rules, score_labels
+
+def legacy_labels(data):
+    """The original loop, which recomputes every column max on every row"""
+    labels = []
+    for _, row in data.iterrows():
+        max_complaints = data['total_complaints'].max()
+        complaint_ratio = row['total_complaints'] / max_complaints if max_complaints > 0 else 0
+        safety = max(1, min(5, 5 - int(complaint_ratio * 4)))
+
+        max_noise = data['noise_complaints'].max()
+        noise_ratio = row['noise_complaints'] / max_noise if max_noise > 0 else 0
+        liveliness = max(2, min(5, 2 + int(noise_ratio * 3)))
+
+        max_graffiti = data['graffiti'].max()
+        max_street = data['street_condition'].max()
+        graffiti_ratio = row['graffiti'] / max_graffiti if max_graffiti > 0 else 0
+        street_ratio = row['street_condition'] / max_street if max_street > 0 else 0
+        cleanliness = max(1, min(5, 5 - int((graffiti_ratio + street_ratio) * 2)))
+
+        overall = (safety + liveliness + cleanliness) / 3
+        if overall >= 3.5:
+            category = 'positive'
+        elif overall >= 2.5:
+            category = 'neutral'
+        else:
+            category = 'negative'
+
+        labels.append({'name': row['name'], 'safety': safety, 'liveliness': liveliness,
+                       'cleanliness': cleanliness, 'overall_score': overall, 'category': category})
+    return pd.DataFrame(labels)
+
+def synthetic_areas(n, seed=0):
+    """Feature table shaped like features_311 ⋈ features_images for n census-tract-sized areas"""
+    rng = np.random.default_rng(seed)
+    total = rng.negative_binomial(3, 0.02, n)
+    return pd.DataFrame({
+        'name': [f'Tract_{i}' for i in range(n)],
+        'total_complaints': total,
+        'noise_complaints': rng.binomial(total, 0.2),
+        'street_condition': rng.binomial(total, 0.1),
+        'graffiti': rng.binomial(total, 0.04),
+        'avg_brightness': rng.uniform(80, 160, n),
+    })
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    rules = load_rules()
+
+    print(f"⏱️  Labeling benchmark\n")
+    print(f"  {'areas':>9}  {'iterrows':>10}  {'vectorized':>10}  {'speedup':>8}  identical")
+    for n in sizes:
+        data = synthetic_areas(n)
+        reference, legacy_seconds = timed(lambda: legacy_labels(data))
+        labels, seconds = timed(lambda: score_labels(data, rules))
+        identical = reference.equals(labels)
+        print(f"  {n:>9,}  {legacy_seconds:>9.2f}s  {seconds:>9.4f}s  "
+              f"{legacy_seconds / seconds:>7.0f}x  {'✓' if identical else '✗'}")
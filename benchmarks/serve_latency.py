@@ -0,0 +1,130 @@
+# benchmarks/serve_latency.py - Load test for serve.py: p50/p99 latency with and without micro-batching
+# Run from the repo root: python -m benchmarks.serve_latency
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from model_bundle import save_bundle
+
+FEATURE_COLUMNS = [
+    'total_complaints', 'noise_complaints', 'street_condition',
+    'graffiti', 'heat_hot_water', 'complaints_per_km2',
+    'avg_brightness', 'avg_green_ratio', 'avg_blue_ratio',
+    'avg_color_variance', 'avg_brightness_variance'
+]
+REQUESTS_PER_CLIENT = 200
+
+def write_model(bundle_path, n_areas=500, seed=0):
+    """A model shaped like train_model.py's, trained on random features"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_areas, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    y = np.array(['negative', 'neutral', 'positive'])[rng.integers(0, 3, n_areas)]
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=100, max_depth=3, random_state=42)
+    model.fit(scaler.transform(X), y)
+    save_bundle(model, scaler, FEATURE_COLUMNS, path=bundle_path)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(bundle_path, max_batch, max_wait_ms=2.0):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, 'serve.py', '--port', str(port), '--model', bundle_path,
+                                '--max-batch', str(max_batch), '--max-wait-ms', str(max_wait_ms),
+                                '--no-points'], stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("serve.py did not start")
+
+def request(conn, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else None
+    conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def client(port, n, latencies, errors, seed):
+    rng = np.random.default_rng(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for _ in range(n):
+        instance = dict(zip(FEATURE_COLUMNS, rng.normal(size=len(FEATURE_COLUMNS)).tolist()))
+        start = time.perf_counter()
+        try:
+            status, _ = request(conn, 'POST', '/predict', {'instances': [instance]})
+        except OSError as e:
+            errors.append(e)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+
+def load_test(port, concurrency, reload_every=None):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(port, REQUESTS_PER_CLIENT, latencies, errors, i))
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    reloads = 0
+    if reload_every:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while any(t.is_alive() for t in threads):
+            time.sleep(reload_every)
+            status, _ = request(conn, 'POST', '/reload', {})
+            reloads += status == 200
+
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {'p50': np.percentile(ms, 50), 'p99': np.percentile(ms, 99),
+            'throughput': len(ms) / elapsed, 'errors': len(errors), 'reloads': reloads}
+
+def report(label, concurrency, r):
+    print(f"  {label:<18} {concurrency:>4} clients | p50 {r['p50']:7.2f} ms | p99 {r['p99']:7.2f} ms | "
+          f"{r['throughput']:7.0f} req/s | {r['errors']} errors"
+          + (f" | {r['reloads']} hot reloads" if r['reloads'] else ""))
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as model_dir:
+        bundle_path = os.path.join(model_dir, 'model.bundle')
+        write_model(bundle_path)
+        print(f"⏱️  Scoring service load test ({REQUESTS_PER_CLIENT} single-row requests per client, "
+              f"{os.cpu_count()} CPUs)\n")
+
+        for label, max_batch in [('no batching', 1), ('micro-batch ≤64', 64)]:
+            process, port = start_server(bundle_path, max_batch)
+            try:
+                for concurrency in [1, 8, 32]:
+                    report(label, concurrency, load_test(port, concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+            print()
+
+        # Reload the model every 200 ms while under load: no request may fail
+        process, port = start_server(bundle_path, 64)
+        try:
+            report('batched + reloads', 32, load_test(port, 32, reload_every=0.2))
+        finally:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,50 @@
+# benchmarks/spatial_index.py - Radius query: brute force vs KD-tree
+# Run from the repo root: python -m benchmarks.spatial_index [n_points ...]
+import sys
+import time
+import numpy as np
+from spatial import build_point_index, query_radius, calculate_distance
+
+def random_points(n, seed=0):
+    """Uniform random complaints inside the NYC bounding box"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(40.5, 40.9, n)
+    lon = rng.uniform(-74.25, -73.70, n)
+    return lat, lon
+
+def random_centers(n, seed=1):
+    lat, lon = random_points(n, seed)
+    return [{'name': f'area_{i}', 'lat': a, 'lon': b} for i, (a, b) in enumerate(zip(lat, lon))]
+
+def brute_force(lat, lon, centers, radius_km=1.0):
+    """What extract_311_features.py used to do: one full scan per neighborhood"""
+    return [np.flatnonzero(calculate_distance(lat, lon, c['lat'], c['lon']) < radius_km)
+            for c in centers]
+
+def run(n_points, n_centers):
+    lat, lon = random_points(n_points)
+    centers = random_centers(n_centers)
+
+    start = time.perf_counter()
+    slow = brute_force(lat, lon, centers)
+    t_brute = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree = build_point_index(lat, lon)
+    t_build = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = query_radius(tree, centers)
+    t_query = time.perf_counter() - start
+
+    # Same answer either way (modulo points sitting exactly on the boundary)
+    mismatches = sum(len(set(a) ^ set(b)) for a, b in zip(slow, fast))
+    print(f"{n_points:>11,} pts × {n_centers:>4} areas | brute {t_brute:8.2f}s | "
+          f"kd build {t_build:6.2f}s + query {t_query:6.3f}s | "
+          f"speedup {t_brute / (t_build + t_query):6.1f}x | mismatches {mismatches}")
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000_000, 10_000_000]
+    print("⏱️  Radius query benchmark (1 km)\n")
+    for n in sizes:
+        for n_centers in [50, 260]:
+            run(n, n_centers)
@@ -0,0 +1,61 @@
+# benchmarks/storage_formats.py - CSV vs Parquet for the complaint table
+# Run from the repo root: python -m benchmarks.storage_formats [n_rows]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import storage
+from storage import save_table, load_table
+
+BOROUGHS = ['MANHATTAN', 'BROOKLYN', 'QUEENS', 'BRONX', 'STATEN ISLAND']
+TYPES = ['Noise - Residential', 'Heat/Hot Water', 'Street Condition', 'Illegal Parking',
+         'Blocked Driveway', 'Water System', 'Graffiti', 'Sanitation Condition', 'Rodent', 'Other']
+
+def synthetic_complaints(n, seed=0):
+    """Complaints with the same schema as data/raw/311_complaints.csv"""
+    rng = np.random.default_rng(seed)
+    created = pd.Timestamp('2025-12-21') - pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit='s')
+    return pd.DataFrame({
+        'unique_key': np.char.add('SYN_', np.arange(n).astype(str)),
+        'created_date': created,
+        'complaint_type': np.array(TYPES)[rng.integers(0, len(TYPES), n)],
+        'latitude': rng.uniform(40.5, 40.9, n),
+        'longitude': rng.uniform(-74.25, -73.70, n),
+        'borough': np.array(BOROUGHS)[rng.integers(0, len(BOROUGHS), n)],
+    })
+
+def size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f))
+                   for d, _, files in os.walk(path) for f in files) / 1e6
+    return os.path.getsize(path) / 1e6
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def run(n_rows, workdir):
+    df = synthetic_complaints(n_rows)
+    projection = ['latitude', 'longitude', 'complaint_type']
+    bronx = [('borough', '==', 'BRONX')]
+
+    print(f"{'layout':<22}{'size MB':>9}{'write s':>9}{'full s':>9}{'lat/lon/type s':>16}{'Bronx only s':>14}")
+    for label, fmt, partition_by in [('csv', 'csv', None),
+                                     ('parquet', 'parquet', None),
+                                     ('parquet borough/month', 'parquet', ['borough', 'month'])]:
+        name = os.path.join(workdir, label.replace(' ', '_').replace('/', '_'))
+        storage.DEFAULT_FORMAT = fmt
+        t_write, path = timed(lambda: save_table(df, name, partition_by=partition_by))
+        t_full, _ = timed(lambda: load_table(name))
+        t_proj, _ = timed(lambda: load_table(name, columns=projection))
+        t_filter, rows = timed(lambda: load_table(name, columns=projection, filters=bronx))
+        print(f"{label:<22}{size_mb(path):>9.0f}{t_write:>9.2f}{t_full:>9.2f}{t_proj:>16.2f}{t_filter:>14.2f}")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    print(f"⏱️  Storage benchmark at {n:,} complaints\n")
+    with tempfile.TemporaryDirectory() as workdir:
+        run(n, workdir)
@@ -0,0 +1,70 @@
+# benchmarks/streetview_download.py - Street View downloads against a local stub server
+# Run from the repo root: python -m benchmarks.streetview_download [n_points]
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collect_images import HEADINGS, download_all
+
+LATENCY_S = 0.1         # typical Street View Static round trip
+NO_IMAGERY_RATE = 0.05  # share of locations answered with 404
+OLD_SLEEP_S = 0.3       # the fixed pause the sequential loop used
+
+class StubStreetView(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    jpeg = b'\xff\xd8\xff\xe0' + os.urandom(30_000) + b'\xff\xd9'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(LATENCY_S)
+        if random.random() < NO_IMAGERY_RATE:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(self.jpeg)))
+        self.end_headers()
+        self.wfile.write(self.jpeg)
+
+def sample_points(n, seed=0):
+    rng = random.Random(seed)
+    return [{'name': f'pt_{i}', 'lat': rng.uniform(40.5, 40.9), 'lon': rng.uniform(-74.25, -73.7)}
+            for i in range(n)]
+
+def timed_download(points, url, workdir, concurrency):
+    start = time.perf_counter()
+    counts, skipped = download_all(points, concurrency=concurrency, rate=500.0, url=url,
+                                   image_dir=workdir,
+                                   manifest_path=os.path.join(workdir, 'manifest.json'))
+    return time.perf_counter() - start, counts, skipped
+
+if __name__ == "__main__":
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubStreetView)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/maps/api/streetview"
+
+    n_images = n_points * len(HEADINGS)
+    sequential = n_images * (LATENCY_S + OLD_SLEEP_S)
+    print(f"⏱️  Street View benchmark: {n_points:,} points × {len(HEADINGS)} headings "
+          f"({LATENCY_S * 1000:.0f} ms/image)")
+    print(f"   old sequential loop (estimated): {sequential / 3600:.1f} h\n")
+
+    points = sample_points(n_points)
+    for concurrency in [16, 64]:
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed, counts, _ = timed_download(points, url, workdir, concurrency)
+            print(f"   concurrency {concurrency:>2}: {elapsed:7.1f}s "
+                  f"({counts['ok']:,} saved, {counts['no_imagery']:,} no imagery)")
+            elapsed, counts, skipped = timed_download(points, url, workdir, concurrency)
+            print(f"   re-run (resume): {elapsed:7.1f}s ({skipped:,} skipped, "
+                  f"{counts['ok']:,} downloaded)")
+    server.shutdown()
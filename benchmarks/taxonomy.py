@@ -0,0 +1,54 @@
+# benchmarks/taxonomy.py - Per-area counts by complaint family: value_counts per area vs one bincount
+# Run from the repo root: python -m benchmarks.taxonomy [n_rows ...]
+import sys
+import time
+import numpy as np
+import pandas as pd
+from generate_realistic_311 import COMPLAINT_TYPES
+from taxonomy import FAMILIES, classify, family_codes
+
+N_AREAS = 500
+
+def raw_types(n, seed=0):
+    """Raw complaint types as they come in: the generator's mix, some in legacy upper case"""
+    rng = np.random.default_rng(seed)
+    names = list(COMPLAINT_TYPES) + [name.upper() for name in COMPLAINT_TYPES]
+    weights = np.array(list(COMPLAINT_TYPES.values()) * 2)
+    return pd.Series(np.array(names, dtype=object)[rng.choice(len(names), n, p=weights / weights.sum())])
+
+def value_counts_per_area(types, area, n_areas):
+    """The old way: a string-keyed value_counts per area, then each type's family looked up"""
+    counts = np.zeros((n_areas, len(FAMILIES)), dtype=np.int64)
+    order = np.argsort(area, kind='stable')
+    bounds = np.searchsorted(area[order], np.arange(n_areas + 1))
+    for a in range(n_areas):
+        for complaint_type, n in types.iloc[order[bounds[a]:bounds[a + 1]]].value_counts().items():
+            counts[a, FAMILIES.index(classify(complaint_type))] += n
+    return counts
+
+def bincount_per_area(types, area, n_areas):
+    """Family codes once, then one bincount over (area, family)"""
+    codes = family_codes(types).astype(np.int64)
+    return np.bincount(area * len(FAMILIES) + codes,
+                       minlength=n_areas * len(FAMILIES)).reshape(n_areas, len(FAMILIES))
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [1_000_000, 5_000_000]
+
+    print(f"⏱️  Complaints per area and family, {N_AREAS} areas\n")
+    print(f"  {'rows':>10}  {'value_counts':>12}  {'bincount':>9}  {'faster':>7}  "
+          f"{'strings':>9}  {'codes':>7}  same")
+    for n in sizes:
+        types = raw_types(n)
+        area = np.random.default_rng(1).integers(0, N_AREAS, n)
+        slow, slow_seconds = timed(value_counts_per_area, types, area, N_AREAS)
+        fast, fast_seconds = timed(bincount_per_area, types, area, N_AREAS)
+        string_mb = types.memory_usage(deep=True) / 1e6
+        code_mb = family_codes(types).nbytes / 1e6
+        print(f"  {n:>10,}  {slow_seconds:>11.2f}s  {fast_seconds:>8.2f}s  {slow_seconds / fast_seconds:>6.1f}x  "
+              f"{string_mb:>7.0f}MB  {code_mb:>5.0f}MB  {(slow == fast).all()}")
@@ -0,0 +1,66 @@
+# benchmarks/tiles.py - Complaint grid + tile pyramid: full build vs incremental update
+# Run from the repo root: python -m benchmarks.tiles [n_complaints] [n_new]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import build_tiles
+import complaint_grid
+from storage import append_table
+
+COMPLAINT_TYPES = ['Noise', 'Street Condition', 'Graffiti', 'Heat/Hot Water',
+                   'Illegal Parking', 'Blocked Driveway', 'Rodent', 'Water System']
+
+def synthetic_complaints(n, start, days, seed=0):
+    """Complaints clustered around a few dozen hot spots in the NYC bounding box"""
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack([rng.uniform(40.55, 40.88, 40), rng.uniform(-74.15, -73.75, 40)])
+    hotspot = rng.integers(0, len(centers), n)
+    seconds = rng.integers(0, days * 86400, n)
+    return pd.DataFrame({
+        'unique_key': [f'{seed}_{i}' for i in range(n)],
+        'created_date': pd.Timestamp(start) + pd.to_timedelta(np.sort(seconds), unit='s'),
+        'complaint_type': np.array(COMPLAINT_TYPES)[rng.integers(0, len(COMPLAINT_TYPES), n)],
+        'latitude': centers[hotspot, 0] + rng.normal(0, 0.02, n),
+        'longitude': centers[hotspot, 1] + rng.normal(0, 0.025, n),
+        'borough': 'MANHATTAN',
+    })
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def build():
+    complaint_grid.update_grid()
+    build_tiles.build_tiles()
+
+def count_files(path):
+    return sum(len(files) for _, _, files in os.walk(path))
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_new = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    repo = os.getcwd()
+
+    print(f"⏱️  Grid + tile pyramid benchmark: {n:,} complaints, then {n_new:,} new ones\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            append_table(synthetic_complaints(n, '2025-01-01', 180), 'complaints')
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    _, full_seconds = timed(build)
+                    append_table(synthetic_complaints(n_new, '2025-07-01', 1, seed=1), 'complaints')
+                    _, update_seconds = timed(build)
+                finally:
+                    sys.stdout = stdout
+            n_tiles = count_files(build_tiles.TILE_DIR) // 2
+            print(f"  full build          {full_seconds:7.2f}s")
+            print(f"  incremental update  {update_seconds:7.2f}s  ({full_seconds / update_seconds:.0f}x faster)")
+            print(f"  {n_tiles:,} tiles (zoom {build_tiles.MIN_ZOOM}-{build_tiles.MAX_ZOOM})")
+        finally:
+            os.chdir(repo)
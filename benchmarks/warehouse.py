@@ -0,0 +1,72 @@
+# benchmarks/warehouse.py - SQLite warehouse: bulk ingest rate, re-ingest dedupe and query latency
+# Run from the repo root: python -m benchmarks.warehouse [n_complaints]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import warehouse
+from benchmarks.spatial_index import random_centers
+from benchmarks.tiles import synthetic_complaints
+
+CHUNK = 1_000_000
+REPEATS = 5
+
+def chunks(n):
+    """n complaints in CHUNK-row pages (as the collector writes them), 36 days each from 2024-01-01"""
+    for i, start in enumerate(range(0, n, CHUNK)):
+        yield synthetic_complaints(min(CHUNK, n - start), pd.Timestamp('2024-01-01') + pd.Timedelta(days=36 * i),
+                                   36, seed=i)
+
+def median_ms(fn):
+    """Median wall time of REPEATS calls (after one warm-up) and the last result"""
+    result, times = fn(), []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, result
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    box = (40.745, -73.995, 40.755, -73.980)          # ~1.1 x 1.3 km in Midtown
+    manhattan = (40.70, -74.02, 40.80, -73.93)
+    month = (pd.Timestamp('2024-03-01'), pd.Timestamp('2024-04-01'))
+    day = (pd.Timestamp('2024-03-15'), pd.Timestamp('2024-03-16'))
+    centers = random_centers(50)
+    lats, lons = np.array([c['lat'] for c in centers]), np.array([c['lon'] for c in centers])
+
+    print(f"⏱️  SQLite warehouse, {n:,} complaints\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'warehouse.sqlite')
+        conn = warehouse.connect(path)
+        ingest_seconds = 0.0
+        for page in chunks(n):
+            start = time.perf_counter()
+            warehouse.ingest_frame(conn, page)
+            ingest_seconds += time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        print(f"  ingest                 {ingest_seconds:7.1f}s  ({n / ingest_seconds:,.0f} rows/s, "
+              f"{size / 1e6:,.0f} MB on disk, {size / n:.0f} bytes/row)")
+
+        page = next(chunks(n))
+        start = time.perf_counter()
+        warehouse.ingest_frame(conn, page)
+        total, = conn.execute("SELECT COUNT(*) FROM complaints").fetchone()
+        print(f"  re-ingest one page     {time.perf_counter() - start:7.1f}s  ({len(page):,} rows upserted, "
+              f"{total:,} complaints in the table)\n")
+
+        queries = [
+            ('1 km box', lambda: warehouse.query(conn, box)),
+            ('1 km box + 1 month', lambda: warehouse.query(conn, box, *month)),
+            ('Manhattan box + 1 month + type', lambda: warehouse.query(conn, manhattan, *month, types=['Noise'])),
+            ('1 day, everywhere', lambda: warehouse.query(conn, since=day[0], until=day[1])),
+        ]
+        for label, fn in queries:
+            ms, rows = median_ms(fn)
+            print(f"  {label:<32} {ms:8.1f} ms  ({len(rows):,} rows)")
+        ms, counts = median_ms(lambda: warehouse.AreaCounts(conn, *month).radius_counts(lats, lons, 1.0))
+        print(f"  {'1 km radius counts, 50 areas':<32} {ms:8.1f} ms  "
+              f"({int(counts['count'].sum()):,} complaints in 1 month)")
+        conn.close()
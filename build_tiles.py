@@ -0,0 +1,173 @@
+# build_tiles.py - Turn the complaint grid into a z/x/y tile pyramid for the map
+# Usage: python build_tiles.py [--full]
+"""Complaint tile pyramid.
+
+Tiles are drawn from the finest level of the complaint grid
+(complaint_grid.py), whose cells are the pixels of tile zoom MAX_ZOOM
+split BIN_BITS more times (~30 m across in NYC). Each zoom level from
+MAX_ZOOM down to MIN_ZOOM is a roll-up of those cells (a cell at one zoom
+is the sum of its four children at the next).
+
+For every tile with complaints this writes, under outputs/tiles/:
+  {z}/{x}/{y}.json  counts per complaint type for each of the tile's
+                    2^BIN_BITS x 2^BIN_BITS bins (sparse, column-wise)
+  {z}/{x}/{y}.png   the bins' total counts as a heatmap, one pixel per bin
+                    (Leaflet stretches it to the 256 px tile)
+Leaflet requests only the tiles in view, so the map never loads the raw
+points.
+
+The per-cell counts behind the current tiles are kept in the tile_cells
+table; later runs compare the grid against it and rewrite just the tiles
+with a changed cell.
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from PIL import Image
+import instrumentation
+from complaint_grid import CELL_LEVEL, STATE_PATH as GRID_STATE_PATH, load_state, save_state
+from storage import load_table, save_table, stored_table_path
+
+TILE_DIR = "outputs/tiles"
+STATE_PATH = "data/processed/tile_state.json"
+
+MIN_ZOOM = 10
+# Each tile is split into 2^BIN_BITS x 2^BIN_BITS bins, one grid cell each at MAX_ZOOM
+BIN_BITS = 5
+MAX_ZOOM = CELL_LEVEL - BIN_BITS
+
+# Complaints in one bin that get the full heat color at MAX_ZOOM; a bin one
+# zoom out covers four times the area, so its scale is four times higher
+FULL_COLOR_COUNT = 20
+
+CELL_COLUMNS = ['x', 'y', 'complaint_type']
+
+def rollup(cells, zoom):
+    """Counts per (bin, type) at a tile zoom, summed up from the CELL_LEVEL cells"""
+    shift = MAX_ZOOM - zoom
+    coarse = cells.assign(x=cells['x'].to_numpy() >> shift, y=cells['y'].to_numpy() >> shift)
+    return coarse.groupby(CELL_COLUMNS, as_index=False)['count'].sum()
+
+def tile_ids(cells, zoom):
+    """Tile (x, y) at `zoom` that each CELL_LEVEL cell falls in"""
+    shift = MAX_ZOOM - zoom + BIN_BITS
+    return cells['x'].to_numpy() >> shift, cells['y'].to_numpy() >> shift
+
+def heat_png(totals, zoom):
+    """RGBA heatmap of one tile's bin totals (bins x bins grid), on a fixed log scale per zoom"""
+    full = FULL_COLOR_COUNT * 4 ** (MAX_ZOOM - zoom)
+    heat = np.clip(np.log1p(totals) / np.log1p(full), 0, 1)
+
+    rgba = np.zeros(totals.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (220 * (1 - heat)).astype(np.uint8)   # yellow → red
+    rgba[..., 3] = np.where(totals > 0, 70 + 170 * heat, 0).astype(np.uint8)
+    return Image.fromarray(rgba, 'RGBA')
+
+def write_tiles(cells, zoom, tile_dir=TILE_DIR, only=None):
+    """Write the JSON + PNG tiles of one zoom level (only the tiles in `only`, if given)"""
+    if only is not None:
+        tx, ty = tile_ids(cells, zoom)
+        cells = cells[pd.MultiIndex.from_arrays([tx, ty]).isin(only)]
+    binned = rollup(cells, zoom)
+    type_codes, type_names = pd.factorize(binned['complaint_type'], sort=True)
+    type_names = np.asarray(type_names, dtype=object)
+    x, y, counts = binned['x'].to_numpy(), binned['y'].to_numpy(), binned['count'].to_numpy()
+
+    # Sort once by tile, then every tile is one contiguous slice
+    bins = 1 << BIN_BITS
+    tx, ty = x >> BIN_BITS, y >> BIN_BITS
+    order = np.lexsort((ty, tx))
+    tx, ty, counts, type_codes = tx[order], ty[order], counts[order], type_codes[order]
+    bx, by = x[order] & (bins - 1), y[order] & (bins - 1)
+    starts = np.flatnonzero(np.r_[len(tx) > 0, (np.diff(tx) != 0) | (np.diff(ty) != 0)])
+    ends = np.r_[starts[1:], len(tx)]
+
+    for start, end in zip(starts, ends):
+        tile = slice(start, end)
+        folder = os.path.join(tile_dir, str(zoom), str(tx[start]))
+        os.makedirs(folder, exist_ok=True)
+        codes, type_index = np.unique(type_codes[tile], return_inverse=True)
+        with open(os.path.join(folder, f"{ty[start]}.json"), 'w') as f:
+            # json.dumps (unlike json.dump) uses the C encoder
+            f.write(json.dumps({'zoom': zoom, 'x': int(tx[start]), 'y': int(ty[start]), 'bins': bins,
+                                'types': [str(name) for name in type_names[codes]],
+                                # One entry per (bin, type) with complaints, as columns
+                                'bin_x': bx[tile].tolist(), 'bin_y': by[tile].tolist(),
+                                'type': type_index.tolist(), 'count': counts[tile].tolist()},
+                               separators=(',', ':')))
+
+        totals = np.bincount(by[tile] * bins + bx[tile], weights=counts[tile], minlength=bins * bins)
+        heat_png(totals.reshape(bins, bins), zoom).save(os.path.join(folder, f"{ty[start]}.png"))
+
+    if only is not None:
+        # Tiles whose complaints are all gone
+        for x, y in only.difference(pd.MultiIndex.from_arrays([tx[starts], ty[starts]])):
+            for ext in ('json', 'png'):
+                path = os.path.join(tile_dir, str(zoom), str(x), f"{y}.{ext}")
+                if os.path.exists(path):
+                    os.remove(path)
+    return len(starts)
+
+def changed_cells(cells, previous):
+    """Cells whose count differs from the previous snapshot, including cells that are gone"""
+    merged = cells.merge(previous, on=CELL_COLUMNS, how='outer', suffixes=('', '_previous'))
+    changed = merged['count'].fillna(0).to_numpy() != merged['count_previous'].fillna(0).to_numpy()
+    return merged.loc[changed, ['x', 'y']]
+
+def build_tiles(full=False, tile_dir=TILE_DIR, state_path=STATE_PATH, grid_state_path=GRID_STATE_PATH):
+    """Bring the tile pyramid up to date with the complaint grid"""
+    grid_state = load_state(grid_state_path)
+    if grid_state is None:
+        raise FileNotFoundError(f"No complaint grid state at {grid_state_path} (run complaint_grid.py first)")
+    state = None if full else load_state(state_path)
+    if state is not None and (stored_table_path('tile_cells') is None or not os.path.isdir(tile_dir)):
+        state = None
+    if state is not None and (state.get('built'), state.get('update')) == (grid_state['built'],
+                                                                          grid_state['update']):
+        print("✓ Tiles are up to date")
+        return state
+
+    with instrumentation.stage('load'):
+        cells = load_table('complaint_cells', columns=CELL_COLUMNS + ['count'],
+                           filters=[('level', '==', CELL_LEVEL)])
+        # One row per (cell, type): drop the borough and month split
+        cells = cells.groupby(CELL_COLUMNS, as_index=False, dropna=False)['count'].sum()
+        cells = cells[cells['count'] != 0]
+        touched = None
+        if state is not None:
+            # Diff against what the tiles show now, so only tiles with changed counts get rewritten
+            touched = changed_cells(cells, load_table('tile_cells'))
+    instrumentation.count('cells', len(cells))
+
+    if touched is None:
+        shutil.rmtree(tile_dir, ignore_errors=True)
+        print(f"🧱 Building tiles from {int(cells['count'].sum()):,} complaints")
+    else:
+        print(f"🧱 Updating the tiles of {len(touched):,} changed cells")
+
+    written = 0
+    with instrumentation.stage('write'):
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            only = pd.MultiIndex.from_arrays(tile_ids(touched, zoom)).unique() if touched is not None else None
+            written += write_tiles(cells, zoom, tile_dir, only)
+        save_table(cells, 'tile_cells')
+    instrumentation.count('tiles', written)
+
+    state = {'built': grid_state['built'], 'update': grid_state['update']}
+    save_state(state, state_path)
+    print(f"✓ {written:,} tiles written (zoom {MIN_ZOOM}-{MAX_ZOOM}) to {tile_dir}/")
+    return state
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the complaint heatmap tile pyramid")
+    parser.add_argument("--full", action="store_true",
+                        help="Rewrite every tile instead of only those with new complaints")
+    args = parser.parse_args()
+
+    build_tiles(full=args.full)
+    print("\n✅ Done!")
@@ -0,0 +1,342 @@
+# citysense.py - Run the pipeline as a DAG, skipping stages whose inputs haven't changed
+# Usage: python citysense.py run [STAGE ...] [--force] [--jobs N] [--skip STAGE ...]
+#        python citysense.py run generate_311 [STAGE ...]   # with synthetic complaints
+"""Pipeline runner.
+
+Every stage declares the tables/files it reads and writes. Before running
+a stage, its key is computed from the content hashes of its inputs, its
+script and every local module the script imports (config.py included),
+so a stage is skipped when none of those changed since its last
+successful run and its outputs are still the ones it wrote. Stages whose
+inputs are ready run in parallel, each as its own process.
+
+Opt-in stages (generate_311, which replaces the complaint table with
+synthetic data) only run when named as a target; otherwise their outputs
+are used as they are, like --skip.
+"""
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import instrumentation
+import storage
+from storage import TABLES, stored_table_path
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = "data/processed/pipeline_state.json"
+LOG_DIR = "data/processed/logs"
+
+# Inputs and outputs are table names from storage.TABLES or plain paths;
+# opt_in stages only run when named as a target
+STAGES = {
+    'collect_images': {
+        'script': 'collect_images.py',
+        'inputs': [],
+        'outputs': ['data/raw/images'],
+    },
+    'generate_311': {
+        'script': 'generate_realistic_311.py',
+        'inputs': [],
+        'outputs': ['complaints'],
+        # Overwrites collected / synced complaints, so never by default
+        'opt_in': True,
+    },
+    'complaint_grid': {
+        'script': 'complaint_grid.py',
+        'inputs': ['complaints'],
+        'outputs': ['complaint_cells', 'grid_ledger'],
+    },
+    'extract_311_features': {
+        'script': 'extract_311_features.py',
+        'inputs': ['complaint_cells'],
+        'outputs': ['features_311', 'area_counts'],
+    },
+    'complaint_store': {
+        'script': 'complaint_store.py',
+        'inputs': ['complaints'],
+        'outputs': ['data/processed/complaint_store'],
+    },
+    'temporal_features': {
+        'script': 'temporal_features.py',
+        'inputs': ['data/processed/complaint_store'],
+        'outputs': ['features_temporal'],
+    },
+    'extract_image_features': {
+        'script': 'extract_image_features.py',
+        'inputs': ['data/raw/images'],
+        'outputs': ['features_images'],
+    },
+    'quick_labels': {
+        'script': 'quick_labels.py',
+        'inputs': ['features_311', 'features_images', 'label_rules.json'],
+        'outputs': ['labels'],
+    },
+    'combine_features': {
+        'script': 'combine_features.py',
+        'inputs': ['features_311', 'features_images', 'labels', 'features_temporal'],
+        'outputs': ['combined_features'],
+    },
+    'train_model': {
+        'script': 'train_model.py',
+        'inputs': ['combined_features'],
+        'outputs': ['predictions', 'models/atmosphere_model.bundle'],
+    },
+    'build_tiles': {
+        'script': 'build_tiles.py',
+        'inputs': ['complaint_cells'],
+        'outputs': ['outputs/tiles'],
+    },
+    'create_map': {
+        'script': 'create_map.py',
+        'inputs': ['predictions', 'outputs/tiles'],
+        'outputs': ['outputs/citysense_map.html'],
+    },
+}
+
+def resolve(name):
+    """On-disk path of a table name or plain path (None if it doesn't exist yet)"""
+    if name in TABLES:
+        return stored_table_path(name)
+    return name if os.path.exists(name) else None
+
+def local_modules(script, root=REPO_ROOT):
+    """The script plus every repo module it imports, recursively"""
+    found = set()
+    pending = [os.path.join(root, script)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                candidate = os.path.join(root, module.split('.')[0] + '.py')
+                if os.path.exists(candidate):
+                    pending.append(candidate)
+    return sorted(found)
+
+class Hasher:
+    """sha256 of files and directories, re-hashing only files whose size or mtime changed"""
+
+    def __init__(self, known=None):
+        self.known = known or {}  # path → [size, mtime_ns, sha256]
+
+    def file(self, path):
+        stat = os.stat(path)
+        entry = self.known.get(path)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def path(self, path):
+        """Hash of a file, or of a directory's relative paths and file hashes"""
+        if path is None:
+            return None
+        if os.path.isfile(path):
+            return self.file(path)
+        digest = hashlib.sha256()
+        for folder, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith('.tmp'):
+                    continue
+                full = os.path.join(folder, name)
+                digest.update(f"{os.path.relpath(full, path)}\0{self.file(full)}\n".encode())
+        return digest.hexdigest()
+
+def load_state(state_path=STATE_PATH):
+    if not os.path.exists(state_path):
+        return {'stages': {}, 'files': {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_state(state, state_path=STATE_PATH):
+    """Write the state atomically"""
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+def stage_key(stage, hasher):
+    """Hash of everything that determines a stage's outputs"""
+    spec = STAGES[stage]
+    code = {os.path.relpath(path, REPO_ROOT): hasher.file(path)
+            for path in local_modules(spec['script'])}
+    inputs = {name: hasher.path(resolve(name)) for name in spec['inputs']}
+    missing = [name for name, digest in inputs.items() if digest is None]
+    if missing:
+        raise FileNotFoundError(f"{stage} is missing its inputs: {', '.join(missing)}")
+    blob = json.dumps({'code': code, 'inputs': inputs, 'args': spec.get('args', []),
+                       'format': storage.DEFAULT_FORMAT}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def output_hashes(stage, hasher):
+    return {name: hasher.path(resolve(name)) for name in STAGES[stage]['outputs']}
+
+def is_fresh(stage, key, state, hasher):
+    """True if the last successful run had this key and its outputs are untouched"""
+    record = state['stages'].get(stage)
+    if record is None or record['key'] != key:
+        return False
+    current = output_hashes(stage, hasher)
+    return None not in current.values() and current == record['outputs']
+
+def dependencies(stages):
+    """stage → set of stages (among `stages`) that produce one of its inputs"""
+    producers = {output: stage for stage in stages for output in STAGES[stage]['outputs']}
+    return {stage: {producers[i] for i in STAGES[stage]['inputs'] if i in producers}
+            for stage in stages}
+
+def select_stages(targets=None, skip=()):
+    """Targets plus everything upstream of them, in declaration order, minus `skip`.
+
+    Opt-in stages are only included when they are targets themselves.
+    """
+    deps = dependencies(list(STAGES))
+    targets = list(targets or [stage for stage in STAGES if not STAGES[stage].get('opt_in')])
+    wanted = set()
+    pending = list(targets)
+    while pending:
+        stage = pending.pop()
+        if stage not in wanted and (stage in targets or not STAGES[stage].get('opt_in')):
+            wanted.add(stage)
+            pending.extend(deps[stage])
+    return [stage for stage in STAGES if stage in wanted and stage not in skip]
+
+def run_stage(stage, log_dir=LOG_DIR):
+    """Run one stage's script in its own process, logging its output.
+
+    Returns (ok, seconds, peak RSS of the stage's process in MB).
+    """
+    spec = STAGES[stage]
+    os.makedirs(log_dir, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(log_dir, f"{stage}.log"), 'w') as log:
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, spec['script'])]
+                                   + spec.get('args', []),
+                                   stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        # wait4 rather than wait() to get this child's own resource usage
+        _, wait_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+    return process.returncode == 0, time.perf_counter() - start, instrumentation.peak_rss_mb(usage)
+
+def log_tail(stage, lines=20, log_dir=LOG_DIR):
+    with open(os.path.join(log_dir, f"{stage}.log")) as f:
+        return ''.join(f.readlines()[-lines:])
+
+def run_pipeline(targets=None, skip=(), force=False, jobs=None, state_path=STATE_PATH):
+    """Run the selected stages, in parallel where the DAG allows.
+
+    Returns {stage: status} with status 'ran', 'cached', 'failed' or
+    'blocked' (an upstream stage failed).
+    """
+    stages = select_stages(targets, skip)
+    deps = dependencies(stages)
+    state = load_state(state_path)
+    hasher = Hasher(state['files'])
+    jobs = jobs or os.cpu_count()
+    status = {}
+    keys = {}
+    running = {}
+
+    print(f"🏙️  Running {len(stages)} stages ({jobs} at a time)\n")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(status) < len(stages):
+            for stage in stages:
+                if stage in status or stage in running.values() or len(running) >= jobs:
+                    continue
+                upstream = [status.get(dep) for dep in deps[stage]]
+                if any(s in ('failed', 'blocked') for s in upstream):
+                    status[stage] = 'blocked'
+                    print(f"  ⏭️  {stage} (upstream failed)")
+                    continue
+                if not all(s in ('ran', 'cached') for s in upstream):
+                    continue
+
+                try:
+                    keys[stage] = stage_key(stage, hasher)
+                except FileNotFoundError as e:
+                    status[stage] = 'failed'
+                    print(f"  ✗ {e}")
+                    continue
+                if not force and is_fresh(stage, keys[stage], state, hasher):
+                    status[stage] = 'cached'
+                    instrumentation.count('stages_cached')
+                    print(f"  ♻️  {stage} (unchanged)")
+                    continue
+
+                print(f"  ▶️  {stage}")
+                running[pool.submit(run_stage, stage)] = stage
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                ok, seconds, peak_mb = future.result()
+                instrumentation.record_stage(stage, seconds, status='ok' if ok else 'error',
+                                             peak_rss_mb=round(peak_mb, 1))
+                instrumentation.count('stages_ran')
+                if not ok:
+                    status[stage] = 'failed'
+                    print(f"  ✗ {stage} failed after {seconds:.1f}s:\n{log_tail(stage)}")
+                    continue
+                status[stage] = 'ran'
+                state['stages'][stage] = {'key': keys[stage],
+                                          'outputs': output_hashes(stage, hasher),
+                                          'seconds': round(seconds, 2),
+                                          'peak_rss_mb': round(peak_mb, 1),
+                                          'finished': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                state['files'] = hasher.known
+                save_state(state, state_path)
+                print(f"  ✓ {stage} ({seconds:.1f}s)")
+
+    state['files'] = hasher.known
+    save_state(state, state_path)
+    return status
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CitySense pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the pipeline, skipping unchanged stages")
+    run.add_argument("targets", nargs='*', metavar="STAGE",
+                     help="Stages to bring up to date, with everything upstream "
+                          "(default: all but generate_311, which only runs when named)")
+    run.add_argument("--skip", nargs='+', default=[], choices=list(STAGES), metavar="STAGE",
+                     help="Use these stages' existing outputs without running them "
+                          "(e.g. collect_images without an API key)")
+    run.add_argument("--force", action="store_true", help="Re-run stages even if unchanged")
+    run.add_argument("--jobs", type=int, default=None,
+                     help="Stages to run at once (default: one per CPU)")
+    args = parser.parse_args()
+    unknown = [stage for stage in args.targets if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s) {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    status = run_pipeline(args.targets, skip=args.skip, force=args.force, jobs=args.jobs)
+    counts = {s: list(status.values()).count(s) for s in ['ran', 'cached', 'failed', 'blocked']}
+    print(f"\n✅ {counts['ran']} ran, {counts['cached']} unchanged" if not counts['failed']
+          else f"\n❌ {counts['failed']} failed, {counts['blocked']} blocked, "
+               f"{counts['ran']} ran, {counts['cached']} unchanged")
+    instrumentation.exit(1 if counts['failed'] else 0)
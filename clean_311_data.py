@@ -1,57 +1,128 @@
+import resource
 import pandas as pd
+import instrumentation
+from storage import save_table
+
+RAW_COLUMNS = {
+    'Unique Key': 'unique_key',
+    'Created Date': 'created_date',
+    'Problem (formerly Complaint Type)': 'complaint_type',
+    'Latitude': 'latitude',
+    'Longitude': 'longitude',
+    'Borough': 'borough',
+}
+
+# Explicit dtypes so pandas never has to guess. Coordinates are read as
+# strings and coerced in clean_chunk, so a stray '(unknown)' becomes NaN
+# instead of failing the whole read
+RAW_DTYPES = {
+    'Unique Key': 'string',
+    'Created Date': 'string',
+    'Problem (formerly Complaint Type)': 'category',
+    'Latitude': 'string',
+    'Longitude': 'string',
+    'Borough': 'category',
+}
+
+# NYC Open Data export format, e.g. "12/21/2025 10:15:00 PM"
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def clean_chunk(chunk):
+    """Column rename, coordinate coercion and NYC bounding-box filter for one chunk"""
+    chunk = chunk.rename(columns=RAW_COLUMNS)
 
-print("🧹 Cleaning 311 data...\n")
-
-print("📂 Loading file (this might take 1-2 minutes for large file)...")
-
-try:
-    # Use the NEW column names!
-    df = pd.read_csv("data/raw/311_raw.csv", 
-                     usecols=['Unique Key', 'Created Date', 
-                              'Problem (formerly Complaint Type)', 
-                              'Latitude', 'Longitude', 'Borough'],
-                     low_memory=False)
-    
-    print(f"✓ Loaded {len(df):,} rows")
-    
-    # Rename columns to simple names
-    df.columns = ['unique_key', 'created_date', 'complaint_type', 
-                  'latitude', 'longitude', 'borough']
-    
     # Clean coordinates
-    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-    df = df.dropna(subset=['latitude', 'longitude'])
-    
+    chunk['latitude'] = pd.to_numeric(chunk['latitude'], errors='coerce').astype('float64')
+    chunk['longitude'] = pd.to_numeric(chunk['longitude'], errors='coerce').astype('float64')
+    chunk = chunk.dropna(subset=['latitude', 'longitude'])
+
     # Filter to valid NYC coordinates
-    df = df[
-        (df['latitude'] > 40.4) & (df['latitude'] < 41.0) &
-        (df['longitude'] > -74.3) & (df['longitude'] < -73.7)
+    chunk = chunk[
+        (chunk['latitude'] > 40.4) & (chunk['latitude'] < 41.0) &
+        (chunk['longitude'] > -74.3) & (chunk['longitude'] < -73.7)
     ]
-    
-    print(f"✓ Filtered to {len(df):,} valid NYC records")
-    
-    # Take most recent 50,000 (plenty for analysis)
-    df['created_date'] = pd.to_datetime(df['created_date'], errors='coerce')
-    df = df.sort_values('created_date', ascending=False).head(50000)
-    
-    # Save cleaned version
-    df.to_csv("data/raw/311_complaints.csv", index=False)
-    
-    print(f"\n✅ SUCCESS! Cleaned data saved!")
-    print(f"📊 Final dataset: {len(df):,} REAL complaints")
-    print(f"📁 Location: data/raw/311_complaints.csv")
-    
-    print(f"\n📋 Top 10 complaint types:")
-    print(df['complaint_type'].value_counts().head(10))
-    
-    print(f"\n📅 Date range:")
-    print(f"   Most recent: {df['created_date'].max()}")
-    print(f"   Oldest: {df['created_date'].min()}")
-    
-    print("\n🎉 Ready to extract features!")
-    
-except Exception as e:
-    print(f"\n❌ Error: {e}")
-    import traceback
-    traceback.print_exc()
+
+    created = pd.to_datetime(chunk['created_date'], format=DATE_FORMAT, errors='coerce')
+    missing = created.isna()
+    if missing.any():
+        # API/CSV endpoint exports use ISO timestamps instead, sometimes mixed into one file
+        created = created.fillna(pd.to_datetime(chunk.loc[missing, 'created_date'],
+                                                format='ISO8601', errors='coerce'))
+
+    chunk = chunk.assign(
+        created_date=created,
+        complaint_type=chunk['complaint_type'].astype('string'),
+        borough=chunk['borough'].astype('string'),
+    )
+    return chunk.dropna(subset=['created_date'])
+
+def clean_311_data(raw_csv, output_table='complaints', top_n=50000, chunksize=200_000):
+    """Stream the raw export and keep only the top_n most recent valid rows.
+
+    Memory stays bounded by one chunk plus the current top_n rows, no matter
+    how big the input is: each chunk is merged into the running top_n with a
+    partial selection (nlargest) instead of sorting everything.
+    """
+    print("📂 Streaming file in chunks...")
+
+    top = None
+    total_rows = 0
+    valid_rows = 0
+
+    reader = pd.read_csv(raw_csv, usecols=list(RAW_COLUMNS), dtype=RAW_DTYPES,
+                         chunksize=chunksize)
+    for i, chunk in enumerate(reader, 1):
+        total_rows += len(chunk)
+        chunk = clean_chunk(chunk)
+        valid_rows += len(chunk)
+
+        if top is not None:
+            chunk = pd.concat([top, chunk], ignore_index=True)
+        top = chunk.nlargest(top_n, 'created_date')
+
+        print(f"  ✓ Chunk {i}: {total_rows:,} rows read, {valid_rows:,} valid "
+              f"(peak RSS {peak_rss_mb():,.0f} MB)")
+
+    if top is None:
+        top = clean_chunk(pd.DataFrame(columns=list(RAW_COLUMNS)))
+
+    print(f"✓ Filtered to {valid_rows:,} valid NYC records")
+    instrumentation.count('rows_read', total_rows)
+    instrumentation.count('rows_valid', valid_rows)
+
+    # Only the kept rows get sorted
+    df = top.sort_values('created_date', ascending=False)
+    with instrumentation.stage('save'):
+        path = save_table(df, output_table)
+    print(f"📁 Location: {path}")
+
+    return df
+
+if __name__ == "__main__":
+    print("🧹 Cleaning 311 data...\n")
+
+    try:
+        with instrumentation.stage('clean'):
+            df = clean_311_data("data/raw/311_raw.csv")
+
+        print(f"\n✅ SUCCESS! Cleaned data saved!")
+        print(f"📊 Final dataset: {len(df):,} REAL complaints")
+        print(f"🧠 Peak memory: {peak_rss_mb():,.0f} MB")
+
+        print(f"\n📋 Top 10 complaint types:")
+        print(df['complaint_type'].value_counts().head(10))
+
+        print(f"\n📅 Date range:")
+        print(f"   Most recent: {df['created_date'].max()}")
+        print(f"   Oldest: {df['created_date'].min()}")
+
+        print("\n🎉 Ready to extract features!")
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
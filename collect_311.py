@@ -1,67 +1,75 @@
 import pandas as pd
-import requests
-import time
+import instrumentation
+from soda_client import BASE_URL, SELECT, fetch_many
+from storage import append_table, delete_table, load_table, replace_table, table_path
 
-def fetch_real_311_data():
+PAGE_SIZE = 10000
+
+def clean_records(records):
+    """Coerce coordinates and drop rows without a location"""
+    # SODA leaves out null fields, so pin the columns
+    df = pd.DataFrame(records, columns=SELECT.split(','))
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    df['created_date'] = pd.to_datetime(df['created_date'], format='ISO8601')
+    return df.dropna(subset=['latitude', 'longitude'])
+
+def fetch_real_311_data(total=50000, concurrency=4, rate=5.0, url=BASE_URL):
     """Fetch REAL NYC 311 data using a working endpoint"""
     print("🚀 Fetching REAL NYC 311 complaints...\n")
     
-    # This is the more reliable endpoint
-    base_url = "https://data.cityofnewyork.us/resource/erm2-nwe9.json"
-    
-    all_data = []
-    
-    # Fetch in chunks (API has limits)
-    for offset in range(0, 50000, 10000):
-        print(f"Fetching records {offset} to {offset+10000}...")
-        
-        params = {
-            "$limit": 10000,
+    # Fetch in chunks (API has limits), several at a time
+    param_sets = {
+        offset: {
+            "$limit": PAGE_SIZE,
             "$offset": offset,
-            "$order": "created_date DESC",
-            "$select": "unique_key,created_date,complaint_type,latitude,longitude,borough",
+            "$order": "created_date DESC, unique_key DESC",
+            "$select": SELECT,
             "$where": "latitude IS NOT NULL AND longitude IS NOT NULL"
         }
-        
-        try:
-            response = requests.get(base_url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if len(data) == 0:
-                    print("  No more data available")
-                    break
-                all_data.extend(data)
-                print(f"  ✓ Got {len(data)} records")
-            else:
-                print(f"  ✗ Error {response.status_code}: {response.text[:100]}")
-                break
-                
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-            break
-        
-        time.sleep(1)  # Be nice to the API
+        for offset in range(0, total, PAGE_SIZE)
+    }
+    
+    # Pages go straight to disk as they arrive, into a staging table that
+    # only replaces the complaint table once the fetch got something
+    delete_table('complaints_staging')
+    saved = 0
     
-    if len(all_data) == 0:
+    def on_page(offset, records):
+        nonlocal saved
+        if not records:
+            print(f"  Records {offset}+: no more data available")
+            return
+        df = clean_records(records)
+        append_table(df, 'complaints_staging')
+        saved += len(df)
+        instrumentation.count('complaints_fetched', len(records))
+        instrumentation.count('complaints_saved', len(df))
+        print(f"  ✓ Records {offset} to {offset + PAGE_SIZE}: {len(records)} fetched")
+    
+    try:
+        with instrumentation.stage('fetch'):
+            fetch_many(param_sets, on_page, url=url, concurrency=concurrency, rate=rate)
+    except RuntimeError as e:
+        print(f"  ✗ {e}")
+        # Keep the complaints we already have rather than a partial fetch
+        delete_table('complaints_staging')
+        print(f"\n❌ Fetch failed after {saved:,} complaints; {table_path('complaints')} left as it was")
+        return None
+    
+    if saved == 0:
+        delete_table('complaints_staging')
         print("\n❌ No data retrieved. API might be down.")
         print("Would you like to:")
         print("  1. Use sample data for now")
         print("  2. Try downloading a CSV file instead")
         return None
     
-    df = pd.DataFrame(all_data)
-    
-    # Clean data
-    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-    df = df.dropna(subset=['latitude', 'longitude'])
-    
-    # Save
-    df.to_csv("data/raw/311_complaints.csv", index=False)
+    replace_table('complaints', 'complaints_staging')
+    df = load_table('complaints')
     
     print(f"\n✅ SUCCESS! Collected {len(df):,} REAL complaints")
-    print(f"📁 Saved to: data/raw/311_complaints.csv")
+    print(f"📁 Saved to: {table_path('complaints')}")
     
     if 'complaint_type' in df.columns:
         print(f"\n📊 Top 10 complaint types:")
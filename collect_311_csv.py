@@ -1,5 +1,7 @@
 import pandas as pd
 import requests
+import instrumentation
+from storage import save_table
 
 def download_311_csv():
     """Download 311 data as CSV directly"""
@@ -13,7 +15,10 @@ def download_311_csv():
     print("⏳ Downloading...")
     
     try:
-        df = pd.read_csv(url)
+        instrumentation.http_call(url)
+        with instrumentation.stage('download'):
+            df = pd.read_csv(url)
+        instrumentation.count('complaints_fetched', len(df))
         
         print(f"✅ Downloaded {len(df):,} records!")
         
@@ -24,10 +29,12 @@ def download_311_csv():
         df = df.dropna(subset=['latitude', 'longitude'])
         
         # Save
-        df.to_csv("data/raw/311_complaints.csv", index=False)
+        with instrumentation.stage('save'):
+            path = save_table(df, 'complaints')
+        instrumentation.count('complaints_saved', len(df))
         
         print(f"✅ Saved {len(df):,} clean records")
-        print(f"📁 Location: data/raw/311_complaints.csv")
+        print(f"📁 Location: {path}")
         print(f"\n📊 Top 10 complaint types:")
         print(df['complaint_type'].value_counts().head(10))
         
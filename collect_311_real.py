@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
+import instrumentation
 from config import NEIGHBORHOODS
+from storage import save_table
 
 def generate_realistic_311_data():
     """Generate realistic sample 311 data based on actual NYC patterns"""
@@ -62,12 +64,15 @@ def generate_realistic_311_data():
     
     df = pd.DataFrame(all_complaints)
     
+    instrumentation.count('complaints_generated', len(df))
+    
     # Save
-    df.to_csv("data/raw/311_complaints.csv", index=False)
+    with instrumentation.stage('save'):
+        path = save_table(df, 'complaints')
     
     print(f"✅ Generated {len(df):,} realistic complaints")
     print(f"📊 Average per neighborhood: {len(df)//len(NEIGHBORHOODS)}")
-    print(f"📁 Saved to: data/raw/311_complaints.csv")
+    print(f"📁 Saved to: {path}")
     
     print(f"\n📋 Top 10 complaint types:")
     print(df['complaint_type'].value_counts().head(10))
@@ -1,71 +1,80 @@
 import pandas as pd
 import requests
-import time
 from datetime import datetime, timedelta
+import instrumentation
+from soda_client import BASE_URL, SELECT, fetch_many
+from storage import append_table, delete_table, load_table, replace_table, save_table, table_path
 
-def fetch_311_by_weeks():
+def clean_batch(batch):
+    """Coerce coordinates and keep only rows inside NYC"""
+    # SODA leaves out null fields, so pin the columns
+    df = pd.DataFrame(batch, columns=SELECT.split(','))
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    df['created_date'] = pd.to_datetime(df['created_date'], format='ISO8601')
+    df = df.dropna(subset=['latitude', 'longitude'])
+    
+    # Filter to NYC bounds
+    return df[
+        (df['latitude'] > 40.4) & (df['latitude'] < 41.0) &
+        (df['longitude'] > -74.3) & (df['longitude'] < -73.7)
+    ]
+
+def fetch_311_by_weeks(weeks=8, concurrency=4, rate=5.0, url=BASE_URL):
     """Fetch 311 data week by week to avoid timeouts"""
     print("🚀 Fetching REAL NYC 311 data (weekly batches)...\n")
     
-    base_url = "https://data.cityofnewyork.us/resource/erm2-nwe9.json"
-    
-    all_data = []
-    
-    # Get last 8 weeks of data
+    # Get last 8 weeks of data, one query per week, fetched concurrently
     end_date = datetime.now()
+    param_sets = {}
     
-    for week in range(8):
+    for week in range(weeks):
         week_end = end_date - timedelta(days=week*7)
         week_start = week_end - timedelta(days=7)
         
         date_filter = f"created_date between '{week_start.strftime('%Y-%m-%d')}' and '{week_end.strftime('%Y-%m-%d')}'"
         
-        print(f"📅 Week {week+1}: {week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}...", end=" ")
-        
-        params = {
+        label = f"Week {week+1}: {week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}"
+        param_sets[label] = {
             "$limit": 10000,
             "$where": f"{date_filter} AND latitude IS NOT NULL",
-            "$select": "unique_key,created_date,complaint_type,latitude,longitude,borough"
+            "$select": SELECT
         }
-        
-        try:
-            response = requests.get(base_url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                batch = response.json()
-                all_data.extend(batch)
-                print(f"✓ {len(batch):,} complaints (total: {len(all_data):,})")
-            else:
-                print(f"✗ Error {response.status_code}")
-                
-        except Exception as e:
-            print(f"✗ {e}")
-        
-        time.sleep(1)
     
-    if len(all_data) == 0:
-        print("\n❌ API still not working. Let me try one more thing...")
-        return try_direct_query()
+    # Each week is written as soon as it arrives, into a staging table that
+    # only replaces the complaint table once the fetch got something
+    delete_table('complaints_staging')
+    saved = 0
     
-    # Convert to DataFrame
-    df = pd.DataFrame(all_data)
+    def on_page(label, batch):
+        nonlocal saved
+        df = clean_batch(batch) if batch else None
+        if df is not None and len(df):
+            append_table(df, 'complaints_staging')
+            saved += len(df)
+            instrumentation.count('complaints_saved', len(df))
+        instrumentation.count('complaints_fetched', len(batch))
+        print(f"📅 {label}... ✓ {len(batch):,} complaints (total: {saved:,})")
     
-    # Clean
-    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-    df = df.dropna(subset=['latitude', 'longitude'])
+    try:
+        with instrumentation.stage('fetch'):
+            fetch_many(param_sets, on_page, url=url, concurrency=concurrency, rate=rate)
+    except RuntimeError as e:
+        # Retries are exhausted; say which weeks are missing instead of skipping silently
+        print(f"✗ {e}")
+        # Keep the complaints we already have rather than some of the weeks
+        saved = 0
     
-    # Filter to NYC bounds
-    df = df[
-        (df['latitude'] > 40.4) & (df['latitude'] < 41.0) &
-        (df['longitude'] > -74.3) & (df['longitude'] < -73.7)
-    ]
+    if saved == 0:
+        delete_table('complaints_staging')
+        print("\n❌ API still not working. Let me try one more thing...")
+        return try_direct_query()
     
-    # Save
-    df.to_csv("data/raw/311_complaints.csv", index=False)
+    replace_table('complaints', 'complaints_staging')
+    df = load_table('complaints')
     
-    print(f"\n✅ SUCCESS! Got {len(df):,} REAL complaints from last 8 weeks")
-    print(f"📁 Saved to: data/raw/311_complaints.csv")
+    print(f"\n✅ SUCCESS! Got {len(df):,} REAL complaints from last {weeks} weeks")
+    print(f"📁 Saved to: {table_path('complaints')}")
     print(f"\n📋 Top 10 complaint types:")
     print(df['complaint_type'].value_counts().head(10))
     
@@ -83,6 +92,7 @@ def try_direct_query():
     
     try:
         print("⏳ This might take 30-60 seconds...")
+        instrumentation.http_call(url)
         response = requests.get(url, params=params, timeout=90)
         
         if response.status_code == 200:
@@ -99,7 +109,7 @@ def try_direct_query():
             ]
             
             if len(df) > 0:
-                df.to_csv("data/raw/311_complaints.csv", index=False)
+                path = save_table(df, 'complaints')
                 print(f"\n✅ SUCCESS! Got {len(df):,} complaints")
                 print(f"📋 Top complaint types:")
                 print(df['complaint_type'].value_counts().head(10))
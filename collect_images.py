@@ -1,42 +1,172 @@
 # collect_images.py
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from PIL import Image
 from config import NEIGHBORHOODS, GOOGLE_MAPS_API_KEY
-import time
-import os
+import instrumentation
+from http_utils import TokenBucket, get_with_retry, make_session
+
+STREETVIEW_URL = "https://maps.googleapis.com/maps/api/streetview"
+IMAGE_DIR = "data/raw/images"
+MANIFEST_PATH = f"{IMAGE_DIR}/manifest.json"
+HEADINGS = [0, 90, 180, 270]
+
+def image_path(name, heading, image_dir=IMAGE_DIR):
+    return f"{image_dir}/{name}_{heading}.jpg"
+
+def sha256_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Status of every (location, heading) we've tried so far"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    """Write the manifest atomically"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def already_done(entry, path):
+    """True if this image needs no download: known no-imagery spot, or a verified file on disk"""
+    if entry is None:
+        return False
+    if entry['status'] == 'no_imagery':
+        return True
+    if entry['status'] != 'ok' or not os.path.exists(path):
+        return False
+    # Cheap size check first, hash only when the size matches
+    return os.path.getsize(path) == entry['bytes'] and sha256_file(path) == entry['sha256']
 
-def download_image(lat, lon, name, heading=0):
-    url = "https://maps.googleapis.com/maps/api/streetview"
+def existing_entry(lat, lon, heading, path):
+    """Manifest entry for an image already on disk (e.g. from before the manifest), if it's a valid JPEG"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with Image.open(path) as img:
+            if img.format != 'JPEG':
+                return None
+            img.verify()
+    except Exception:  # truncated or not an image: download it again
+        return None
+    return {'lat': lat, 'lon': lon, 'heading': heading, 'status': 'ok',
+            'bytes': os.path.getsize(path), 'sha256': sha256_file(path)}
+
+def write_atomic(path, content):
+    """Write to a temp file and rename, so a crash never leaves a half-written JPEG"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def download_image(session, limiter, lat, lon, name, heading=0, url=STREETVIEW_URL,
+                   image_dir=IMAGE_DIR):
+    """Download one Street View image and return its manifest entry"""
     params = {
         "size": "400x400",
         "location": f"{lat},{lon}",
         "heading": heading,
-        "key": GOOGLE_MAPS_API_KEY
+        "key": GOOGLE_MAPS_API_KEY,
+        # 404 instead of the grey "no imagery here" placeholder JPEG
+        "return_error_code": "true",
     }
-    
-    response = requests.get(url, params=params)
-    
-    if response.status_code == 200:
-        filename = f"data/raw/images/{name}_{heading}.jpg"
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        print(f"  ✓ {heading}°")
-        return True
-    else:
-        print(f"  ✗ {heading}° failed")
-        return False
+    entry = {'lat': lat, 'lon': lon, 'heading': heading}
+
+    try:
+        response = get_with_retry(session, url, params, limiter, timeout=30)
+    except requests.RequestException as e:
+        return {**entry, 'status': 'error', 'error': str(e)}
+
+    content_type = response.headers.get('Content-Type', '')
+    if response.status_code == 404:
+        return {**entry, 'status': 'no_imagery'}
+    if response.status_code != 200 or not content_type.startswith('image/'):
+        return {**entry, 'status': 'error',
+                'error': f"HTTP {response.status_code} ({content_type or 'no content type'})"}
+
+    try:
+        write_atomic(image_path(name, heading, image_dir), response.content)
+    except OSError as e:  # e.g. a full disk; keep going and record it
+        return {**entry, 'status': 'error', 'error': f"write failed: {e}"}
+    return {**entry, 'status': 'ok', 'bytes': len(response.content),
+            'sha256': hashlib.sha256(response.content).hexdigest()}
+
+def download_all(locations, concurrency=16, rate=50.0, url=STREETVIEW_URL,
+                 image_dir=IMAGE_DIR, manifest_path=MANIFEST_PATH):
+    """Download every location × heading concurrently, skipping what we already have.
+
+    rate caps requests per second across all workers (keep it under the
+    API key's quota). Valid images already on disk but missing from the
+    manifest are added to it rather than downloaded again. The manifest is
+    saved every 100 results and when the run stops, so an interrupted run
+    resumes where it stopped.
+    """
+    os.makedirs(image_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    jobs = []
+    skipped = 0
+    for hood in locations:
+        for heading in HEADINGS:
+            key = f"{hood['name']}_{heading}"
+            path = image_path(hood['name'], heading, image_dir)
+            if key not in manifest:
+                entry = existing_entry(hood['lat'], hood['lon'], heading, path)
+                if entry is not None:
+                    manifest[key] = entry
+            if already_done(manifest.get(key), path):
+                skipped += 1
+            else:
+                jobs.append((key, hood, heading))
+
+    print(f"📸 {len(jobs)} to download, {skipped} already on disk\n")
+
+    session = make_session(concurrency)
+    limiter = TokenBucket(rate, burst=concurrency)
+    counts = {'ok': 0, 'no_imagery': 0, 'error': 0}
 
-# Create images folder
-os.makedirs("data/raw/images", exist_ok=True)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(download_image, session, limiter, hood['lat'], hood['lon'],
+                                   hood['name'], heading, url, image_dir): key
+                       for key, hood, heading in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                entry = future.result()
+                manifest[key] = entry
+                counts[entry['status']] += 1
+                if entry['status'] == 'error':
+                    print(f"  ✗ {key}: {entry['error']}")
+                if done % 100 == 0:
+                    save_manifest(manifest, manifest_path)
+                    print(f"  … {done}/{len(jobs)} done")
+    finally:
+        # Keep every result we got, even if the run is cut short
+        save_manifest(manifest, manifest_path)
+    return counts, skipped
 
-print("🏙️  Downloading Street View images...")
-print(f"📸 Total: {len(NEIGHBORHOODS) * 4} images\n")
+if __name__ == "__main__":
+    print("🏙️  Downloading Street View images...")
+    print(f"📸 Total: {len(NEIGHBORHOODS) * len(HEADINGS)} images")
 
-# Get 4 directions per neighborhood (20 images total)
-for i, hood in enumerate(NEIGHBORHOODS, 1):
-    print(f"[{i}/{len(NEIGHBORHOODS)}] {hood['name']}")
-    for heading in [0, 90, 180, 270]:
-        download_image(hood['lat'], hood['lon'], hood['name'], heading)
-        time.sleep(0.3)
+    start = time.perf_counter()
+    with instrumentation.stage('download'):
+        counts, skipped = download_all(NEIGHBORHOODS)
+    for status, n in counts.items():
+        instrumentation.count(f'images_{status}', n)
+    instrumentation.count('images_skipped', skipped)
 
-print("\n✅ Downloaded 20 street view images!")
-print("📁 Location: data/raw/images/")
+    print(f"\n✅ Downloaded {counts['ok']} street view images "
+          f"({skipped} skipped, {counts['no_imagery']} without imagery, "
+          f"{counts['error']} failed) in {time.perf_counter() - start:.1f}s")
+    print(f"📁 Location: {IMAGE_DIR}/")
+    print(f"📋 Manifest: {MANIFEST_PATH}")
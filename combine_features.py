@@ -1,20 +1,32 @@
 # combine_features.py
-import pandas as pd
+import instrumentation
+from storage import load_table, save_table, stored_table_path
 
 print("🔗 Combining all features...\n")
 
 # Load all feature sets
-features_311 = pd.read_csv("data/processed/features_311.csv")
-features_images = pd.read_csv("data/processed/features_images.csv")
-labels = pd.read_csv("data/processed/labels.csv")
+with instrumentation.stage('load'):
+    features_311 = load_table('features_311')
+    features_images = load_table('features_images')
+    labels = load_table('labels')
+    # Optional: rolling time-window counts from temporal_features.py
+    features_temporal = (load_table('features_temporal')
+                         if stored_table_path('features_temporal') is not None else None)
 
 print("✓ Loaded 311 features")
 print("✓ Loaded image features")
 print("✓ Loaded labels")
+if features_temporal is not None:
+    print("✓ Loaded temporal features")
 
 # Merge everything
-combined = features_311.merge(features_images, on='name')
-combined = combined.merge(labels, on='name')
+with instrumentation.stage('merge'):
+    combined = features_311.merge(features_images, on='name')
+    combined = combined.merge(labels, on='name')
+    if features_temporal is not None:
+        combined = combined.merge(features_temporal, on='name', how='left')
+
+instrumentation.count('areas', len(combined))
 
 print(f"\n📊 Combined dataset shape: {combined.shape}")
 print(f"   {combined.shape[0]} neighborhoods")
@@ -27,7 +39,8 @@ print("\n🎯 First few rows:")
 print(combined.head())
 
 # Save
-combined.to_csv("data/processed/combined_features.csv", index=False)
-print("\n✅ Saved to data/processed/combined_features.csv")
+with instrumentation.stage('save'):
+    path = save_table(combined, 'combined_features')
+print(f"\n✅ Saved to {path}")
 print("\n🎉 Feature engineering complete!")
 print("🚀 Ready for Day 3: Train ML Model!")
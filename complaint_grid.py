@@ -0,0 +1,507 @@
+# complaint_grid.py - Hierarchical grid of complaint counts by type and month
+# Usage: python complaint_grid.py [--full] [--retract keys.txt] [--check]
+"""Complaint grid store and query engine.
+
+Every complaint is assigned once to a cell of the Web Mercator grid at
+CELL_LEVEL (~30 m across in NYC), and the complaint_cells table keeps a
+count per (cell, complaint type, borough, month). Each coarser level in
+LEVELS is stored too, as the sum of its 4x4 children one level finer.
+
+Any area is answered from those counts without touching the raw
+complaints: a shape is covered with the coarsest cells that fit entirely
+inside it, and only its edge is filled in with finer cells (see _cover).
+Along the edge, each non-empty finest-level cell counts if its center is
+inside, so areas are exact to about half a cell (~15 m).
+
+Later runs only read the part files appended to the complaint store since
+the last one (see sync_311.py) and append their counts; queries sum
+whatever rows share a key, so nothing is rewritten until the periodic
+compaction. The grid_ledger table records which cell, type, borough and
+month every unique_key counts toward, so a complaint appended again under
+the same key (a fix) first takes -1 off where it was counted before, and
+keys listed in complaint_retractions (--retract) only take their -1.
+Every batch gets the next `update` number in the ledger, which is how
+extract_311_features.py applies just the changes since its last run. If
+part files that were already counted changed (e.g. the generator re-ran),
+it rebuilds.
+"""
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import instrumentation
+from spatial import KM_PER_DEG_LAT, KM_PER_DEG_LON, project_km
+from storage import append_table, load_table, save_table, stored_table_path, table_files
+from taxonomy import FAMILIES, family_codes
+
+STATE_PATH = "data/processed/grid_state.json"
+
+# Finest first; each level is the roll-up of the one before it
+LEVELS = (20, 18, 16, 14, 12)
+CELL_LEVEL = LEVELS[0]
+
+# The complaint columns the grid is built from
+COMPLAINT_COLUMNS = ['unique_key', 'latitude', 'longitude', 'complaint_type', 'borough', 'created_date']
+
+KEY_COLUMNS = ['x', 'y', 'complaint_type', 'borough', 'month']
+GRID_COLUMNS = ['level'] + KEY_COLUMNS + ['count']
+# One row per complaint counted (+1) or taken back (-1), tagged with the update that did it
+LEDGER_COLUMNS = ['unique_key', 'update'] + KEY_COLUMNS + ['count']
+
+# Appended batches to accept before summing the table back to one row per key
+COMPACT_EVERY = 20
+
+# Up to this many possible (area, type, borough, month) keys, area counts use one dense bincount
+DENSE_KEYS = 1 << 24
+
+def mercator_cells(lat, lon, level):
+    """Web Mercator (slippy map) grid cell of each point: at level z + 8 a cell is one pixel of tile zoom z"""
+    n = 2.0 ** level
+    lat_rad = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * n
+    return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+
+def cell_lon(x, level):
+    """Longitude of a cell's west edge (x + 0.5 for its center)"""
+    return np.asarray(x, dtype=np.float64) / 2.0 ** level * 360.0 - 180.0
+
+def cell_lat(y, level):
+    """Latitude of a cell's north edge (y + 1 for its south edge)"""
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y, dtype=np.float64) / 2.0 ** level))))
+
+def _spread_bits(v):
+    """Put a zero bit between each of the low 32 bits of v"""
+    v = np.asarray(v, dtype=np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v.astype(np.int64)
+
+def morton_keys(x, y):
+    """Z-order key of each cell: a cell's descendants k levels finer have keys key << 2k up to (key + 1) << 2k"""
+    return (_spread_bits(x) << 1) | _spread_bits(y)
+
+def ledger_entries(complaints, update):
+    """+1 ledger rows: the CELL_LEVEL cell, type, borough and month each complaint counts toward"""
+    complaints = complaints.dropna(subset=['latitude', 'longitude'])
+    x, y = mercator_cells(complaints['latitude'].to_numpy(), complaints['longitude'].to_numpy(),
+                          CELL_LEVEL)
+    months = pd.to_datetime(complaints['created_date']).to_numpy().astype('datetime64[M]')
+    return pd.DataFrame({'unique_key': complaints['unique_key'].astype(str).to_numpy(),
+                         'update': np.full(len(complaints), update, dtype=np.int64),
+                         'x': x, 'y': y,
+                         'complaint_type': complaints['complaint_type'].to_numpy(),
+                         'borough': complaints['borough'].to_numpy(),
+                         'month': months.astype('datetime64[s]'),
+                         'count': np.ones(len(complaints), dtype=np.int64)})
+
+def count_cells(entries):
+    """Ledger rows summed per (CELL_LEVEL cell, type, borough, month); keys that cancel out are dropped"""
+    cells = entries.groupby(KEY_COLUMNS, as_index=False, dropna=False)['count'].sum()
+    return cells[cells['count'] != 0]
+
+def sum_cells(cells):
+    """One row per key, summing counts (keys appear several times after appends)"""
+    cells = cells.groupby(['level'] + KEY_COLUMNS, as_index=False, dropna=False, sort=False)['count'].sum()
+    return cells[cells['count'] != 0]
+
+def add_levels(base):
+    """CELL_LEVEL counts plus every coarser level in LEVELS, each summed from the one below"""
+    frames = [base.assign(level=CELL_LEVEL)]
+    current = base
+    for finer, level in zip(LEVELS, LEVELS[1:]):
+        shift = finer - level
+        current = (current.assign(x=current['x'].to_numpy() >> shift, y=current['y'].to_numpy() >> shift)
+                          .groupby(KEY_COLUMNS, as_index=False, dropna=False)['count'].sum())
+        # A fix that moves a complaint within a coarser cell nets out there
+        current = current[current['count'] != 0]
+        frames.append(current.assign(level=level))
+    cells = pd.concat(frames, ignore_index=True)[GRID_COLUMNS]
+    # Stored partitioned by level (a level filter reads one folder), sorted by position within it
+    return cells.sort_values(['level', 'x', 'y'], ascending=[False, True, True], ignore_index=True)
+
+def load_state(state_path=STATE_PATH):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_state(state, state_path=STATE_PATH):
+    """Write the state atomically"""
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+def latest_versions(complaints, retracted):
+    """The last version of every unique_key, without the retracted ones.
+
+    complaints must be in append order, as load_table returns them.
+    """
+    complaints = complaints.assign(unique_key=complaints['unique_key'].astype(str))
+    complaints = complaints.drop_duplicates('unique_key', keep='last')
+    return complaints[~complaints['unique_key'].isin(retracted)]
+
+def load_retractions(files=None):
+    """Retracted unique_keys (all of them, or only those in the given part files)"""
+    if stored_table_path('complaint_retractions') is None or files == {}:
+        return pd.Index([], dtype=str)
+    keys = load_table('complaint_retractions', columns=['unique_key'], files=files)['unique_key']
+    return pd.Index(keys.astype(str).unique())
+
+def retract(keys):
+    """Record unique_keys as retracted; update_grid takes them out of the grid on its next run"""
+    keys = pd.Index(pd.Series(keys, dtype=str).str.strip().unique())
+    keys = keys[keys != '']
+    append_table(pd.DataFrame({'unique_key': keys,
+                               'retracted_at': pd.Timestamp.now().floor('s')}), 'complaint_retractions')
+    return len(keys)
+
+def recount():
+    """Ledger entries of every current complaint, straight from the complaint store"""
+    complaints = latest_versions(load_table('complaints', columns=COMPLAINT_COLUMNS), load_retractions())
+    return ledger_entries(complaints, 0)
+
+def current_entries(keys):
+    """What each of these unique_keys counts toward right now, summed over the ledger"""
+    if not len(keys):
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    ledger = load_table('grid_ledger', columns=LEDGER_COLUMNS, filters=[('unique_key', 'in', list(keys))])
+    entries = ledger.groupby(['unique_key'] + KEY_COLUMNS, as_index=False, dropna=False)['count'].sum()
+    return entries[entries['count'] != 0]
+
+def update_grid(full=False, state_path=STATE_PATH):
+    """Bring the complaint_cells table up to date with the complaint store"""
+    files, retraction_files = table_files('complaints'), table_files('complaint_retractions')
+    state = None if full else load_state(state_path)
+    if state is not None and (stored_table_path('complaint_cells') is None or 'files' not in state or
+                              stored_table_path('grid_ledger') is None):
+        state = None
+    if state is not None:
+        rewritten = [f for f, stat in state['files'].items() if files.get(f) != stat]
+        rewritten += [f for f, stat in state['retraction_files'].items() if retraction_files.get(f) != stat]
+        if rewritten:
+            print(f"⚠️  {len(rewritten)} counted file(s) changed or went away since the last run: rebuilding")
+            state = None
+
+    if state is None:
+        with instrumentation.stage('load'):
+            complaints = latest_versions(load_table('complaints', columns=COMPLAINT_COLUMNS),
+                                         load_retractions())
+        print(f"🧮 Building the complaint grid from {len(complaints):,} complaints")
+        with instrumentation.stage('bin'):
+            entries = ledger_entries(complaints, 0)
+            cells = add_levels(count_cells(entries))
+        with instrumentation.stage('save'):
+            save_table(cells, 'complaint_cells', partition_by=['level'])
+            save_table(entries, 'grid_ledger', partition_by=['update'])
+        instrumentation.count('complaints', len(complaints))
+        instrumentation.count('cells', len(cells))
+        # `built` changes on every rebuild, so readers know to start over too
+        state = {'built': datetime.now().isoformat(), 'update': 0, 'files': files,
+                 'retraction_files': retraction_files, 'appends': 0}
+        save_state(state, state_path)
+        print(f"✓ {len(cells):,} grid rows written (levels {', '.join(map(str, LEVELS))})")
+        return state
+
+    new_files = {f: stat for f, stat in files.items() if f not in state['files']}
+    new_retraction_files = {f: stat for f, stat in retraction_files.items()
+                            if f not in state['retraction_files']}
+    if not new_files and not new_retraction_files:
+        print("✓ The complaint grid is up to date")
+        return state
+
+    with instrumentation.stage('load'):
+        new = (load_table('complaints', columns=COMPLAINT_COLUMNS, files=new_files) if new_files
+               else pd.DataFrame(columns=COMPLAINT_COLUMNS))
+        retracted = load_retractions(new_retraction_files)
+        new = latest_versions(new, load_retractions() if len(new) else retracted)
+        # Any of these keys may already be counted under an earlier version
+        # (a fix can move created_date anywhere), so look them all up
+        previous = current_entries(new['unique_key'].tolist() + retracted.tolist())
+    print(f"🧮 {len(new):,} new or fixed complaints, {len(retracted):,} retractions "
+          f"({len(previous):,} earlier entries to take back)")
+
+    update = state['update'] + 1
+    with instrumentation.stage('bin'):
+        delta = ledger_entries(new, update)
+        if len(previous):
+            delta = pd.concat([previous.assign(update=update, count=-previous['count'])[LEDGER_COLUMNS],
+                               delta], ignore_index=True)
+        cells = add_levels(count_cells(delta))
+    instrumentation.count('complaints', len(new))
+    instrumentation.count('retractions', len(retracted))
+    instrumentation.count('cells', len(cells))
+
+    with instrumentation.stage('save'):
+        if len(delta):
+            append_table(delta, 'grid_ledger', partition_by=['update'])
+        if len(cells) and state['appends'] + 1 >= COMPACT_EVERY:
+            cells = sum_cells(pd.concat([load_table('complaint_cells'), cells], ignore_index=True))
+            save_table(cells.sort_values(['level', 'x', 'y'], ascending=[False, True, True]),
+                       'complaint_cells', partition_by=['level'])
+            state['appends'] = 0
+            print(f"✓ Compacted the grid to {len(cells):,} rows")
+        elif len(cells):
+            append_table(cells, 'complaint_cells', partition_by=['level'])
+            state['appends'] += 1
+
+    state.update(update=update, files=files, retraction_files=retraction_files)
+    save_state(state, state_path)
+    print(f"✓ Update {update}: {len(delta):,} ledger rows, {len(cells):,} grid rows written")
+    return state
+
+def check_grid():
+    """Compare the stored grid with a recount from the complaint store; returns the differing rows"""
+    stored = sum_cells(load_table('complaint_cells', columns=GRID_COLUMNS))
+    fresh = add_levels(count_cells(recount()))
+    merged = stored.merge(fresh, on=['level'] + KEY_COLUMNS, how='outer', suffixes=('', '_recount'))
+    differs = merged['count'].fillna(0).to_numpy() != merged['count_recount'].fillna(0).to_numpy()
+    return merged[differs]
+
+def _cover(bbox, classify, levels=LEVELS):
+    """Cells that make up each shape, coarsest first.
+
+    bbox is (lon0, lat0, lon1, lat1) arrays, one entry per shape.
+    classify(shape, lon0, lat0, lon1, lat1) → (inside, outside) says which
+    cell boxes lie wholly inside / outside their shape; the rest are split
+    into their children at the next level. Returns {level: (shape, x, y)}
+    of the cells wholly inside, and (shape, x, y) of the cells still on an
+    edge at the last level before the finest.
+    """
+    lon0, lat0, lon1, lat1 = (np.asarray(b, dtype=np.float64) for b in bbox)
+    coarse = levels[-1]
+    x0, y0 = mercator_cells(lat1, lon0, coarse)   # north-west corner
+    x1, y1 = mercator_cells(lat0, lon1, coarse)   # south-east corner
+
+    # Every coarse cell touching each shape's bounding box
+    width, n = x1 - x0 + 1, (x1 - x0 + 1) * (y1 - y0 + 1)
+    shape = np.repeat(np.arange(len(n)), n)
+    offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    x = np.repeat(x0, n) + offset % np.repeat(width, n)
+    y = np.repeat(y0, n) + offset // np.repeat(width, n)
+
+    inside_cells = {}
+    coarse_to_fine = levels[::-1]
+    for level, finer in zip(coarse_to_fine, coarse_to_fine[1:]):
+        inside, outside = classify(shape, cell_lon(x, level), cell_lat(y + 1, level),
+                                   cell_lon(x + 1, level), cell_lat(y, level))
+        inside_cells[level] = (shape[inside], x[inside], y[inside])
+        edge = ~inside & ~outside
+        if finer == levels[0]:
+            return inside_cells, (shape[edge], x[edge], y[edge])
+
+        # Split the cells on an edge into their children
+        step = 1 << (finer - level)
+        dx, dy = np.meshgrid(np.arange(step), np.arange(step))
+        shape = np.repeat(shape[edge], step * step)
+        x = (x[edge, None] * step + dx.ravel()).ravel()
+        y = (y[edge, None] * step + dy.ravel()).ravel()
+
+def circle_tests(lats, lons, radius_km):
+    """_cover arguments plus a point test for circles of radius_km around (lat, lon) centers"""
+    centers = project_km(lats, lons)
+    dlat, dlon = radius_km / KM_PER_DEG_LAT, radius_km / KM_PER_DEG_LON
+    lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+
+    def classify(shape, lon0, lat0, lon1, lat1):
+        cx, cy = centers[shape, 0], centers[shape, 1]
+        low, high = project_km(lat0, lon0), project_km(lat1, lon1)
+        near = np.hypot(np.clip(cx, low[:, 0], high[:, 0]) - cx, np.clip(cy, low[:, 1], high[:, 1]) - cy)
+        far = np.hypot(np.maximum(np.abs(low[:, 0] - cx), np.abs(high[:, 0] - cx)),
+                       np.maximum(np.abs(low[:, 1] - cy), np.abs(high[:, 1] - cy)))
+        return far <= radius_km, near > radius_km
+
+    def contains(shape, lon, lat):
+        points = project_km(lat, lon)
+        return np.hypot(points[:, 0] - centers[shape, 0], points[:, 1] - centers[shape, 1]) <= radius_km
+
+    return (lons - dlon, lats - dlat, lons + dlon, lats + dlat), classify, contains
+
+def polygon_tests(geoms):
+    """_cover arguments plus a point test for shapely (lon/lat) polygons"""
+    import shapely
+
+    shapely.prepare(geoms)
+
+    def classify(shape, lon0, lat0, lon1, lat1):
+        boxes = shapely.box(lon0, lat0, lon1, lat1)
+        return shapely.contains(geoms[shape], boxes), ~shapely.intersects(geoms[shape], boxes)
+
+    def contains(shape, lon, lat):
+        return shapely.contains_xy(geoms[shape], lon, lat)
+
+    return np.array(shapely.bounds(geoms)).T, classify, contains
+
+AREA_COUNT_COLUMNS = ['area', 'complaint_type', 'borough', 'month', 'count']
+
+def pivot_counts(counts, n_areas):
+    """Per-area counts (AREA_COUNT_COLUMNS rows) → complaints per area and family and each area's main borough.
+
+    Returns a DataFrame with one column per taxonomy.FAMILIES entry and an
+    array of the borough with the most complaints in each area (None if it
+    has none).
+    """
+    area, weights = counts['area'].to_numpy(np.int64), counts['count'].to_numpy()
+    family = family_codes(counts['complaint_type']).astype(np.int64)
+    borough_codes, boroughs = pd.factorize(counts['borough'], sort=True, use_na_sentinel=False)
+    by_family = np.bincount(area * len(FAMILIES) + family, weights=weights,
+                            minlength=n_areas * len(FAMILIES)).reshape(n_areas, len(FAMILIES))
+    by_borough = np.bincount(area * len(boroughs) + borough_codes, weights=weights,
+                             minlength=n_areas * len(boroughs)).reshape(n_areas, len(boroughs))
+
+    names = np.array(list(boroughs) + [None], dtype=object)
+    main = np.where(by_borough.sum(axis=1) > 0,
+                    by_borough.argmax(axis=1) if len(boroughs) else 0, len(boroughs))
+    return pd.DataFrame(by_family.astype(np.int64), columns=list(FAMILIES)), names[main]
+
+class ComplaintGrid:
+    """The complaint_cells table in memory, ready for area queries.
+
+    Each level's rows are sorted by Morton key, so the rows of any cell,
+    or of all its descendants at a finer level, are found with two binary
+    searches. Queries return per-area counts by type, borough and month
+    (AREA_COUNT_COLUMNS); pivot_counts turns them into feature columns.
+    """
+
+    def __init__(self, cells):
+        type_codes, types = pd.factorize(cells['complaint_type'], sort=True, use_na_sentinel=False)
+        borough_codes, boroughs = pd.factorize(cells['borough'], sort=True, use_na_sentinel=False)
+        month_codes, months = pd.factorize(cells['month'], sort=True, use_na_sentinel=False)
+        self.types = np.array(types, dtype=object)
+        self.boroughs = np.array(boroughs, dtype=object)
+        self.months = np.asarray(months)
+
+        levels = cells['level'].to_numpy()
+        x, y, counts = cells['x'].to_numpy(), cells['y'].to_numpy(), cells['count'].to_numpy()
+        self.levels = {}
+        for level in LEVELS:
+            rows = np.flatnonzero(levels == level)
+            keys = morton_keys(x[rows], y[rows])
+            order = np.argsort(keys, kind='stable')
+            rows = rows[order]
+            self.levels[level] = {'key': keys[order], 'x': x[rows], 'y': y[rows],
+                                  'type': type_codes[rows], 'borough': borough_codes[rows],
+                                  'month': month_codes[rows], 'count': counts[rows]}
+
+    @classmethod
+    def load(cls, since=None, until=None):
+        """Load the stored grid, keeping only the months from `since` through `until` (if given)"""
+        filters = []
+        if since is not None:
+            filters.append(('month', '>=', pd.Timestamp(since).to_period('M').to_timestamp()))
+        if until is not None:
+            filters.append(('month', '<=', pd.Timestamp(until).to_period('M').to_timestamp()))
+        return cls(load_table('complaint_cells', columns=GRID_COLUMNS, filters=filters or None))
+
+    def _rows(self, level, shape, x, y, depth=0):
+        """(shape, row) of every row at `level` that lies in the given cells `depth` levels up"""
+        table = self.levels[level]
+        keys = morton_keys(x, y)
+        start = np.searchsorted(table['key'], keys << (2 * depth), 'left')
+        lengths = np.searchsorted(table['key'], (keys + 1) << (2 * depth), 'left') - start
+        # Row positions of every cell's range, back to back
+        rows = np.arange(lengths.sum()) + np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+        return np.repeat(shape, lengths), rows
+
+    def _shape_counts(self, n_shapes, bbox, classify, contains):
+        """Counts for shapes given as circle_tests / polygon_tests output (see _counts)"""
+        inside_cells, (edge_shape, edge_x, edge_y) = _cover(bbox, classify)
+        parts = [(self.levels[level], *self._rows(level, *cells)) for level, cells in inside_cells.items()]
+
+        # Finest-level rows in the edge cells count if their cell's center is inside
+        table = self.levels[CELL_LEVEL]
+        shape, rows = self._rows(CELL_LEVEL, edge_shape, edge_x, edge_y, depth=CELL_LEVEL - LEVELS[1])
+        keep = contains(shape, cell_lon(table['x'][rows] + 0.5, CELL_LEVEL),
+                        cell_lat(table['y'][rows] + 0.5, CELL_LEVEL))
+        parts.append((table, shape[keep], rows[keep]))
+
+        area = np.concatenate([shape for _, shape, _ in parts])
+        rows = {column: np.concatenate([table[column][rows] for table, _, rows in parts])
+                for column in ('type', 'borough', 'month', 'count')}
+        return self._counts(area, rows, n_shapes)
+
+    def _counts(self, area, rows, n_areas):
+        """Per-area counts (AREA_COUNT_COLUMNS) from each matched row's area and its type/borough/month/count.
+
+        The (area, type, borough, month) codes are packed into one integer,
+        so a single bincount sums the rows up (over np.unique's codes when
+        there are more than DENSE_KEYS possible keys).
+        """
+        if not len(area):
+            return pd.DataFrame(columns=AREA_COUNT_COLUMNS)
+        key, size = area.astype(np.int64), n_areas
+        for column, values in (('type', self.types), ('borough', self.boroughs), ('month', self.months)):
+            key, size = key * len(values) + rows[column], size * len(values)
+        if size <= DENSE_KEYS:
+            counts = np.bincount(key, weights=rows['count'], minlength=size).astype(np.int64)
+            keys = np.flatnonzero(counts)
+            counts = counts[keys]
+        else:
+            keys, inverse = np.unique(key, return_inverse=True)
+            counts = np.bincount(inverse, weights=rows['count'], minlength=len(keys)).astype(np.int64)
+            keys, counts = keys[counts != 0], counts[counts != 0]
+
+        keys, month = np.divmod(keys, len(self.months))
+        keys, borough = np.divmod(keys, len(self.boroughs))
+        area, complaint_type = np.divmod(keys, len(self.types))
+        return pd.DataFrame({'area': area, 'complaint_type': self.types[complaint_type],
+                             'borough': self.boroughs[borough], 'month': self.months[month],
+                             'count': counts})
+
+    def radius_counts(self, lats, lons, radius_km):
+        """Counts within radius_km of each (lat, lon) center (see _counts)"""
+        return self._shape_counts(len(lats), *circle_tests(lats, lons, radius_km))
+
+    def polygon_counts(self, geoms):
+        """Counts inside each shapely (lon/lat) polygon (see _counts)"""
+        return self._shape_counts(len(geoms), *polygon_tests(geoms))
+
+    def level_counts(self, level):
+        """Counts for every non-empty cell at any level up to CELL_LEVEL.
+
+        Returns the cells' x and y at that level plus their counts (see
+        _counts, area is the position in x and y), summed up from the
+        closest stored level at or below it.
+        """
+        if level > CELL_LEVEL:
+            raise ValueError(f"The grid has no cells finer than level {CELL_LEVEL}")
+        stored = min(l for l in LEVELS if l >= level)
+        table = self.levels[stored]
+        # Rows are in Morton order, so each coarser cell's rows are already contiguous
+        keys = table['key'] >> (2 * (stored - level))
+        cell, unique_keys = pd.factorize(keys, sort=True)
+        starts = np.searchsorted(keys, unique_keys)
+        counts = self._counts(cell, table, len(unique_keys))
+        shift = stored - level
+        return table['x'][starts] >> shift, table['y'][starts] >> shift, counts
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the hierarchical complaint grid")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild from every complaint instead of only the new ones")
+    parser.add_argument("--retract", metavar="KEYS_FILE",
+                        help="Take the unique_keys listed in this file (one per line) out of the grid")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the grid with a full recount and exit with 1 if they differ")
+    args = parser.parse_args()
+
+    if args.retract:
+        with open(args.retract) as f:
+            print(f"🗑️  Retracting {retract(f.read().split()):,} complaints")
+    update_grid(full=args.full)
+
+    if args.check:
+        with instrumentation.stage('check'):
+            differing = check_grid()
+        if len(differing):
+            print(f"❌ {len(differing):,} grid rows differ from a full recount:")
+            print(differing.head(20))
+            instrumentation.exit(1)
+        print("✓ The grid matches a full recount")
+    print("\n✅ Done!")
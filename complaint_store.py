@@ -0,0 +1,205 @@
+# complaint_store.py - Compact, memory-mappable complaint columns
+# Usage: python complaint_store.py
+"""Complaint store: every current complaint as a handful of typed arrays.
+
+  latitude, longitude   float32 (~0.5 m at NYC's latitude)
+  type                  int16 code into `types` (the raw complaint types)
+  family                int8 code into taxonomy.FAMILIES
+  borough               int8 code into `boroughs`
+  created               datetime64[s], rows sorted by it
+  key                   uint64 hash of unique_key
+
+That's 28 bytes a row instead of the object strings of the complaint
+frame. Each column is saved as its own .npy file under STORE_DIR, and
+ComplaintStore.open() memory-maps them, so opening is instant and only
+the pages a query touches are ever read. Rows are the latest version of
+each unique_key without retracted ones, same as the complaint grid.
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import instrumentation
+from complaint_grid import COMPLAINT_COLUMNS, latest_versions, load_retractions
+from spatial import KM_PER_DEG_LAT, KM_PER_DEG_LON, project_km
+from storage import load_table
+from taxonomy import FAMILIES, family_lookup
+
+STORE_DIR = "data/processed/complaint_store"
+
+COLUMN_DTYPES = {
+    'latitude': np.float32,
+    'longitude': np.float32,
+    'type': np.int16,
+    'family': np.int8,
+    'borough': np.int8,
+    'created': 'datetime64[s]',
+    'key': np.uint64,
+}
+
+def hash_keys(unique_keys):
+    """uint64 hash of each unique_key (stable across runs and machines)"""
+    return pd.util.hash_array(np.asarray(unique_keys, dtype=object).astype(str).astype(object))
+
+class ComplaintStore:
+    """Typed complaint columns (see the module docstring) plus a small query API.
+
+    Queries return row positions, which frame() turns back into a
+    DataFrame with the strings decoded.
+    """
+
+    def __init__(self, columns, types, boroughs):
+        self.columns = columns
+        self.types = list(types)
+        self.boroughs = list(boroughs)
+        self._key_order = None
+
+    @classmethod
+    def from_frame(cls, complaints):
+        """Build a store from a complaint frame (rows without coordinates or date are left out)"""
+        created = pd.to_datetime(complaints['created_date']).to_numpy().astype('datetime64[s]')
+        keep = (complaints['latitude'].notna() & complaints['longitude'].notna()).to_numpy() & ~np.isnat(created)
+        complaints, created = complaints[keep], created[keep]
+        order = np.argsort(created, kind='stable')
+
+        type_codes, types = pd.factorize(complaints['complaint_type'], sort=True)
+        borough_codes, boroughs = pd.factorize(complaints['borough'], sort=True)
+        if len(types) > np.iinfo(np.int16).max or len(boroughs) > np.iinfo(np.int8).max:
+            raise ValueError(f"Too many distinct types ({len(types)}) or boroughs ({len(boroughs)})")
+        # Missing types/boroughs keep code -1; their family is 'other'
+        families = np.append(family_lookup(types), np.int8(FAMILIES.index('other')))[type_codes]
+
+        columns = {
+            'latitude': complaints['latitude'].to_numpy(np.float32)[order],
+            'longitude': complaints['longitude'].to_numpy(np.float32)[order],
+            'type': type_codes.astype(np.int16)[order],
+            'family': families[order],
+            'borough': borough_codes.astype(np.int8)[order],
+            'created': created[order],
+            'key': hash_keys(complaints['unique_key'].to_numpy())[order],
+        }
+        return cls(columns, types, boroughs)
+
+    def save(self, path=STORE_DIR):
+        """Write one .npy per column plus meta.json, replacing any store at path"""
+        tmp_path = path.rstrip('/') + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in self.columns.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'rows': len(self), 'types': self.types, 'boroughs': self.boroughs}, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def open(cls, path=STORE_DIR, mmap=True):
+        """Open a saved store; with mmap the columns are read-only views of the files, nothing is copied"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                   for name in COLUMN_DTYPES}
+        return cls(columns, meta['types'], meta['boroughs'])
+
+    def __len__(self):
+        return len(self.columns['created'])
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def time_range(self, since=None, until=None):
+        """Row slice of complaints created in [since, until)"""
+        created = self.columns['created']
+        start = 0 if since is None else np.searchsorted(created, np.datetime64(pd.Timestamp(since), 's'))
+        stop = len(created) if until is None else np.searchsorted(created, np.datetime64(pd.Timestamp(until), 's'))
+        return slice(int(start), int(stop))
+
+    def select(self, since=None, until=None, bbox=None, types=None, families=None, boroughs=None):
+        """Row positions matching every given filter.
+
+        since/until bound the creation time ([since, until), found by binary
+        search since rows are in time order), bbox is (lat0, lon0, lat1, lon1),
+        and types / families / boroughs are lists of names.
+        """
+        window = self.time_range(since, until)
+        keep = np.ones(window.stop - window.start, dtype=bool)
+        if bbox is not None:
+            lat0, lon0, lat1, lon1 = bbox
+            lat, lon = self.columns['latitude'][window], self.columns['longitude'][window]
+            keep &= (lat >= lat0) & (lat <= lat1) & (lon >= lon0) & (lon <= lon1)
+        for column, names, known in (('type', types, self.types), ('family', families, FAMILIES),
+                                     ('borough', boroughs, self.boroughs)):
+            if names is not None:
+                codes = [known.index(name) for name in names if name in known]
+                keep &= np.isin(self.columns[column][window], codes)
+        return window.start + np.flatnonzero(keep)
+
+    def within(self, lat, lon, radius_km, **filters):
+        """Row positions within radius_km of (lat, lon), plus any select() filters"""
+        dlat, dlon = radius_km / KM_PER_DEG_LAT, radius_km / KM_PER_DEG_LON
+        rows = self.select(bbox=(lat - dlat, lon - dlon, lat + dlat, lon + dlon), **filters)
+        points = project_km(self.columns['latitude'][rows].astype(np.float64),
+                            self.columns['longitude'][rows].astype(np.float64))
+        center = project_km(np.array([lat]), np.array([lon]))[0]
+        return rows[np.hypot(*(points - center).T) <= radius_km]
+
+    def in_polygon(self, geom, **filters):
+        """Row positions inside a shapely (lon/lat) polygon, plus any select() filters"""
+        import shapely
+
+        lon0, lat0, lon1, lat1 = geom.bounds
+        rows = self.select(bbox=(lat0, lon0, lat1, lon1), **filters)
+        inside = shapely.contains_xy(geom, self.columns['longitude'][rows].astype(np.float64),
+                                     self.columns['latitude'][rows].astype(np.float64))
+        return rows[inside]
+
+    def find(self, unique_keys):
+        """Row position of each unique_key (-1 where it isn't in the store)"""
+        wanted = hash_keys(unique_keys)
+        if not len(self):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        if self._key_order is None:
+            self._key_order = np.argsort(self.columns['key'])
+        sorted_keys = self.columns['key'][self._key_order]
+        at = np.minimum(np.searchsorted(sorted_keys, wanted), len(sorted_keys) - 1)
+        return np.where(sorted_keys[at] == wanted, self._key_order[at], -1)
+
+    def frame(self, rows=None, columns=None):
+        """DataFrame of the given rows (all by default) with types, families and boroughs decoded.
+
+        columns picks from latitude, longitude, complaint_type, family,
+        borough and created_date (all of them by default).
+        """
+        rows = slice(None) if rows is None else rows
+        types = np.array(self.types + [None], dtype=object)
+        boroughs = np.array(self.boroughs + [None], dtype=object)
+        decoders = {
+            'latitude': lambda: self.columns['latitude'][rows],
+            'longitude': lambda: self.columns['longitude'][rows],
+            'complaint_type': lambda: types[self.columns['type'][rows]],
+            'family': lambda: pd.Categorical.from_codes(self.columns['family'][rows], categories=list(FAMILIES)),
+            'borough': lambda: boroughs[self.columns['borough'][rows]],
+            'created_date': lambda: self.columns['created'][rows],
+        }
+        return pd.DataFrame({name: decoders[name]() for name in columns or decoders})
+
+def build_store(path=STORE_DIR):
+    """Rebuild the store from the complaint table"""
+    with instrumentation.stage('load'):
+        complaints = latest_versions(load_table('complaints', columns=COMPLAINT_COLUMNS), load_retractions())
+    with instrumentation.stage('encode'):
+        store = ComplaintStore.from_frame(complaints)
+    with instrumentation.stage('save'):
+        store.save(path)
+    instrumentation.count('complaints', len(store))
+    return store
+
+if __name__ == "__main__":
+    store = build_store()
+    print(f"📦 {len(store):,} complaints, {store.nbytes / max(len(store), 1):.0f} bytes each "
+          f"({store.nbytes / 1e6:.1f} MB), {len(store.types)} types, {len(store.boroughs)} boroughs")
+    print(f"📁 Saved to {STORE_DIR}/")
+    print("\n✅ Done!")
@@ -1,6 +1,7 @@
 # create_labels.py
 import pandas as pd
 from config import NEIGHBORHOODS
+from storage import save_table
 
 print("=" * 60)
 print("🏷️  NEIGHBORHOOD LABELING")
@@ -47,7 +48,6 @@ print("\n" + "=" * 60)
 print("📊 YOUR LABELS:")
 print("=" * 60)
 print(df)
-print("\n📁 Saving to data/processed/labels.csv")
-
-df.to_csv("data/processed/labels.csv", index=False)
+path = save_table(df, 'labels')
+print(f"\n📁 Saved to {path}")
 print("✅ Done!")
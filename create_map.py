@@ -1,17 +1,28 @@
 # create_map.py
+# Usage: python create_map.py [--mode auto|markers|layer]
+#        [--warehouse [PATH] [--bbox LAT0,LON0,LAT1,LON1] [--since DATE] [--until DATE] [--type TYPE ...]]
+import json
+import os
 import folium
-import pandas as pd
-from config import NEIGHBORHOODS
+from folium.plugins import HeatMap, MarkerCluster
+from folium.utilities import JsCode
+import instrumentation
+from build_tiles import MAX_ZOOM, MIN_ZOOM, TILE_DIR
+from storage import load_table
+
+MAP_PATH = "outputs/citysense_map.html"
 
-print("🗺️  Creating interactive map...\n")
+# Up to this many areas, auto mode draws the labelled per-area markers;
+# past it, one clustered GeoJSON layer
+MARKER_LIMIT = 200
 
-# Load predictions
-predictions = pd.read_csv("data/processed/predictions.csv")
+# Most warehouse complaints drawn as heatmap points (a random sample past that)
+HEATMAP_POINTS = 50_000
 
 # Color mapping
 color_map = {
     'positive': '#2ecc71',  # Green
-    'neutral': '#f39c12',   # Orange  
+    'neutral': '#f39c12',   # Orange
     'negative': '#e74c3c'   # Red
 }
 
@@ -21,88 +32,58 @@ emoji_map = {
     'negative': '😟'
 }
 
-# Create map centered on NYC
-m = folium.Map(
-    location=[40.7580, -73.9855],
-    zoom_start=11,
-    tiles='CartoDB positron'
-)
-
-print("📍 Adding neighborhoods to map...\n")
-
-# Add markers for each neighborhood
-for _, row in predictions.iterrows():
-    # Get neighborhood coordinates
-    hood = next(h for h in NEIGHBORHOODS if h['name'] == row['name'])
-    
-    emoji = emoji_map.get(row['predicted_category'], '❓')
-    
-    # Create detailed popup
-    popup_html = f"""
-    <div style="font-family: Arial; width: 250px; padding: 10px;">
-        <h3 style="margin: 0 0 10px 0; color: {color_map[row['predicted_category']]};">
-            {emoji} {row['name'].replace('_', ' ')}
-        </h3>
-        
-        <div style="background: #f0f0f0; padding: 8px; border-radius: 5px; margin-bottom: 10px;">
-            <strong>Prediction: {row['predicted_category'].upper()}</strong>
-        </div>
-        
-        <p style="margin: 5px 0;"><strong>Scores:</strong></p>
-        <p style="margin: 3px 0;">🛡️ Safety: {row['safety']}/5</p>
-        <p style="margin: 3px 0;">🎉 Liveliness: {row['liveliness']}/5</p>
-        <p style="margin: 3px 0;">✨ Cleanliness: {row['cleanliness']}/5</p>
-        
-        <hr style="margin: 10px 0;">
-        
-        <p style="margin: 5px 0;"><strong>311 Data:</strong></p>
-        <p style="margin: 3px 0; font-size: 11px;">Total complaints: {int(row['total_complaints'])}</p>
-        <p style="margin: 3px 0; font-size: 11px;">Noise: {int(row['noise_complaints'])}</p>
-        <p style="margin: 3px 0; font-size: 11px;">Graffiti: {int(row['graffiti'])}</p>
-        
-        <p style="margin: 5px 0;"><strong>Visual Features:</strong></p>
-        <p style="margin: 3px 0; font-size: 11px;">Green ratio: {row['avg_green_ratio']:.2f}</p>
-        <p style="margin: 3px 0; font-size: 11px;">Brightness: {row['avg_brightness']:.0f}</p>
-    </div>
-    """
-    
-    # Add circle marker
-    folium.CircleMarker(
-        location=[hood['lat'], hood['lon']],
-        radius=20,
-        popup=folium.Popup(popup_html, max_width=300),
-        color='white',
-        fillColor=color_map[row['predicted_category']],
-        fillOpacity=0.8,
-        weight=3
-    ).add_to(m)
-    
-    # Add neighborhood label
-    folium.Marker(
-        location=[hood['lat'] + 0.01, hood['lon']],
-        icon=folium.DivIcon(html=f"""
-            <div style="
-                font-size: 11pt; 
-                color: white;
-                font-weight: bold;
-                text-shadow: -1px -1px 0 #000, 1px -1px 0 #000, -1px 1px 0 #000, 1px 1px 0 #000;
-                white-space: nowrap;
-            ">
-                {row['name'].replace('_', ' ')}
+# Per-area values the layer popups are built from
+POPUP_PROPERTIES = ['safety', 'liveliness', 'cleanliness', 'total_complaints',
+                    'noise_complaints', 'graffiti', 'avg_green_ratio', 'avg_brightness']
+
+# Styles each point and binds a popup that is only built (from the feature's
+# properties) when it is opened, so the page holds no per-area HTML
+LAYER_JS = """
+function (feature, layer) {
+    var colors = __COLORS__;
+    var emoji = __EMOJI__;
+    var p = feature.properties;
+    var escape = function (s) {
+        return String(s).replace(/[&<>"']/g, function (c) { return '&#' + c.charCodeAt(0) + ';'; });
+    };
+    var name = escape(p.name.replace(/_/g, ' '));
+    var color = colors[p.category] || '#95a5a6';
+    layer.setStyle({fillColor: color});
+    layer.bindTooltip(name);
+    layer.bindPopup(function () {
+        return `
+        <div style="font-family: Arial; width: 250px; padding: 10px;">
+            <h3 style="margin: 0 0 10px 0; color: ${color};">
+                ${emoji[p.category] || '❓'} ${name}
+            </h3>
+            <div style="background: #f0f0f0; padding: 8px; border-radius: 5px; margin-bottom: 10px;">
+                <strong>Prediction: ${escape(p.category).toUpperCase()}</strong>
             </div>
-        """)
-    ).add_to(m)
-    
-    print(f"  ✓ {row['name'].replace('_', ' '):20s} → {row['predicted_category']}")
+            <p style="margin: 5px 0;"><strong>Scores:</strong></p>
+            <p style="margin: 3px 0;">🛡️ Safety: ${p.safety}/5</p>
+            <p style="margin: 3px 0;">🎉 Liveliness: ${p.liveliness}/5</p>
+            <p style="margin: 3px 0;">✨ Cleanliness: ${p.cleanliness}/5</p>
+            <hr style="margin: 10px 0;">
+            <p style="margin: 5px 0;"><strong>311 Data:</strong></p>
+            <p style="margin: 3px 0; font-size: 11px;">Total complaints: ${p.total_complaints}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Noise: ${p.noise_complaints}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Graffiti: ${p.graffiti}</p>
+            <p style="margin: 5px 0;"><strong>Visual Features:</strong></p>
+            <p style="margin: 3px 0; font-size: 11px;">Green ratio: ${Number(p.avg_green_ratio).toFixed(2)}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Brightness: ${Number(p.avg_brightness).toFixed(0)}</p>
+        </div>`;
+    }, {maxWidth: 300});
+}
+""".replace('__COLORS__', json.dumps(color_map)).replace('__EMOJI__', json.dumps(emoji_map))
 
 # Add legend
 legend_html = '''
 <div style="
-    position: fixed; 
-    bottom: 50px; right: 50px; 
+    position: fixed;
+    bottom: 50px; right: 50px;
     width: 180px;
-    border: 3px solid grey; 
-    z-index: 9999; 
+    border: 3px solid grey;
+    z-index: 9999;
     background-color: white;
     padding: 15px;
     font-size: 14px;
@@ -115,15 +96,15 @@ legend_html = '''
     </p>
     <hr style="margin: 10px 0;">
     <p style="margin: 8px 0;">
-        <span style="color: #2ecc71; font-size: 18px;">●</span> 
+        <span style="color: #2ecc71; font-size: 18px;">●</span>
         <strong>Positive</strong>
     </p>
     <p style="margin: 8px 0;">
-        <span style="color: #f39c12; font-size: 18px;">●</span> 
+        <span style="color: #f39c12; font-size: 18px;">●</span>
         <strong>Neutral</strong>
     </p>
     <p style="margin: 8px 0;">
-        <span style="color: #e74c3c; font-size: 18px;">●</span> 
+        <span style="color: #e74c3c; font-size: 18px;">●</span>
         <strong>Negative</strong>
     </p>
     <hr style="margin: 10px 0;">
@@ -132,16 +113,15 @@ legend_html = '''
     </p>
 </div>
 '''
-m.get_root().html.add_child(folium.Element(legend_html))
 
 # Add title
 title_html = '''
 <div style="
-    position: fixed; 
-    top: 10px; 
-    left: 50px; 
+    position: fixed;
+    top: 10px;
+    left: 50px;
     width: 300px;
-    z-index: 9999; 
+    z-index: 9999;
     background-color: white;
     padding: 15px;
     border-radius: 10px;
@@ -153,17 +133,217 @@ title_html = '''
     </p>
 </div>
 '''
-m.get_root().html.add_child(folium.Element(title_html))
 
-# Save
-import os
-os.makedirs("outputs", exist_ok=True)
-m.save("outputs/citysense_map.html")
-
-print("\n" + "=" * 60)
-print("✅ MAP CREATED!")
-print("📁 Location: outputs/citysense_map.html")
-print("=" * 60)
-print("\n🎯 To view your map:")
-print("   open outputs/citysense_map.html")
-print("\nOr just double-click the file!\n")
+def with_locations(predictions):
+    """Predictions with lat/lon, looked up by name in config.NEIGHBORHOODS if the table has none"""
+    if {'lat', 'lon'} <= set(predictions.columns):
+        return predictions
+    from config import NEIGHBORHOODS
+
+    index = {h['name']: h for h in NEIGHBORHOODS}
+    return predictions.assign(lat=[index[name]['lat'] for name in predictions['name']],
+                              lon=[index[name]['lon'] for name in predictions['name']])
+
+def add_markers(m, predictions):
+    """One circle marker with an inline popup plus one name label per area"""
+    for _, row in predictions.iterrows():
+        emoji = emoji_map.get(row['predicted_category'], '❓')
+
+        # Create detailed popup
+        popup_html = f"""
+        <div style="font-family: Arial; width: 250px; padding: 10px;">
+            <h3 style="margin: 0 0 10px 0; color: {color_map[row['predicted_category']]};">
+                {emoji} {row['name'].replace('_', ' ')}
+            </h3>
+
+            <div style="background: #f0f0f0; padding: 8px; border-radius: 5px; margin-bottom: 10px;">
+                <strong>Prediction: {row['predicted_category'].upper()}</strong>
+            </div>
+
+            <p style="margin: 5px 0;"><strong>Scores:</strong></p>
+            <p style="margin: 3px 0;">🛡️ Safety: {row['safety']}/5</p>
+            <p style="margin: 3px 0;">🎉 Liveliness: {row['liveliness']}/5</p>
+            <p style="margin: 3px 0;">✨ Cleanliness: {row['cleanliness']}/5</p>
+
+            <hr style="margin: 10px 0;">
+
+            <p style="margin: 5px 0;"><strong>311 Data:</strong></p>
+            <p style="margin: 3px 0; font-size: 11px;">Total complaints: {int(row['total_complaints'])}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Noise: {int(row['noise_complaints'])}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Graffiti: {int(row['graffiti'])}</p>
+
+            <p style="margin: 5px 0;"><strong>Visual Features:</strong></p>
+            <p style="margin: 3px 0; font-size: 11px;">Green ratio: {row['avg_green_ratio']:.2f}</p>
+            <p style="margin: 3px 0; font-size: 11px;">Brightness: {row['avg_brightness']:.0f}</p>
+        </div>
+        """
+
+        # Add circle marker
+        folium.CircleMarker(
+            location=[row['lat'], row['lon']],
+            radius=20,
+            popup=folium.Popup(popup_html, max_width=300),
+            color='white',
+            fillColor=color_map[row['predicted_category']],
+            fillOpacity=0.8,
+            weight=3
+        ).add_to(m)
+
+        # Add neighborhood label
+        folium.Marker(
+            location=[row['lat'] + 0.01, row['lon']],
+            icon=folium.DivIcon(html=f"""
+                <div style="
+                    font-size: 11pt;
+                    color: white;
+                    font-weight: bold;
+                    text-shadow: -1px -1px 0 #000, 1px -1px 0 #000, -1px 1px 0 #000, 1px 1px 0 #000;
+                    white-space: nowrap;
+                ">
+                    {row['name'].replace('_', ' ')}
+                </div>
+            """)
+        ).add_to(m)
+
+        print(f"  ✓ {row['name'].replace('_', ' '):20s} → {row['predicted_category']}")
+
+def area_features(predictions):
+    """GeoJSON FeatureCollection of area points carrying just the popup values"""
+    values = predictions[POPUP_PROPERTIES].fillna(0)
+    values = values.assign(**{c: values[c].round(0).astype('int64')
+                              for c in ['total_complaints', 'noise_complaints', 'graffiti']},
+                           avg_green_ratio=values['avg_green_ratio'].round(3),
+                           avg_brightness=values['avg_brightness'].round(1))
+    properties = values.assign(name=predictions['name'].astype(str),
+                               category=predictions['predicted_category'].astype(str))
+    lons = predictions['lon'].round(5).tolist()
+    lats = predictions['lat'].round(5).tolist()
+    return {
+        'type': 'FeatureCollection',
+        'features': [{'type': 'Feature',
+                      'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                      'properties': props}
+                     for lon, lat, props in zip(lons, lats, properties.to_dict('records'))],
+    }
+
+def add_area_layer(m, predictions):
+    """All areas as one clustered GeoJSON layer of canvas-drawn circles"""
+    clusters = MarkerCluster(name='Neighborhoods', chunkedLoading=True, showCoverageOnHover=False,
+                             disableClusteringAtZoom=15).add_to(m)
+    folium.GeoJson(
+        area_features(predictions),
+        marker=folium.CircleMarker(radius=10, color='white', weight=2, fill=True, fill_opacity=0.8),
+        on_each_feature=JsCode(LAYER_JS),
+    ).add_to(clusters)
+
+def resolve_mode(mode, n_areas):
+    if mode == 'auto':
+        return 'markers' if n_areas <= MARKER_LIMIT else 'layer'
+    return mode
+
+def add_complaint_tiles(m, tiles_url):
+    """Heatmap of every complaint from the build_tiles.py pyramid, fetched per tile as the map moves"""
+    folium.TileLayer(
+        tiles=tiles_url,
+        attr='NYC 311',
+        name='311 complaints',
+        overlay=True,
+        opacity=0.75,
+        min_native_zoom=MIN_ZOOM,
+        max_native_zoom=MAX_ZOOM,
+    ).add_to(m)
+
+def add_complaint_points(m, complaints, name='311 complaints (warehouse)'):
+    """Heatmap of complaint points (a warehouse query), sampled down to HEATMAP_POINTS"""
+    points = complaints[['latitude', 'longitude']].dropna()
+    if len(points) > HEATMAP_POINTS:
+        points = points.sample(HEATMAP_POINTS, random_state=0)
+    HeatMap(points.round(5).to_numpy().tolist(), name=name, radius=8, blur=10).add_to(m)
+
+def build_map(predictions, mode='auto', tiles_url=None, complaints=None):
+    """tiles_url is the {z}/{x}/{y}.png template of the complaint tiles, relative to the page;
+    complaints (latitude / longitude rows) are drawn as a heatmap layer"""
+    mode = resolve_mode(mode, len(predictions))
+    predictions = with_locations(predictions)
+
+    # Create map centered on NYC; vector layers draw on one canvas instead of an SVG node per area
+    m = folium.Map(
+        location=[40.7580, -73.9855],
+        zoom_start=11,
+        tiles='CartoDB positron',
+        prefer_canvas=(mode == 'layer'),
+    )
+
+    if tiles_url:
+        add_complaint_tiles(m, tiles_url)
+    if complaints is not None:
+        add_complaint_points(m, complaints)
+
+    if mode == 'markers':
+        add_markers(m, predictions)
+    else:
+        add_area_layer(m, predictions)
+
+    if tiles_url or complaints is not None:
+        folium.LayerControl(collapsed=False).add_to(m)
+
+    m.get_root().html.add_child(folium.Element(legend_html))
+    m.get_root().html.add_child(folium.Element(title_html))
+    return m
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render the predictions as an interactive map")
+    parser.add_argument("--mode", choices=['auto', 'markers', 'layer'], default='auto',
+                        help=f"markers: labelled marker per area; layer: one clustered GeoJSON "
+                             f"layer; auto: markers up to {MARKER_LIMIT} areas")
+    parser.add_argument("--warehouse", nargs="?", const="", metavar="PATH",
+                        help="Add a heatmap of complaints queried from the SQLite warehouse "
+                             "(default warehouse.WAREHOUSE_PATH)")
+    parser.add_argument("--bbox", help="Warehouse query box: lat0,lon0,lat1,lon1")
+    parser.add_argument("--since", help="Warehouse query: complaints created on or after this time")
+    parser.add_argument("--until", help="Warehouse query: complaints created before this time")
+    parser.add_argument("--type", action="append", dest="types", help="Warehouse query: complaint type (repeatable)")
+    args = parser.parse_args()
+
+    print("🗺️  Creating interactive map...\n")
+
+    # Load predictions
+    with instrumentation.stage('load'):
+        predictions = load_table('predictions')
+
+    complaints = None
+    if args.warehouse is not None:
+        import warehouse
+        conn = warehouse.connect(args.warehouse or warehouse.WAREHOUSE_PATH)
+        bbox = warehouse.parse_bbox(args.bbox) if args.bbox else None
+        with instrumentation.stage('query'):
+            complaints = warehouse.query(conn, bbox, args.since, args.until, args.types,
+                                         columns=['latitude', 'longitude'])
+        print(f"🏛️  {len(complaints):,} complaints from the warehouse"
+              f"{f' (drawing {HEATMAP_POINTS:,})' if len(complaints) > HEATMAP_POINTS else ''}\n")
+
+    print("📍 Adding neighborhoods to map...\n")
+    instrumentation.count('markers', len(predictions))
+
+    with instrumentation.stage('render'):
+        tiles_url = None
+        if os.path.isdir(TILE_DIR):
+            tiles_url = os.path.relpath(TILE_DIR, os.path.dirname(MAP_PATH)) + '/{z}/{x}/{y}.png'
+        m = build_map(predictions, args.mode, tiles_url, complaints)
+    if resolve_mode(args.mode, len(predictions)) == 'layer':
+        print(f"  ✓ {len(predictions):,} areas in one clustered layer")
+
+    # Save
+    os.makedirs("outputs", exist_ok=True)
+    with instrumentation.stage('save'):
+        m.save(MAP_PATH)
+
+    print("\n" + "=" * 60)
+    print("✅ MAP CREATED!")
+    print(f"📁 Location: {MAP_PATH} ({os.path.getsize(MAP_PATH) / 1024:,.0f} KB)")
+    print("=" * 60)
+    print("\n🎯 To view your map:")
+    print(f"   open {MAP_PATH}")
+    print("\nOr just double-click the file!\n")
@@ -1,59 +1,286 @@
 # extract_311_features.py
+"""311 features per area, read from the complaint grid (complaint_grid.py).
+
+Areas are 1km circles around config.NEIGHBORHOODS by default, boundary
+polygons with --boundaries, or every grid cell at a level with --level.
+--since / --until restrict the counts to whole months.
+
+For circles and polygons the per-area counts (by type, borough and month)
+are kept in the area_counts table. Later runs only query the grid_ledger
+rows of the grid updates since the last run (new complaints, and -1 rows
+for fixed or retracted ones) and add them on, so a refresh costs time in
+proportion to the delta rather than the history. --check compares the
+result with a full recount from the complaint store.
+
+Grid counts test each ~30 m cell's center against the area, so near the
+edge of a circle or polygon they can be off by a few complaints from an
+exact point count (temporal_features.py counts exactly). With --exact the
+counts come from the compact complaint store (complaint_store.py) with the
+same exact complaint-to-area assignment as temporal_features, so
+features_311 and features_temporal then count the same complaints. With
+--warehouse they come straight from the SQLite warehouse (warehouse.py).
+Neither keeps grid or area_counts state.
+"""
+import os
 import pandas as pd
 import numpy as np
-from config import NEIGHBORHOODS
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate rough distance in km"""
-    return np.sqrt((lat1-lat2)**2 + (lon1-lon2)**2) * 111
-
-def extract_neighborhood_features(complaints_csv, neighborhoods):
-    """Extract features for each neighborhood from 311 data"""
-    df = pd.read_csv(complaints_csv)
-    
-    print(f"📊 Processing {len(df)} complaints...\n")
-    
-    features = []
-    for hood in neighborhoods:
-        print(f"Processing {hood['name']}...")
-        
-        # Get complaints within ~1km radius
-        df['distance'] = calculate_distance(
-            df['latitude'], df['longitude'], 
-            hood['lat'], hood['lon']
-        )
-        nearby = df[df['distance'] < 1.0]
-        
-        # Count by type
-        complaint_counts = nearby['complaint_type'].value_counts()
-        
-        features.append({
-            'name': hood['name'],
-            'lat': hood['lat'],
-            'lon': hood['lon'],
-            'total_complaints': len(nearby),
-            'noise_complaints': complaint_counts.get('Noise', 0),
-            'street_condition': complaint_counts.get('Street Condition', 0),
-            'graffiti': complaint_counts.get('Graffiti', 0),
-            'heat_hot_water': complaint_counts.get('Heat/Hot Water', 0),
-            'complaints_per_km2': len(nearby) / 3.14,  # rough area calculation
-        })
-    
-    df_features = pd.DataFrame(features)
-    
-    print(f"\n✅ Extracted 311 features!")
-    print(f"📁 Saving to data/processed/features_311.csv\n")
+import shapely
+import instrumentation
+from complaint_grid import (AREA_COUNT_COLUMNS, STATE_PATH as GRID_STATE_PATH, ComplaintGrid, add_levels,
+                            cell_lat, cell_lon, count_cells, load_state, pivot_counts, recount, save_state)
+from spatial import (assign_to_polygons, build_point_index, load_boundaries, polygon_areas_km2, project_km,
+                     query_radius)
+from storage import load_table, save_table, stored_table_path
+
+STATE_PATH = "data/processed/features_311_state.json"
+
+RADIUS_KM = 1.0
+
+# Feature column → complaint family it counts (see taxonomy.py)
+TYPE_COLUMNS = {
+    'noise_complaints': 'noise',
+    'street_condition': 'street_condition',
+    'graffiti': 'graffiti',
+    'heat_hot_water': 'heat_hot_water',
+}
+
+def in_months(counts, since=None, until=None):
+    """Per-area counts from the month of `since` through the month of `until` (if given)"""
+    months = pd.to_datetime(counts['month'])
+    keep = np.ones(len(counts), dtype=bool)
+    if since is not None:
+        keep &= (months >= pd.Timestamp(since).to_period('M').to_timestamp()).to_numpy()
+    if until is not None:
+        keep &= (months <= pd.Timestamp(until).to_period('M').to_timestamp()).to_numpy()
+    return counts[keep]
+
+def area_features(names, lats, lons, counts, areas_km2):
+    """The features_311 table from per-area counts (complaint_grid.AREA_COUNT_COLUMNS)"""
+    by_family, boroughs = pivot_counts(counts, len(lats))
+    total = by_family.sum(axis=1).to_numpy()
+    return pd.DataFrame({
+        'name': names,
+        'lat': lats,
+        'lon': lons,
+        # Where most of its complaints are (used to group areas for cross-validation)
+        'borough': boroughs,
+        'total_complaints': total,
+        **{column: by_family[family].to_numpy() for column, family in TYPE_COLUMNS.items()},
+        'complaints_per_km2': total / areas_km2,
+    })
+
+def neighborhood_areas(neighborhoods, radius_km=RADIUS_KM):
+    """Circles of radius_km around each neighborhood: (names, lats, lons, areas_km2, count), count(grid) → counts"""
+    lats = np.array([hood['lat'] for hood in neighborhoods], dtype=np.float64)
+    lons = np.array([hood['lon'] for hood in neighborhoods], dtype=np.float64)
+    print(f"📊 Counting complaints within {radius_km:g}km of {len(neighborhoods)} neighborhoods...\n")
+    return ([hood['name'] for hood in neighborhoods], lats, lons, np.pi * radius_km ** 2,
+            lambda grid: grid.radius_counts(lats, lons, radius_km))
+
+def polygon_areas(boundaries_geojson, name_field):
+    """Boundary polygons (NTA / community district), as neighborhood_areas returns them.
+
+    Grid cells go to the polygon holding their center, so with boundaries
+    that don't overlap every complaint lands in at most one polygon, and
+    densities use the real polygon area instead of a 1km circle.
+    """
+    names, geoms = load_boundaries(boundaries_geojson, name_field)
+    print(f"📊 Counting complaints in {len(names)} polygons...\n")
+    centers = shapely.point_on_surface(geoms)
+    return (names, shapely.get_y(centers), shapely.get_x(centers), polygon_areas_km2(geoms),
+            lambda grid: grid.polygon_counts(geoms))
+
+def radius_pairs(complaints, neighborhoods, radius_km=RADIUS_KM):
+    """(area, complaint row) for every complaint within radius_km of each neighborhood"""
+    tree = build_point_index(complaints['latitude'].values, complaints['longitude'].values)
+    rows = query_radius(tree, neighborhoods, radius_km)
+    lengths = np.array([len(r) for r in rows], dtype=np.int64)
+    area = np.repeat(np.arange(len(neighborhoods)), lengths)
+    return area, np.concatenate(rows).astype(np.int64) if len(rows) else np.array([], dtype=np.int64)
+
+def polygon_pairs(complaints, geoms):
+    """(area, complaint row) for every complaint inside a polygon (each in at most one)"""
+    assigned = assign_to_polygons(complaints['latitude'].values, complaints['longitude'].values, geoms)
+    rows = np.flatnonzero(assigned >= 0)
+    return assigned[rows], rows
+
+class StoreCounts:
+    """Exact per-area counts from the compact complaint store.
+
+    Answers the same radius_counts / polygon_counts calls as
+    complaint_grid.ComplaintGrid (AREA_COUNT_COLUMNS rows), assigning
+    complaints to areas with radius_pairs / polygon_pairs like
+    temporal_features does.
+    """
+
+    def __init__(self, store):
+        self.complaints = store.frame(columns=['latitude', 'longitude', 'complaint_type', 'borough',
+                                               'created_date'])
+
+    def _counts(self, area, rows):
+        matched = self.complaints.iloc[rows]
+        months = matched['created_date'].to_numpy().astype('datetime64[M]').astype('datetime64[s]')
+        matched = pd.DataFrame({'area': area, 'complaint_type': matched['complaint_type'].to_numpy(),
+                                'borough': matched['borough'].to_numpy(), 'month': months})
+        return (matched.groupby(AREA_COUNT_COLUMNS[:-1], dropna=False)
+                       .size().rename('count').reset_index())
+
+    def radius_counts(self, lats, lons, radius_km):
+        centers = [{'lat': lat, 'lon': lon} for lat, lon in zip(lats, lons)]
+        return self._counts(*radius_pairs(self.complaints, centers, radius_km))
+
+    def polygon_counts(self, geoms):
+        return self._counts(*polygon_pairs(self.complaints, geoms))
+
+def sum_area_counts(counts):
+    """One row per (area, type, borough, month), dropping counts that net out to 0"""
+    counts = counts.groupby(AREA_COUNT_COLUMNS[:-1], as_index=False, dropna=False)['count'].sum()
+    return counts[counts['count'] != 0].reset_index(drop=True)
+
+def update_area_counts(count, query, full=False, state_path=STATE_PATH):
+    """The area_counts table, brought up to date with the complaint grid.
+
+    query describes the areas (kind, radius, boundaries file...); counts
+    are only carried over from the last run when it matches and the grid
+    hasn't been rebuilt since. Then only the ledger rows of newer grid
+    updates are binned into a small grid of their own and queried.
+    """
+    grid_state = load_state(GRID_STATE_PATH)
+    if grid_state is None:
+        raise FileNotFoundError(f"No complaint grid state at {GRID_STATE_PATH} (run complaint_grid.py first)")
+    state = None if full else load_state(state_path)
+    if state is not None and (stored_table_path('area_counts') is None or
+                              (state['built'], state['query']) != (grid_state['built'], query)):
+        state = None
+
+    if state is None:
+        with instrumentation.stage('load'):
+            grid = ComplaintGrid.load()
+        instrumentation.count('grid_rows', sum(len(table['key']) for table in grid.levels.values()))
+        with instrumentation.stage('query'):
+            counts = count(grid)
+    elif state['update'] == grid_state['update']:
+        print(f"✓ Area counts are up to date (grid update {state['update']})")
+        return load_table('area_counts', columns=AREA_COUNT_COLUMNS)
+    else:
+        with instrumentation.stage('load'):
+            delta = load_table('grid_ledger', filters=[('update', '>', state['update'])])
+            counts = load_table('area_counts', columns=AREA_COUNT_COLUMNS)
+        print(f"🔁 Applying {len(delta):,} ledger rows from grid updates "
+              f"{state['update'] + 1}-{grid_state['update']}")
+        instrumentation.count('ledger_rows', len(delta))
+        with instrumentation.stage('query'):
+            if len(delta):
+                counts = sum_area_counts(pd.concat([counts, count(ComplaintGrid(add_levels(count_cells(delta))))],
+                                                   ignore_index=True))
+
+    with instrumentation.stage('save'):
+        save_table(counts, 'area_counts')
+    save_state({'built': grid_state['built'], 'update': grid_state['update'], 'query': query}, state_path)
+    return counts
+
+def check_area_counts(counts, count):
+    """Rows of the (incremental) per-area counts that differ from a recount of the complaint store"""
+    fresh = count(ComplaintGrid(add_levels(count_cells(recount()))))
+    merged = sum_area_counts(counts).merge(fresh, on=AREA_COUNT_COLUMNS[:-1], how='outer',
+                                           suffixes=('', '_recount'))
+    differs = merged['count'].fillna(0).to_numpy() != merged['count_recount'].fillna(0).to_numpy()
+    return merged[differs]
+
+def extract_cell_features(grid, level):
+    """Extract features for every grid cell with complaints at a level (12 ≈ 7 km ... 20 ≈ 30 m)"""
+    x, y, counts = grid.level_counts(level)
+    print(f"📊 {len(x)} cells with complaints at level {level}...\n")
+
+    west, east = cell_lon(x, level), cell_lon(x + 1, level)
+    north, south = cell_lat(y, level), cell_lat(y + 1, level)
+    corner, opposite = project_km(south, west), project_km(north, east)
+    df_features = area_features([f"{level}/{cx}/{cy}" for cx, cy in zip(x, y)],
+                                cell_lat(y + 0.5, level), cell_lon(x + 0.5, level), counts,
+                                np.prod(opposite - corner, axis=1))
+
+    print(f"\n✅ Extracted 311 features for {len(df_features)} cells!")
     print(df_features)
-    
+
     return df_features
 
 if __name__ == "__main__":
-    import os
-    os.makedirs("data/processed", exist_ok=True)
-    
-    features = extract_neighborhood_features(
-        "data/raw/311_complaints.csv", 
-        NEIGHBORHOODS
-    )
-    features.to_csv("data/processed/features_311.csv", index=False)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract 311 features per neighborhood")
+    parser.add_argument("--boundaries", help="GeoJSON of boundary polygons (e.g. NTAs); "
+                                             "default is 1km circles around config.NEIGHBORHOODS")
+    parser.add_argument("--name-field", default="ntaname",
+                        help="GeoJSON property holding the area name")
+    parser.add_argument("--radius", type=float, default=RADIUS_KM,
+                        help="Circle radius in km around each neighborhood")
+    parser.add_argument("--level", type=int,
+                        help="One area per grid cell at this level instead (12-20)")
+    parser.add_argument("--since", help="Only complaints from this month on (YYYY-MM)")
+    parser.add_argument("--until", help="Only complaints up to this month (YYYY-MM)")
+    parser.add_argument("--full", action="store_true",
+                        help="Recount every area from the whole grid instead of applying the new updates")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the counts with a full recount and exit with 1 if they differ")
+    parser.add_argument("--exact", action="store_true",
+                        help="Count exactly from the complaint store (as temporal_features.py does) "
+                             "instead of the grid")
+    parser.add_argument("--warehouse", nargs="?", const="", metavar="PATH",
+                        help="Count from the SQLite warehouse (default warehouse.WAREHOUSE_PATH) instead of the grid")
+    args = parser.parse_args()
+    if args.warehouse is not None and args.exact:
+        parser.error("--warehouse and --exact are different sources; pick one")
+    if (args.warehouse is not None or args.exact) and (args.level is not None or args.full or args.check):
+        parser.error("--warehouse and --exact can't be combined with --level, --full or --check")
+
+    if args.level is not None:
+        with instrumentation.stage('load'):
+            grid = ComplaintGrid.load(since=args.since, until=args.until)
+        instrumentation.count('grid_rows', sum(len(table['key']) for table in grid.levels.values()))
+        with instrumentation.stage('query'):
+            features = extract_cell_features(grid, args.level)
+    else:
+        if args.boundaries:
+            names, lats, lons, areas_km2, count = polygon_areas(args.boundaries, args.name_field)
+            query = {'boundaries': args.boundaries, 'modified': os.path.getmtime(args.boundaries),
+                     'name_field': args.name_field}
+        else:
+            from config import NEIGHBORHOODS
+            names, lats, lons, areas_km2, count = neighborhood_areas(NEIGHBORHOODS, args.radius)
+            query = {'neighborhoods': names, 'centers': [lats.tolist(), lons.tolist()], 'radius': args.radius}
+        if args.warehouse is not None:
+            import warehouse
+            conn = warehouse.connect(args.warehouse or warehouse.WAREHOUSE_PATH)
+            # Whole months, as in_months keeps them
+            since = args.since and pd.Timestamp(args.since).to_period('M').to_timestamp()
+            until = args.until and (pd.Timestamp(args.until).to_period('M') + 1).to_timestamp()
+            with instrumentation.stage('query'):
+                counts = count(warehouse.AreaCounts(conn, since, until))
+        elif args.exact:
+            from complaint_store import ComplaintStore
+            with instrumentation.stage('load'):
+                store = StoreCounts(ComplaintStore.open())
+            instrumentation.count('complaints', len(store.complaints))
+            with instrumentation.stage('query'):
+                counts = count(store)
+        else:
+            counts = update_area_counts(count, query, full=args.full)
+
+        if args.check:
+            with instrumentation.stage('check'):
+                differing = check_area_counts(counts, count)
+            if len(differing):
+                print(f"❌ {len(differing):,} area counts differ from a full recount:")
+                print(differing.head(20))
+                instrumentation.exit(1)
+            print("✓ Area counts match a full recount")
+
+        features = area_features(names, lats, lons, in_months(counts, args.since, args.until), areas_km2)
+        print(f"\n✅ Extracted 311 features for {len(features)} areas!")
+        print(features)
+    instrumentation.count('areas', len(features))
+
+    with instrumentation.stage('save'):
+        path = save_table(features, 'features_311')
+    print(f"📁 Saved to {path}")
     print("\n✅ Done!")
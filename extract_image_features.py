@@ -2,32 +2,71 @@
 from PIL import Image
 import numpy as np
 import pandas as pd
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
+import instrumentation
 from config import NEIGHBORHOODS
+from storage import save_table
 
-def simple_image_features(image_path):
+HEADINGS = [0, 90, 180, 270]
+METRICS = ['brightness', 'green_ratio', 'blue_ratio', 'color_variance', 'brightness_variance']
+
+# Bump whenever simple_image_features changes what it computes; the cache
+# throws away entries written under any other version
+FEATURE_VERSION = 2
+CACHE_PATH = "data/processed/image_feature_cache.npz"
+
+def load_pixels(image_path, draft_scale=None):
+    """Decode a JPEG to an (H, W, 3) uint8 array.
+
+    draft_scale (2, 4 or 8) lets libjpeg decode straight to a reduced size,
+    which skips most of the IDCT work; statistics then describe the
+    downscaled image, so it's off by default.
+    """
+    img = Image.open(image_path)
+    if draft_scale:
+        img.draft('RGB', (img.width // draft_scale, img.height // draft_scale))
+    return np.asarray(img.convert('RGB'))
+
+def pixel_moments(img_array):
+    """First and second moments of the RGB channels in one pass.
+
+    Pixels go into an (N, 4) float64 buffer [r, g, b, 1] (shifted by 128),
+    and a single Gram matrix product yields every channel sum and
+    cross-product at once. The sums are of integers well below 2**53, so
+    they're exact and the variances (E[x²] - mean²) match np.var to ~1e-13
+    even on low-contrast images, where float32 sums drifted by ~1e-3.
+    """
+    pixels = img_array.reshape(-1, 3)
+    buf = np.empty((len(pixels), 4), dtype=np.float64)
+    np.subtract(pixels, 128, out=buf[:, :3], dtype=np.float64)
+    buf[:, 3] = 1
+    return buf.T @ buf, len(pixels)
+
+def simple_image_features(image_path, draft_scale=None):
     """Extract basic visual features without deep learning"""
-    img = Image.open(image_path).convert('RGB')
-    img_array = np.array(img)
-    
-    # Calculate color features
-    avg_brightness = np.mean(img_array)
-    avg_red = np.mean(img_array[:,:,0])
-    avg_green = np.mean(img_array[:,:,1])
-    avg_blue = np.mean(img_array[:,:,2])
-    
+    gram, n = pixel_moments(load_pixels(image_path, draft_scale))
+
+    # Channel means (undoing the 128 shift)
+    channel_means = gram[:3, 3] / n + 128
+    avg_red, avg_green, avg_blue = channel_means
+    avg_brightness = channel_means.mean()
+    shifted_mean = avg_brightness - 128
+
     # Green ratio (proxy for vegetation/parks)
     green_ratio = avg_green / (avg_red + avg_blue + 1)
-    
+
     # Blue ratio (proxy for sky visibility)
     blue_ratio = avg_blue / (avg_red + avg_green + 1)
-    
-    # Color variance (proxy for visual complexity/activity)
-    color_variance = np.var(img_array)
-    
-    # Brightness variance (contrast - higher = more interesting)
-    brightness_variance = np.var(np.mean(img_array, axis=2))
-    
+
+    # Color variance (proxy for visual complexity/activity), over all channel values
+    color_variance = np.trace(gram[:3, :3]) / (3 * n) - shifted_mean ** 2
+
+    # Brightness variance (contrast - higher = more interesting): variance of the
+    # per-pixel mean, i.e. E[((r+g+b)/3)^2] - E[brightness]^2
+    brightness_variance = gram[:3, :3].sum() / (9 * n) - shifted_mean ** 2
+
     return {
         'brightness': avg_brightness,
         'green_ratio': green_ratio,
@@ -36,41 +75,155 @@ def simple_image_features(image_path):
         'brightness_variance': brightness_variance
     }
 
-def extract_all_image_features():
+def _features_or_none(args):
+    image_path, draft_scale = args
+    try:
+        return simple_image_features(image_path, draft_scale)
+    except OSError as e:
+        print(f"  ✗ {image_path}: {e}")
+        return None
+
+def batch_image_features(image_paths, workers=None, draft_scale=None, chunksize=16):
+    """Features for many images across a process pool (None for unreadable files)"""
+    jobs = [(path, draft_scale) for path in image_paths]
+    if not jobs:
+        return []
+    if workers == 1:
+        return [_features_or_none(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_features_or_none, jobs, chunksize=chunksize))
+
+def file_digest(path):
+    """sha256 of the file contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_feature_cache(cache_path=CACHE_PATH):
+    """Per-image feature cache, keyed by content hash (+ decode scale).
+
+    Returns (features, files): features maps "<sha256>:<scale>" to the
+    METRICS values, files maps path to (size, mtime_ns, sha256) so
+    unchanged files aren't even re-hashed. Empty if the cache was built
+    by a different FEATURE_VERSION.
+    """
+    if not os.path.exists(cache_path):
+        return {}, {}
+    with np.load(cache_path) as data:
+        if int(data['version']) != FEATURE_VERSION:
+            print(f"♻️  Image feature cache is from version {int(data['version'])}, rebuilding")
+            return {}, {}
+        features = dict(zip(data['keys'].tolist(), data['values']))
+        files = {path: (int(size), int(mtime), digest) for path, size, mtime, digest
+                 in zip(data['paths'].tolist(), data['sizes'], data['mtimes'], data['digests'].tolist())}
+    return features, files
+
+def save_feature_cache(features, files, cache_path=CACHE_PATH):
+    """Write the cache as one compressed .npz (a few dozen bytes per image), atomically"""
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = cache_path + '.tmp.npz'
+    paths = list(files)
+    np.savez_compressed(
+        tmp_path,
+        version=FEATURE_VERSION,
+        keys=np.array(list(features), dtype=str),
+        values=np.array(list(features.values()), dtype=np.float64).reshape(-1, len(METRICS)),
+        paths=np.array(paths, dtype=str),
+        sizes=np.array([files[p][0] for p in paths], dtype=np.int64),
+        mtimes=np.array([files[p][1] for p in paths], dtype=np.int64),
+        digests=np.array([files[p][2] for p in paths], dtype=str),
+    )
+    os.replace(tmp_path, cache_path)
+
+def cached_image_features(image_paths, workers=None, draft_scale=None, cache_path=CACHE_PATH):
+    """Like batch_image_features, but only decodes images the cache hasn't seen"""
+    features, files = load_feature_cache(cache_path)
+
+    keys = []
+    for path in image_paths:
+        stat = os.stat(path)
+        known = files.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            digest = known[2]
+        else:
+            digest = file_digest(path)
+            files[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        keys.append(f"{digest}:{draft_scale or 1}")
+
+    missing = [i for i, key in enumerate(keys) if key not in features]
+    print(f"♻️  {len(image_paths) - len(missing)} cached, {len(missing)} to decode")
+    instrumentation.count('images_cached', len(image_paths) - len(missing))
+
+    fresh = batch_image_features([image_paths[i] for i in missing], workers, draft_scale)
+    for i, result in zip(missing, fresh):
+        if result is not None:
+            features[keys[i]] = np.array([result[m] for m in METRICS])
+
+    save_feature_cache(features, files, cache_path)
+
+    return [dict(zip(METRICS, features[key])) if key in features else None for key in keys]
+
+def extract_all_image_features(neighborhoods=NEIGHBORHOODS, workers=None, draft_scale=None,
+                               image_dir="data/raw/images", use_cache=True):
     """Extract features for all neighborhoods"""
     print("📸 Extracting image features...\n")
-    
+
+    # Collect all 4 directions for every neighborhood, then decode them in parallel
+    image_paths = []
+    owners = []
+    for hood in neighborhoods:
+        for heading in HEADINGS:
+            img_path = f"{image_dir}/{hood['name']}_{heading}.jpg"
+            if os.path.exists(img_path):
+                image_paths.append(img_path)
+                owners.append(hood['name'])
+
+    print(f"Found {len(image_paths)} images ({workers or os.cpu_count()} worker processes)")
+    instrumentation.count('images', len(image_paths))
+    with instrumentation.stage('decode'):
+        if use_cache:
+            results = cached_image_features(image_paths, workers=workers, draft_scale=draft_scale)
+        else:
+            results = batch_image_features(image_paths, workers=workers, draft_scale=draft_scale)
+
+    per_hood = {hood['name']: [] for hood in neighborhoods}
+    for name, features in zip(owners, results):
+        if features is not None:
+            per_hood[name].append(features)
+
     image_features = []
-    
-    for hood in NEIGHBORHOODS:
-        print(f"Processing {hood['name']}...")
-        
+    for hood in neighborhoods:
         hood_features = {'name': hood['name']}
-        
-        # Collect features from all 4 directions
-        all_features = []
-        for heading in [0, 90, 180, 270]:
-            img_path = f"data/raw/images/{hood['name']}_{heading}.jpg"
-            if os.path.exists(img_path):
-                features = simple_image_features(img_path)
-                all_features.append(features)
-        
+        all_features = per_hood[hood['name']]
+
         # Average across all 4 directions
-        for metric in ['brightness', 'green_ratio', 'blue_ratio', 'color_variance', 'brightness_variance']:
+        for metric in METRICS:
             values = [f[metric] for f in all_features]
             hood_features[f'avg_{metric}'] = np.mean(values) if values else 0
-        
+
         image_features.append(hood_features)
-    
+
     df_images = pd.DataFrame(image_features)
-    
+
     print(f"\n✅ Extracted image features!")
-    print(f"📁 Saving to data/processed/features_images.csv\n")
     print(df_images)
-    
+
     return df_images
 
 if __name__ == "__main__":
-    features = extract_all_image_features()
-    features.to_csv("data/processed/features_images.csv", index=False)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract Street View image features")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument("--draft-scale", type=int, choices=[2, 4, 8], default=None,
+                        help="Decode JPEGs at 1/N size (faster, approximate features)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute every image instead of using the feature cache")
+    args = parser.parse_args()
+
+    features = extract_all_image_features(workers=args.workers, draft_scale=args.draft_scale,
+                                          use_cache=not args.no_cache)
+    with instrumentation.stage('save'):
+        path = save_table(features, 'features_images')
+    print(f"📁 Saved to {path}")
     print("\n✅ Done!")
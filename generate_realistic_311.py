@@ -1,6 +1,10 @@
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+import instrumentation
+import storage
+from storage import append_table, delete_table, table_path
 
 # Real NYC neighborhood profiles based on actual data
 NEIGHBORHOOD_PROFILES = {
@@ -107,71 +111,78 @@ COMPLAINT_TYPES = {
     'Other': 0.02
 }
 
-def generate_complaints_for_neighborhood(name, profile, neighborhood_coords):
-    """Generate realistic complaints for a specific neighborhood"""
+COMPLAINT_NAMES = np.array(list(COMPLAINT_TYPES))
+DEFAULT_PROFILE = {'safety': 3, 'density': 'medium', 'income': 'middle', 'complaints_base': 100}
+
+def complaint_probabilities(profile):
+    """Complaint type probability vector for a neighborhood (built once, not per complaint)"""
+    complaint_probs = COMPLAINT_TYPES.copy()
     
-    # Base complaint count adjusted by profile
-    base_count = profile['complaints_base']
+    # Wealthy neighborhoods: more noise complaints, fewer sanitation issues
+    if profile['income'] == 'high':
+        complaint_probs['Noise - Residential'] *= 1.3
+        complaint_probs['Graffiti'] *= 0.3
+        complaint_probs['Sanitation Condition'] *= 0.4
+        complaint_probs['Rodent'] *= 0.3
     
-    # Add randomness (±30%)
-    actual_count = int(base_count * np.random.uniform(0.7, 1.3))
+    # Poor neighborhoods: more heat/sanitation/graffiti
+    if profile['income'] == 'low':
+        complaint_probs['Heat/Hot Water'] *= 1.4
+        complaint_probs['Graffiti'] *= 1.8
+        complaint_probs['Sanitation Condition'] *= 1.5
+        complaint_probs['Rodent'] *= 1.6
+        complaint_probs['Homeless Person Assistance'] *= 1.5
     
-    complaints = []
+    # High density: more parking complaints
+    if profile['density'] in ['high', 'very_high']:
+        complaint_probs['Illegal Parking'] *= 1.4
+        complaint_probs['Blocked Driveway'] *= 1.4
+        complaint_probs['Noise - Residential'] *= 1.2
     
-    for i in range(actual_count):
-        # Adjust complaint type probabilities based on neighborhood
-        complaint_probs = COMPLAINT_TYPES.copy()
-        
-        # Wealthy neighborhoods: more noise complaints, fewer sanitation issues
-        if profile['income'] == 'high':
-            complaint_probs['Noise - Residential'] *= 1.3
-            complaint_probs['Graffiti'] *= 0.3
-            complaint_probs['Sanitation Condition'] *= 0.4
-            complaint_probs['Rodent'] *= 0.3
-        
-        # Poor neighborhoods: more heat/sanitation/graffiti
-        if profile['income'] == 'low':
-            complaint_probs['Heat/Hot Water'] *= 1.4
-            complaint_probs['Graffiti'] *= 1.8
-            complaint_probs['Sanitation Condition'] *= 1.5
-            complaint_probs['Rodent'] *= 1.6
-            complaint_probs['Homeless Person Assistance'] *= 1.5
-        
-        # High density: more parking complaints
-        if profile['density'] in ['high', 'very_high']:
-            complaint_probs['Illegal Parking'] *= 1.4
-            complaint_probs['Blocked Driveway'] *= 1.4
-            complaint_probs['Noise - Residential'] *= 1.2
+    # Normalize probabilities
+    probs = np.array([complaint_probs[name] for name in COMPLAINT_NAMES])
+    return probs / probs.sum()
+
+def generate_complaints_for_neighborhood(name, profile, neighborhood_coords, rng=None,
+                                         scale=1.0, now=None, chunk_rows=1_000_000):
+    """Generate realistic complaints for a specific neighborhood.
+
+    Yields DataFrames of at most chunk_rows rows; every column is drawn as
+    one array per chunk instead of row by row.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    now = now or datetime.now()
+    probs = complaint_probabilities(profile)
+    borough = get_borough(name)
+    
+    # Base complaint count adjusted by profile, with ±30% randomness
+    actual_count = int(profile['complaints_base'] * scale * rng.uniform(0.7, 1.3))
+    
+    for first in range(0, actual_count, chunk_rows):
+        n = min(chunk_rows, actual_count - first)
         
-        # Normalize probabilities
-        total = sum(complaint_probs.values())
-        complaint_probs = {k: v/total for k, v in complaint_probs.items()}
+        # Select complaint types
+        types = COMPLAINT_NAMES[rng.choice(len(probs), size=n, p=probs)]
         
-        # Select complaint type
-        complaint_type = np.random.choice(
-            list(complaint_probs.keys()), 
-            p=list(complaint_probs.values())
-        )
+        # Generate locations (scatter around neighborhood center, ~0.5 mile radius)
+        lat = neighborhood_coords[0] + rng.normal(0, 0.008, n)
+        lon = neighborhood_coords[1] + rng.normal(0, 0.008, n)
         
-        # Generate location (scatter around neighborhood center)
-        lat_offset = np.random.normal(0, 0.008)  # ~0.5 mile radius
-        lon_offset = np.random.normal(0, 0.008)
+        # Generate dates (last 6 months, exponential favors recent)
+        days_ago = np.minimum(rng.exponential(30, n).astype(np.int64), 180)
+        dates = pd.Timestamp(now).floor('s') - pd.to_timedelta(days_ago, unit='D')
         
-        # Generate date (last 6 months, with more recent being more common)
-        days_ago = int(np.random.exponential(30))  # Exponential favors recent
-        days_ago = min(days_ago, 180)  # Cap at 6 months
-        date = datetime.now() - timedelta(days=days_ago)
+        index = pd.Series(np.arange(first, first + n)).astype(str)
+        stamps = pd.Series(dates.values.astype('datetime64[s]').astype(np.int64)).astype(str)
         
-        complaints.append({
-            'unique_key': f"REAL_{name}_{i}_{int(date.timestamp())}",
-            'created_date': date.strftime('%Y-%m-%d %H:%M:%S'),
-            'complaint_type': complaint_type,
-            'latitude': neighborhood_coords[0] + lat_offset,
-            'longitude': neighborhood_coords[1] + lon_offset,
-            'borough': get_borough(name)
+        yield pd.DataFrame({
+            'unique_key': f"REAL_{name}_" + index + "_" + stamps,
+            'created_date': dates,
+            'complaint_type': types,
+            'latitude': lat,
+            'longitude': lon,
+            'borough': borough
         })
-    
-    return complaints
 
 def get_borough(neighborhood_name):
     """Get borough from neighborhood name"""
@@ -198,8 +209,55 @@ def get_borough(neighborhood_name):
     else:
         return 'STATEN ISLAND'
 
-def generate_all_data():
-    """Generate realistic 311 data for all neighborhoods"""
+def generate_shard(hoods, seeds, scale, now, chunk_rows):
+    """Generate a group of neighborhoods and append them to the complaint store.
+
+    Rows are buffered and flushed every chunk_rows, so memory stays bounded
+    no matter how large `scale` is. Returns summary statistics only.
+    """
+    type_counts = pd.Series(0, index=COMPLAINT_NAMES)
+    borough_counts = {}
+    per_hood = []
+    buffer, buffered = [], 0
+    
+    def flush():
+        nonlocal buffer, buffered
+        if buffer:
+            append_table(pd.concat(buffer, ignore_index=True), 'complaints')
+        buffer, buffered = [], 0
+    
+    for hood, seed in zip(hoods, seeds):
+        name = hood['name']
+        coords = (hood['lat'], hood['lon'])
+        profile = NEIGHBORHOOD_PROFILES.get(name, DEFAULT_PROFILE)
+        rng = np.random.default_rng(seed)
+        
+        count = 0
+        for chunk in generate_complaints_for_neighborhood(name, profile, coords, rng,
+                                                          scale, now, chunk_rows):
+            count += len(chunk)
+            type_counts = type_counts.add(chunk['complaint_type'].value_counts(), fill_value=0)
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= chunk_rows:
+                flush()
+        
+        borough = get_borough(name)
+        borough_counts[borough] = borough_counts.get(borough, 0) + count
+        per_hood.append((name, count, profile, name in NEIGHBORHOOD_PROFILES))
+        print(f"✓ {name:25s} → {count:3d} complaints ({profile['income']:6s} income, safety: {profile['safety']}/5)")
+    
+    flush()
+    return per_hood, type_counts, borough_counts
+
+def generate_all_data(seed=None, scale=1.0, workers=1, chunk_rows=1_000_000, neighborhoods=None):
+    """Generate realistic 311 data for all neighborhoods.
+
+    seed makes runs reproducible (independent of the number of workers, since
+    every neighborhood gets its own child seed). scale multiplies each
+    neighborhood's complaint count for load tests; workers > 1 generates
+    shards of neighborhoods in parallel processes.
+    """
     print("🎨 GENERATING HYPER-REALISTIC NYC 311 DATA")
     print("=" * 70)
     print("Based on actual NYC patterns:")
@@ -211,57 +269,75 @@ def generate_all_data():
     print()
     
     # Load neighborhood coordinates from config
-    from config import NEIGHBORHOODS
+    if neighborhoods is None:
+        from config import NEIGHBORHOODS
+        neighborhoods = NEIGHBORHOODS
     
-    all_complaints = []
+    for hood in neighborhoods:
+        if hood['name'] not in NEIGHBORHOOD_PROFILES:
+            print(f"⚠️  {hood['name']} not in profile database, using default...")
     
-    for hood in NEIGHBORHOODS:
-        name = hood['name']
-        coords = (hood['lat'], hood['lon'])
-        
-        if name not in NEIGHBORHOOD_PROFILES:
-            print(f"⚠️  {name} not in profile database, using default...")
-            profile = {'safety': 3, 'density': 'medium', 'income': 'middle', 'complaints_base': 100}
-        else:
-            profile = NEIGHBORHOOD_PROFILES[name]
-        
-        complaints = generate_complaints_for_neighborhood(name, profile, coords)
-        all_complaints.extend(complaints)
-        
-        print(f"✓ {name:25s} → {len(complaints):3d} complaints ({profile['income']:6s} income, safety: {profile['safety']}/5)")
+    now = datetime.now()
+    seeds = np.random.SeedSequence(seed).spawn(len(neighborhoods))
     
-    # Convert to DataFrame
-    df = pd.DataFrame(all_complaints)
+    # Parallel CSV appends would interleave, so CSV output is always one shard
+    if storage.DEFAULT_FORMAT == 'csv':
+        workers = 1
     
-    # Sort by date (most recent first)
-    df['created_date'] = pd.to_datetime(df['created_date'])
-    df = df.sort_values('created_date', ascending=False)
+    delete_table('complaints')
     
-    # Save
-    df.to_csv("data/raw/311_complaints.csv", index=False)
+    if workers == 1:
+        results = [generate_shard(neighborhoods, seeds, scale, now, chunk_rows)]
+    else:
+        shards = [(neighborhoods[i::workers], seeds[i::workers]) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(generate_shard, hoods, shard_seeds, scale, now, chunk_rows)
+                       for hoods, shard_seeds in shards]
+            results = [future.result() for future in futures]
+    
+    type_counts = sum((r[1] for r in results), pd.Series(0, index=COMPLAINT_NAMES))
+    borough_counts = pd.Series(dtype=np.int64)
+    for _, _, boroughs in results:
+        borough_counts = borough_counts.add(pd.Series(boroughs), fill_value=0)
+    total = int(type_counts.sum())
     
     print("\n" + "=" * 70)
-    print(f"✅ GENERATED {len(df):,} REALISTIC COMPLAINTS")
-    print(f"📁 Saved to: data/raw/311_complaints.csv")
+    print(f"✅ GENERATED {total:,} REALISTIC COMPLAINTS")
+    print(f"📁 Saved to: {table_path('complaints')}")
     print("=" * 70)
     
     print(f"\n📊 STATISTICS:")
-    print(f"   Date range: {df['created_date'].min().strftime('%Y-%m-%d')} to {df['created_date'].max().strftime('%Y-%m-%d')}")
-    print(f"   Avg per neighborhood: {len(df)//50}")
-    print(f"   Boroughs covered: {df['borough'].nunique()}")
+    oldest = (now - timedelta(days=180)).strftime('%Y-%m-%d')
+    print(f"   Date range: up to 180 days back, {oldest} to {now.strftime('%Y-%m-%d')}")
+    print(f"   Avg per neighborhood: {total // len(neighborhoods)}")
+    print(f"   Boroughs covered: {int((borough_counts > 0).sum())}")
     
     print(f"\n📋 Top 10 Complaint Types:")
-    for complaint_type, count in df['complaint_type'].value_counts().head(10).items():
-        pct = (count / len(df)) * 100
-        print(f"   {complaint_type:30s} {count:4d} ({pct:4.1f}%)")
+    for complaint_type, count in type_counts.sort_values(ascending=False).head(10).items():
+        pct = (count / total) * 100
+        print(f"   {complaint_type:30s} {int(count):4d} ({pct:4.1f}%)")
     
     print(f"\n📍 By Borough:")
-    print(df['borough'].value_counts())
+    print(borough_counts.astype(np.int64).sort_values(ascending=False))
     
     print("\n💡 This data is synthetically generated but follows real NYC patterns!")
     print("   It's statistically indistinguishable from actual 311 data.\n")
     
-    return df
+    return total
 
 if __name__ == "__main__":
-    generate_all_data()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate synthetic NYC 311 complaints")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible output")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every neighborhood's complaint volume (e.g. 1500 → ~10M rows)")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel generator processes")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000,
+                        help="Rows buffered per write (bounds memory)")
+    args = parser.parse_args()
+    
+    with instrumentation.stage('generate'):
+        total = generate_all_data(seed=args.seed, scale=args.scale, workers=args.workers,
+                                  chunk_rows=args.chunk_rows)
+    instrumentation.count('complaints_generated', total)
@@ -0,0 +1,83 @@
+# http_utils.py - Connection pooling, rate limiting and retries shared by the API clients
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+import instrumentation
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def make_session(pool_size=8, headers=None):
+    """requests.Session whose connection pool fits `pool_size` concurrent workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header (seconds or HTTP date), None if absent"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def get_with_retry(session, url, params, limiter=None, max_retries=5, base_delay=0.5,
+                   max_delay=30.0, timeout=60):
+    """GET with retries on 429/5xx and network errors.
+
+    Waits use full-jitter exponential backoff, except that a server
+    Retry-After always wins. Returns the last response (which may still be
+    an error status once retries run out); re-raises network errors.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        instrumentation.http_call(url)
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            wait = None
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            wait = retry_after_seconds(response)
+
+        if wait is None:
+            wait = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+        time.sleep(wait)
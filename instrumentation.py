@@ -0,0 +1,196 @@
+# instrumentation.py - Per-stage timings, record counts, memory and HTTP calls for every script
+"""Lightweight run instrumentation.
+
+Set CITYSENSE_METRICS_DIR to turn it on. Each script then writes, when it
+exits, a JSON run report (<script>.json) and a Prometheus textfile
+(citysense_<script>.prom) into that directory, so pointing it at the node
+exporter's textfile-collector directory is enough to scrape it. Set
+CITYSENSE_TRACEMALLOC=1 as well to record Python heap peaks per stage
+(tracemalloc slows allocation-heavy code noticeably, so it's opt-in).
+
+A run fails if it ends with an uncaught exception or a non-zero exit.
+atexit handlers can't see the exit status, so scripts exit through
+instrumentation.exit(), which remembers it; a SystemExit leaving a
+stage() is recorded too.
+
+When the variable isn't set, stage() hands back a shared no-op context
+manager and count()/http_call() return straight away.
+"""
+import atexit
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlparse
+
+METRICS_DIR = os.environ.get('CITYSENSE_METRICS_DIR')
+ENABLED = bool(METRICS_DIR)
+TRACEMALLOC = ENABLED and os.environ.get('CITYSENSE_TRACEMALLOC') == '1'
+
+# Hostname → service label for HTTP call counts
+HTTP_SERVICES = {
+    'data.cityofnewyork.us': 'soda',
+    'maps.googleapis.com': 'streetview',
+}
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_run = {
+    'script': os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0],
+    'started': datetime.now().isoformat(timespec='seconds'),
+    'stages': [],
+    'counts': {},
+    'http_calls': {},
+}
+_start = time.perf_counter()
+_heap_stack = []  # running tracemalloc peaks of the stages we're inside
+_exit_status = None  # the non-zero status the run is exiting with, if any
+
+def peak_rss_mb(usage=None):
+    """Peak resident memory of this process so far (or of a given rusage), in MB"""
+    peak = (usage or resource.getrusage(resource.RUSAGE_SELF)).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if TRACEMALLOC:
+            if _heap_stack:
+                _heap_stack[-1] = max(_heap_stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            _heap_stack.append(0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        extra = {}
+        if TRACEMALLOC:
+            heap_peak = max(_heap_stack.pop(), tracemalloc.get_traced_memory()[1])
+            if _heap_stack:
+                _heap_stack[-1] = max(_heap_stack[-1], heap_peak)
+            tracemalloc.reset_peak()
+            extra['heap_peak_mb'] = round(heap_peak / 2 ** 20, 1)
+        if exc_type is SystemExit and exc.code not in (None, 0):
+            global _exit_status
+            _exit_status = exc.code
+        record_stage(self.name, time.perf_counter() - self.start,
+                     status='error' if exc_type else 'ok', **extra)
+        return False
+
+def stage(name):
+    """Context manager timing one stage of the script (stages may nest)"""
+    return _Stage(name) if ENABLED else _NOOP
+
+def record_stage(name, seconds, **extra):
+    """Record a stage timed elsewhere (e.g. a subprocess the pipeline runner waited on)"""
+    if not ENABLED:
+        return
+    with _lock:
+        _run['stages'].append({'name': name, 'seconds': round(seconds, 4),
+                               'peak_rss_mb': round(peak_rss_mb(), 1), **extra})
+
+def count(name, n=1):
+    """Add n to a record counter (complaints loaded, images decoded, ...)"""
+    if not ENABLED:
+        return
+    with _lock:
+        _run['counts'][name] = _run['counts'].get(name, 0) + int(n)
+
+def http_call(url):
+    """Count one HTTP request, labelled by service (soda, streetview, or the hostname)"""
+    if not ENABLED:
+        return
+    host = urlparse(url).hostname or 'unknown'
+    service = HTTP_SERVICES.get(host, host)
+    with _lock:
+        _run['http_calls'][service] = _run['http_calls'].get(service, 0) + 1
+
+def report():
+    """The run so far as a dict"""
+    with _lock:
+        run = json.loads(json.dumps(_run))
+    run['seconds'] = round(time.perf_counter() - _start, 4)
+    run['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    failed = getattr(sys, 'last_type', None) or _exit_status not in (None, 0)
+    run['status'] = 'error' if failed else 'ok'
+    if _exit_status not in (None, 0):
+        run['exit_status'] = _exit_status if isinstance(_exit_status, int) else str(_exit_status)
+    return run
+
+def _labels(**labels):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+def prometheus_text(run):
+    """Render a run report in the Prometheus text exposition format"""
+    script = run['script']
+    metrics = [
+        ('citysense_run_seconds', 'Wall time of the last run', [(_labels(script=script), run['seconds'])]),
+        ('citysense_run_peak_rss_bytes', 'Peak resident memory of the last run',
+         [(_labels(script=script), int(run['peak_rss_mb'] * 2 ** 20))]),
+        ('citysense_run_success', '1 if the last run finished without an uncaught error or a non-zero exit',
+         [(_labels(script=script), int(run['status'] == 'ok'))]),
+        ('citysense_run_timestamp_seconds', 'Unix time the last run finished',
+         [(_labels(script=script), int(time.time()))]),
+        ('citysense_stage_seconds', 'Wall time of each stage in the last run',
+         [(_labels(script=script, stage=s['name']), s['seconds']) for s in run['stages']]),
+        ('citysense_stage_peak_rss_bytes', 'Process peak resident memory at the end of each stage',
+         [(_labels(script=script, stage=s['name']), int(s['peak_rss_mb'] * 2 ** 20))
+          for s in run['stages']]),
+        ('citysense_stage_heap_peak_bytes', 'Peak traced Python heap during each stage',
+         [(_labels(script=script, stage=s['name']), int(s['heap_peak_mb'] * 2 ** 20))
+          for s in run['stages'] if 'heap_peak_mb' in s]),
+        ('citysense_records', 'Records processed in the last run',
+         [(_labels(script=script, name=k), v) for k, v in run['counts'].items()]),
+        ('citysense_http_calls', 'HTTP requests made in the last run (including retries)',
+         [(_labels(script=script, service=k), v) for k, v in run['http_calls'].items()]),
+    ]
+    lines = []
+    for name, help_text, samples in metrics:
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        # A stage that ran more than once keeps its last sample
+        lines += [f"{name}{labels} {value}" for labels, value in dict(samples).items()]
+    return '\n'.join(lines) + '\n'
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_reports(metrics_dir=METRICS_DIR):
+    """Write <script>.json and citysense_<script>.prom into metrics_dir"""
+    run = report()
+    os.makedirs(metrics_dir, exist_ok=True)
+    _write_atomic(os.path.join(metrics_dir, f"{run['script']}.json"), json.dumps(run, indent=2))
+    _write_atomic(os.path.join(metrics_dir, f"citysense_{run['script']}.prom"), prometheus_text(run))
+    return run
+
+def exit(status=0):
+    """sys.exit that the run report knows about: a non-zero status marks the run failed"""
+    global _exit_status
+    if status not in (None, 0):
+        _exit_status = status
+    sys.exit(status)
+
+def _write_at_exit():
+    # Worker processes (multiprocessing pools) import this module too; only the main one reports
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        write_reports()
+
+if ENABLED:
+    if TRACEMALLOC:
+        tracemalloc.start()
+    atexit.register(_write_at_exit)
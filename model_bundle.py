@@ -0,0 +1,207 @@
+# model_bundle.py - The trained model as one versioned, memory-mappable file
+"""Model bundle.
+
+train_model.py used to write the model, the scaler and the feature list
+as three pickles that could drift apart. A bundle keeps all of it in one
+file, together with a hash of the training data and the training
+metrics, and is written atomically, so it is always complete and
+self-consistent.
+
+The random forest is stored as flat node arrays rather than as pickled
+sklearn trees (sklearn copies every tree into its own memory when
+unpickling). Loaded with mmap=True, those arrays are read-only views of
+the file, so any number of worker processes share one copy of the trees
+through the page cache, and startup doesn't deserialize anything large.
+ForestModel.predict_proba walks all trees at once with numpy and gives
+exactly the same probabilities as RandomForestClassifier.predict_proba.
+"""
+import hashlib
+import os
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+BUNDLE_PATH = "models/atmosphere_model.bundle"
+
+class ForestModel:
+    """Random forest classifier inference over flat (optionally memory-mapped) node arrays"""
+
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, classes):
+        self.feature = feature          # split feature per node (-2 at leaves, like sklearn)
+        self.threshold = threshold      # go left when x[feature] <= threshold
+        self.left = left                # global index of the left child (-1 at leaves)
+        self.right = right
+        self.leaf_proba = leaf_proba    # (n_nodes, n_classes) class probabilities per node
+        self.roots = roots              # index of each tree's root node
+        self.classes_ = classes
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted RandomForestClassifier (single output)"""
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single-output forests can be bundled")
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            value = tree.value[:, 0, :]
+            # Same normalization DecisionTreeClassifier.predict_proba applies to each leaf
+            normalizer = value.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            is_leaf = tree.children_left < 0
+            roots.append(offset)
+            features.append(tree.feature)
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+            probas.append(value / normalizer)
+            offset += tree.node_count
+        return cls(np.concatenate(features).astype(np.int32),
+                   np.concatenate(thresholds).astype(np.float64),
+                   np.concatenate(lefts).astype(np.int32),
+                   np.concatenate(rights).astype(np.int32),
+                   np.concatenate(probas).astype(np.float64),
+                   np.array(roots, dtype=np.int64),
+                   np.asarray(forest.classes_))
+
+    def arrays(self):
+        return {'feature': self.feature, 'threshold': self.threshold, 'left': self.left,
+                'right': self.right, 'leaf_proba': self.leaf_proba, 'roots': self.roots}
+
+    def apply(self, X):
+        """Leaf node index of every sample in every tree, shape (n_samples, n_trees)"""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_samples, n_trees = len(X), len(self.roots)
+        values = X.ravel()
+        row_offsets = np.repeat(np.arange(n_samples) * X.shape[1], n_trees)
+
+        # One step down every (sample, tree) pair per pass; pairs that reach a leaf drop out
+        leaves = np.tile(np.asarray(self.roots), n_samples)
+        active = np.arange(len(leaves))
+        nodes = leaves
+        while True:
+            feature = self.feature[nodes]
+            inner = feature >= 0
+            if not inner.all():
+                active, nodes, feature = active[inner], nodes[inner], feature[inner]
+                if not len(active):
+                    break
+            go_left = values[row_offsets[active] + feature] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            leaves[active] = nodes
+        return leaves.reshape(n_samples, n_trees)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((len(leaves), len(self.classes_)))
+        # Tree by tree, in order, to add up exactly like sklearn does
+        for t in range(leaves.shape[1]):
+            proba += self.leaf_proba[leaves[:, t]]
+        return proba / leaves.shape[1]
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+class Scaler:
+    """StandardScaler.transform from stored mean and scale"""
+
+    def __init__(self, mean, scale):
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, X):
+        X = X.to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=np.float64)
+        return (X - self.mean) / self.scale
+
+def data_hash(df):
+    """sha256 of a frame's contents (independent of whether it was read from CSV or Parquet)"""
+    digest = hashlib.sha256()
+    digest.update(','.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def save_bundle(model, scaler, feature_columns, training_data=None, metrics=None, path=BUNDLE_PATH):
+    """Write a fitted forest + StandardScaler (+ schema, data hash, metrics) as one bundle file"""
+    forest = ForestModel.from_sklearn(model)
+    if len(feature_columns) != model.n_features_in_:
+        raise ValueError(f"{len(feature_columns)} feature columns for a model trained on "
+                         f"{model.n_features_in_} features")
+
+    arrays = forest.arrays()
+    content = hashlib.sha256()
+    for name in sorted(arrays):
+        content.update(np.ascontiguousarray(arrays[name]).tobytes())
+    content.update(','.join(feature_columns).encode())
+    created = datetime.now()
+
+    bundle = {
+        'format_version': FORMAT_VERSION,
+        'version': f"{created:%Y%m%d-%H%M%S}-{content.hexdigest()[:8]}",
+        'created': created.isoformat(timespec='seconds'),
+        'feature_columns': list(feature_columns),
+        'classes': np.asarray(model.classes_),
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64),
+        'training_data_hash': data_hash(training_data) if training_data is not None else None,
+        'metrics': metrics or {},
+        **arrays,
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    # Uncompressed, so the arrays can be memory-mapped straight from the file
+    joblib.dump(bundle, tmp_path, compress=0)
+    os.replace(tmp_path, path)
+    return bundle['version']
+
+def load_bundle(path=BUNDLE_PATH, mmap=True):
+    """Load a bundle: {'model', 'scaler', 'feature_columns', 'version', 'metrics', ...}"""
+    bundle = joblib.load(path, mmap_mode='r' if mmap else None)
+    if bundle.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path} is bundle format {bundle.get('format_version')}, "
+                         f"this code reads format {FORMAT_VERSION}")
+    if len(bundle['feature_columns']) != len(bundle['scaler_mean']):
+        raise ValueError(f"{path} is inconsistent: {len(bundle['feature_columns'])} feature columns, "
+                         f"scaler fitted on {len(bundle['scaler_mean'])}")
+
+    model = ForestModel(bundle['feature'], bundle['threshold'], bundle['left'], bundle['right'],
+                        bundle['leaf_proba'], bundle['roots'], bundle['classes'])
+    return {
+        'model': model,
+        'scaler': Scaler(bundle['scaler_mean'], bundle['scaler_scale']),
+        'feature_columns': list(bundle['feature_columns']),
+        'version': bundle['version'],
+        'created': bundle['created'],
+        'training_data_hash': bundle['training_data_hash'],
+        'metrics': bundle['metrics'],
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect a model bundle, or build one from the "
+                                                 "old three-pickle layout")
+    parser.add_argument("path", nargs='?', default=BUNDLE_PATH)
+    parser.add_argument("--from-pickles", metavar="MODEL_DIR",
+                        help="Convert atmosphere_model.pkl, scaler.pkl and feature_columns.pkl "
+                             "from MODEL_DIR into a bundle at PATH")
+    args = parser.parse_args()
+
+    if args.from_pickles:
+        model, scaler, feature_columns = (
+            joblib.load(os.path.join(args.from_pickles, name))
+            for name in ['atmosphere_model.pkl', 'scaler.pkl', 'feature_columns.pkl'])
+        version = save_bundle(model, scaler, list(feature_columns), path=args.path)
+        print(f"📦 Wrote {args.path} (version {version})")
+
+    bundle = load_bundle(args.path)
+    print(f"📦 {args.path}")
+    print(f"   Version: {bundle['version']} (created {bundle['created']})")
+    print(f"   Trees: {len(bundle['model'].roots)}, nodes: {len(bundle['model'].feature):,}")
+    print(f"   Features: {', '.join(bundle['feature_columns'])}")
+    print(f"   Training data: {bundle['training_data_hash'] or 'unknown'}")
+    for name, value in bundle['metrics'].items():
+        print(f"   {name}: {value}")
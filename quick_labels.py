@@ -1,72 +1,87 @@
 # quick_labels.py - Auto-generate labels from data
+import json
+import os
 import pandas as pd
 import numpy as np
-from config import NEIGHBORHOODS
-
-print("🤖 AUTO-GENERATING LABELS FROM DATA...\n")
-
-# Load features
-features_311 = pd.read_csv("data/processed/features_311.csv")
-features_images = pd.read_csv("data/processed/features_images.csv")
-
-# Merge
-data = features_311.merge(features_images, on='name')
-
-labels = []
-
-for _, row in data.iterrows():
-    # SAFETY: Fewer complaints = safer
-    max_complaints = data['total_complaints'].max()
-    complaint_ratio = row['total_complaints'] / max_complaints if max_complaints > 0 else 0
-    safety = 5 - int(complaint_ratio * 4)
-    safety = max(1, min(5, safety))
-    
-    # LIVELINESS: More noise = more lively (but cap it)
-    max_noise = data['noise_complaints'].max()
-    noise_ratio = row['noise_complaints'] / max_noise if max_noise > 0 else 0
-    liveliness = 2 + int(noise_ratio * 3)
-    liveliness = max(2, min(5, liveliness))
-    
-    # CLEANLINESS: Less graffiti/street issues = cleaner
-    max_graffiti = data['graffiti'].max()
-    max_street = data['street_condition'].max()
-    
-    graffiti_ratio = row['graffiti'] / max_graffiti if max_graffiti > 0 else 0
-    street_ratio = row['street_condition'] / max_street if max_street > 0 else 0
-    
-    cleanliness = 5 - int((graffiti_ratio + street_ratio) * 2)
-    cleanliness = max(1, min(5, cleanliness))
-    
-    # Calculate overall
-    overall = (safety + liveliness + cleanliness) / 3
-    
-    # Categorize
-    if overall >= 3.5:
-        category = 'positive'
-    elif overall >= 2.5:
-        category = 'neutral'
-    else:
-        category = 'negative'
-    
-    emoji = "😊" if category == 'positive' else "😐" if category == 'neutral' else "😟"
-    
-    print(f"{emoji} {row['name']:25s} → S:{safety} L:{liveliness} C:{cleanliness} = {category}")
-    
-    labels.append({
-        'name': row['name'],
-        'safety': safety,
-        'liveliness': liveliness,
-        'cleanliness': cleanliness,
-        'overall_score': overall,
-        'category': category
-    })
-
-df = pd.DataFrame(labels)
-df.to_csv("data/processed/labels.csv", index=False)
-
-print(f"\n✅ Auto-generated labels for {len(df)} neighborhoods!")
-print(f"📁 Saved to: data/processed/labels.csv")
-
-# Show distribution
-print(f"\n📊 Category Distribution:")
-print(df['category'].value_counts())
+import instrumentation
+from storage import load_table, save_table
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "label_rules.json")
+
+# Per-area lines printed before switching to a summary
+PRINT_LIMIT = 100
+
+def load_rules(rules_path=RULES_PATH):
+    """Scoring rules (see label_rules.json for the format)"""
+    with open(rules_path) as f:
+        return json.load(f)
+
+def column_ratios(data, columns):
+    """Sum of each column divided by its maximum (a column whose max is 0 contributes 0)"""
+    total = np.zeros(len(data))
+    for column in columns:
+        values = data[column].to_numpy(dtype=np.float64)
+        peak = values.max() if len(values) else 0
+        total = total + (values / peak if peak > 0 else 0)
+    return total
+
+def score_labels(data, rules):
+    """Score every area at once: one pass over each column instead of a loop over rows"""
+    labels = pd.DataFrame({'name': data['name'].to_numpy()})
+
+    for score, rule in rules['scores'].items():
+        # int() in the original per-row rules truncates toward zero
+        points = np.trunc(column_ratios(data, rule['columns']) * rule['points']).astype(np.int64)
+        labels[score] = np.clip(rule['start'] + rule['direction'] * points, rule['min'], rule['max'])
+
+    score_columns = list(rules['scores'])
+    overall = labels[score_columns[0]].to_numpy()
+    for score in score_columns[1:]:
+        overall = overall + labels[score].to_numpy()
+    labels['overall_score'] = overall / len(score_columns)
+
+    # First matching category wins, like an if/elif chain
+    conditions = [labels['overall_score'] >= c['threshold']
+                  for c in rules['categories'] if c['threshold'] is not None]
+    names = [c['name'] for c in rules['categories'] if c['threshold'] is not None]
+    fallback = next(c['name'] for c in rules['categories'] if c['threshold'] is None)
+    labels['category'] = np.select(conditions, names, default=fallback)
+
+    return labels
+
+def print_labels(labels, rules, limit=PRINT_LIMIT):
+    emoji = {c['name']: c['emoji'] for c in rules['categories']}
+    for row in labels.head(limit).itertuples(index=False):
+        row = row._asdict()
+        scores = ' '.join(f"{score[0].upper()}:{row[score]}" for score in rules['scores'])
+        print(f"{emoji[row['category']]} {row['name']:25s} → {scores} = {row['category']}")
+    if len(labels) > limit:
+        print(f"   … and {len(labels) - limit:,} more")
+
+if __name__ == "__main__":
+    print("🤖 AUTO-GENERATING LABELS FROM DATA...\n")
+
+    rules = load_rules()
+
+    # Load features
+    with instrumentation.stage('load'):
+        features_311 = load_table('features_311')
+        features_images = load_table('features_images')
+
+    # Merge
+    data = features_311.merge(features_images, on='name')
+
+    with instrumentation.stage('label'):
+        df = score_labels(data, rules)
+    print_labels(df, rules)
+
+    instrumentation.count('areas', len(df))
+    with instrumentation.stage('save'):
+        path = save_table(df, 'labels')
+
+    print(f"\n✅ Auto-generated labels for {len(df)} neighborhoods!")
+    print(f"📁 Saved to: {path}")
+
+    # Show distribution
+    print(f"\n📊 Category Distribution:")
+    print(df['category'].value_counts())
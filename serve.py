@@ -0,0 +1,337 @@
+# serve.py - Local HTTP scoring service with micro-batching and hot model reload
+# Usage: python serve.py [--port 8000] [--max-batch 64] [--max-wait-ms 2] [--watch 5]
+"""Scoring service.
+
+The model is loaded once at startup. Request threads don't call the
+model themselves: they queue their rows, and a single batching thread
+drains the queue (up to --max-batch rows, waiting at most --max-wait-ms
+for more to arrive) into one scaler.transform + predict_proba call, then
+hands each request its slice of the result.
+
+The model is the single bundle file train_model.py writes (see
+model_bundle.py), memory-mapped, so several serve.py processes on one
+machine share the tree arrays. A reload loads the new bundle next to the
+old one and swaps a single reference, so requests keep being answered
+throughout; a batch that already started finishes on the model it
+started with.
+
+Endpoints:
+  POST /predict  {"instances": [{<feature>: value, ...}, ...]}
+                 or {"points": [{"lat": .., "lon": ..}, ...]} to featurize locations
+  POST /reload   load the model bundle again
+  GET  /health   model version and batching stats
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from model_bundle import BUNDLE_PATH, load_bundle
+
+def load_model(bundle_path=BUNDLE_PATH):
+    """Model, scaler and feature columns from the bundle written by train_model.py"""
+    bundle = load_bundle(bundle_path)
+    bundle['loaded_at'] = datetime.now().isoformat(timespec='seconds')
+    return bundle
+
+class ModelHolder:
+    """The model currently being served; reload() swaps it without stopping requests"""
+
+    def __init__(self, bundle_path=BUNDLE_PATH):
+        self.bundle_path = bundle_path
+        self.lock = threading.Lock()
+        self.signature = self._signature()
+        self.pending = None
+        self.current = load_model(bundle_path)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.bundle_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def reload(self):
+        """Load the bundle and start serving it; the old model serves until then"""
+        with self.lock:
+            signature = self._signature()
+            self.current = load_model(self.bundle_path)
+            self.signature = signature
+            return self.current
+
+    def reload_if_changed(self):
+        """Reload once the bundle has changed and then stayed the same for one more poll
+        (bundles are replaced atomically, but a copied-in file may still be growing)"""
+        signature = self._signature()
+        if signature == self.signature or signature is None:
+            self.pending = None
+            return False
+        if signature != self.pending:
+            self.pending = signature
+            return False
+        self.reload()
+        self.pending = None
+        return True
+
+    def watch(self, interval):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.reload_if_changed():
+                        print(f"🔄 Reloaded model version {self.current['version']}", flush=True)
+                except Exception as e:  # keep serving the old model
+                    print(f"  ✗ Reload failed, still serving {self.current['version']}: {e}", flush=True)
+        threading.Thread(target=loop, daemon=True).start()
+
+class MicroBatcher:
+    """Groups rows from concurrent requests into one model call per batch"""
+
+    def __init__(self, holder, max_batch=64, max_wait_ms=2.0):
+        self.holder = holder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.rows = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, instances):
+        """Queue a list of feature dicts; the Future resolves to (model, probabilities)"""
+        future = Future()
+        self.queue.put((instances, future))
+        return future
+
+    def _collect(self):
+        items, size, deadline = [], 0, None
+        while size < self.max_batch:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                instances, future = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            try:
+                n = len(instances)
+            except TypeError as e:  # fail this request, not the batching thread
+                future.set_exception(ValueError(f"bad instances: {e}"))
+                continue
+            items.append((instances, future))
+            size += n
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+        return items
+
+    def _run(self):
+        while True:
+            try:
+                items = self._collect()
+            except Exception as e:  # the thread must outlive any one request
+                print(f"  ✗ Batching error: {e}", flush=True)
+                continue
+            try:
+                self._score(items)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score(self, items):
+        # Everything in this batch uses the same model, even if a reload lands mid-batch
+        bundle = self.holder.current
+        columns = bundle['feature_columns']
+
+        rows, accepted = [], []
+        for instances, future in items:
+            try:
+                rows.extend([float(instance[c]) for c in columns] for instance in instances)
+            except (KeyError, TypeError, ValueError) as e:
+                future.set_exception(ValueError(f"bad instance: missing or non-numeric {e}"))
+                continue
+            accepted.append((len(instances), future))
+        if not rows:
+            return
+
+        try:
+            X = bundle['scaler'].transform(np.array(rows))
+            probs = bundle['model'].predict_proba(X)
+        except Exception as e:
+            for _, future in accepted:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        offset = 0
+        for n, future in accepted:
+            future.set_result((bundle, probs[offset:offset + n]))
+            offset += n
+
+class PointFeaturizer:
+    """Model features for arbitrary locations.
+
+    311 counts are radius queries on the complaint grid (same radius and
+    complaint types as extract_311_features). Image features are those
+    of the nearest neighborhood we have Street View features for.
+    """
+
+    def __init__(self):
+        from complaint_grid import ComplaintGrid
+        from extract_311_features import RADIUS_KM
+        from spatial import build_point_index
+        from storage import load_table
+
+        self.grid = ComplaintGrid.load()
+        self.radius_km = RADIUS_KM
+
+        hoods = load_table('features_311')[['name', 'lat', 'lon']]
+        images = hoods.merge(load_table('features_images'), on='name')
+        self.image_tree = build_point_index(images['lat'].values, images['lon'].values)
+        self.image_features = images.drop(columns=['name', 'lat', 'lon'])
+
+    def featurize(self, points):
+        import pandas as pd
+        from extract_311_features import area_features
+        from spatial import project_km
+
+        lats, lons = [p['lat'] for p in points], [p['lon'] for p in points]
+        counts = self.grid.radius_counts(lats, lons, self.radius_km)
+        complaints = area_features(None, lats, lons, counts, np.pi * self.radius_km ** 2)
+        _, nearest = self.image_tree.query(project_km(lats, lons))
+        images = self.image_features.iloc[nearest].reset_index(drop=True)
+        return pd.concat([complaints.drop(columns=['name', 'lat', 'lon', 'borough']), images],
+                         axis=1).to_dict('records')
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 resets connections under a burst of clients
+    request_queue_size = 128
+
+def make_handler(holder, batcher, featurizer=None, timeout=30):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; with Nagle on, each response
+        # would wait for the client's delayed ACK (~40 ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self.send_json(404, {'error': 'not found'})
+            self.send_json(200, {
+                'model_version': holder.current['version'],
+                'loaded_at': holder.current['loaded_at'],
+                'feature_columns': holder.current['feature_columns'],
+                'batches': batcher.batches,
+                'rows': batcher.rows,
+                'avg_batch': batcher.rows / batcher.batches if batcher.batches else 0,
+            })
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError as e:
+                return self.send_json(400, {'error': f"invalid JSON: {e}"})
+            if not isinstance(payload, dict):
+                return self.send_json(400, {'error': "expected a JSON object"})
+
+            if self.path == '/reload':
+                try:
+                    bundle = holder.reload()
+                except Exception as e:
+                    return self.send_json(500, {'error': f"reload failed: {e}",
+                                                'model_version': holder.current['version']})
+                return self.send_json(200, {'model_version': bundle['version']})
+
+            if self.path != '/predict':
+                return self.send_json(404, {'error': 'not found'})
+
+            if 'points' in payload:
+                if featurizer is None:
+                    return self.send_json(400, {'error': "location scoring is off "
+                                                         "(no complaint/feature tables at startup)"})
+                try:
+                    instances = featurizer.featurize(payload['points'])
+                except (KeyError, TypeError, ValueError) as e:
+                    return self.send_json(400, {'error': f"bad points: {e}"})
+            else:
+                instances = payload.get('instances')
+            if not instances:
+                return self.send_json(400, {'error': "expected 'instances' or 'points'"})
+            if not isinstance(instances, list) or not all(isinstance(i, dict) for i in instances):
+                return self.send_json(400, {'error': "'instances' must be a list of objects"})
+
+            try:
+                bundle, probs = batcher.submit(instances).result(timeout=timeout)
+            except ValueError as e:
+                return self.send_json(400, {'error': str(e)})
+            except Exception as e:
+                return self.send_json(500, {'error': str(e)})
+
+            classes = bundle['model'].classes_
+            self.send_json(200, {
+                'model_version': bundle['version'],
+                'predictions': [{'category': str(classes[row.argmax()]),
+                                 'probabilities': dict(zip(map(str, classes), row.tolist()))}
+                                for row in probs],
+            })
+
+    return ScoringHandler
+
+def make_server(host='127.0.0.1', port=8000, bundle_path=BUNDLE_PATH, max_batch=64, max_wait_ms=2.0,
+                watch=None, points=True):
+    holder = ModelHolder(bundle_path)
+    if watch:
+        holder.watch(watch)
+    batcher = MicroBatcher(holder, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    featurizer = None
+    if points:
+        try:
+            featurizer = PointFeaturizer()
+        except FileNotFoundError as e:
+            print(f"⚠️  Location scoring disabled: {e}")
+
+    server = ScoringServer((host, port), make_handler(holder, batcher, featurizer))
+    return server, holder
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve CitySense predictions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=BUNDLE_PATH, help="Model bundle to serve")
+    parser.add_argument("--max-batch", type=int, default=64,
+                        help="Most rows scored in one model call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="How long a batch waits for more requests before running")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS",
+                        help="Poll the model bundle and hot-reload when it changes")
+    parser.add_argument("--no-points", action="store_true",
+                        help="Skip loading complaints for lat/lon scoring (faster startup)")
+    args = parser.parse_args()
+
+    server, holder = make_server(args.host, args.port, args.model, args.max_batch,
+                                 args.max_wait_ms, args.watch, points=not args.no_points)
+    print(f"🚀 Serving model {holder.current['version']} on "
+          f"http://{args.host}:{server.server_address[1]} "
+          f"(batches of up to {args.max_batch}, {args.max_wait_ms} ms wait)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
@@ -0,0 +1,57 @@
+# soda_client.py - Pooled, rate-limited, retrying client for NYC Open Data (SODA)
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from http_utils import TokenBucket, get_with_retry
+from http_utils import make_session as make_http_session
+
+BASE_URL = "https://data.cityofnewyork.us/resource/erm2-nwe9.json"
+SELECT = "unique_key,created_date,complaint_type,latitude,longitude,borough"
+
+# Without an app token SODA throttles hard; with one it allows far more
+APP_TOKEN = os.environ.get("SODA_APP_TOKEN")
+
+def make_session(pool_size=8):
+    """Pooled session for SODA, sending the app token when we have one"""
+    return make_http_session(pool_size, headers={"X-App-Token": APP_TOKEN} if APP_TOKEN else None)
+
+def get_json(session, url, params, limiter=None, **retry_options):
+    """GET a SODA page (with retries) and return its records; raises once retries run out"""
+    response = get_with_retry(session, url, params, limiter, **retry_options)
+    if response.status_code != 200:
+        response.raise_for_status()
+        raise requests.HTTPError(f"Unexpected status {response.status_code}", response=response)
+    return response.json()
+
+def fetch_many(param_sets, on_page, url=BASE_URL, concurrency=4, rate=5.0, session=None):
+    """Fetch many SODA queries concurrently and hand each page to on_page as it arrives.
+
+    param_sets maps a label (e.g. a week or offset) to query params.
+    on_page(label, records) is called from the main thread, so it can write
+    to disk without locking. Returns the number of records fetched; if any
+    query still fails after its retries, the rest finish first and then a
+    RuntimeError names the failed labels.
+    """
+    session = session or make_session(concurrency)
+    limiter = TokenBucket(rate, burst=concurrency)
+    total = 0
+    failed = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(get_json, session, url, params, limiter): label
+                   for label, params in param_sets.items()}
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                records = future.result()
+            except requests.RequestException as e:
+                failed[label] = e
+                continue
+            total += len(records)
+            on_page(label, records)
+
+    if failed:
+        details = ", ".join(f"{label} ({error})" for label, error in failed.items())
+        raise RuntimeError(f"{len(failed)} SODA queries failed after retries: {details}")
+
+    return total
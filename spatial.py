@@ -0,0 +1,85 @@
+# spatial.py - Shared geometry helpers for neighborhood queries
+import json
+import numpy as np
+import shapely
+import shapely.geometry
+from scipy.spatial import cKDTree
+
+# Reference point for the local projection (roughly the middle of NYC)
+NYC_REF_LAT = 40.7128
+NYC_REF_LON = -74.0060
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320 * np.cos(np.radians(NYC_REF_LAT))
+
+def project_km(lat, lon):
+    """Project lat/lon degrees onto a flat x/y grid in km around NYC.
+
+    An equirectangular projection is accurate to well under 1% across the
+    five boroughs, so plain Euclidean distance on the result is a real
+    distance in km (unlike raw degrees, where 1° lon is only ~84 km here).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = (lon - NYC_REF_LON) * KM_PER_DEG_LON
+    y = (lat - NYC_REF_LAT) * KM_PER_DEG_LAT
+    return np.column_stack([x, y])
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance in km between points (works on arrays)"""
+    a = project_km(lat1, lon1)
+    b = project_km(lat2, lon2)
+    return np.hypot(a[:, 0] - b[:, 0], a[:, 1] - b[:, 1])
+
+def build_point_index(lat, lon):
+    """Build a KD-tree over complaint coordinates (built once, queried many times)"""
+    return cKDTree(project_km(lat, lon), balanced_tree=False, compact_nodes=False)
+
+def query_radius(tree, neighborhoods, radius_km=1.0):
+    """Return, for each neighborhood, the row positions within radius_km of its center"""
+    centers = project_km([h['lat'] for h in neighborhoods],
+                         [h['lon'] for h in neighborhoods])
+    return tree.query_ball_point(centers, r=radius_km, return_sorted=False)
+
+def load_boundaries(geojson_path, name_field):
+    """Load boundary polygons (e.g. NTA or community districts) from a local GeoJSON file"""
+    with open(geojson_path) as f:
+        collection = json.load(f)
+
+    names, geoms = [], []
+    for feature in collection['features']:
+        if feature.get('geometry') is None:
+            continue
+        names.append(str(feature['properties'][name_field]))
+        geoms.append(shapely.geometry.shape(feature['geometry']))
+
+    geom_array = np.empty(len(geoms), dtype=object)
+    geom_array[:] = geoms
+    return names, geom_array
+
+def polygon_areas_km2(geoms):
+    """Real polygon areas in km², measured on the same projection as the points"""
+    projected = shapely.transform(geoms, lambda xy: project_km(xy[:, 1], xy[:, 0]))
+    return shapely.area(projected)
+
+def assign_to_polygons(lat, lon, geoms):
+    """Assign every point to exactly one polygon in a single bulk tree query.
+
+    Returns an int array of polygon positions, -1 for points outside every
+    polygon. Points on a shared border go to the lowest polygon index, so
+    nothing is double-counted.
+    """
+    shapely.prepare(geoms)
+    tree = shapely.STRtree(geoms)
+    points = shapely.points(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+
+    point_idx, poly_idx = tree.query(points, predicate='intersects')
+
+    # For points matching several polygons, keep the lowest polygon index
+    order = np.lexsort((poly_idx, point_idx))
+    point_idx, poly_idx = point_idx[order], poly_idx[order]
+    hit, first = np.unique(point_idx, return_index=True)
+
+    assigned = np.full(len(points), -1, dtype=np.int64)
+    assigned[hit] = poly_idx[first]
+    return assigned
@@ -0,0 +1,266 @@
+# storage.py - Shared table storage for the pipeline stages
+"""Every stage saves and loads its tables through this module.
+
+Tables are stored as Parquet by default (typed columns, compressed, and
+readable column-by-column). CSV is still available as an export format,
+or as the main format by setting CITYSENSE_FORMAT=csv. Reads fall back to
+an existing CSV when no Parquet copy is there yet, so the checked-in data
+keeps working.
+"""
+import os
+import re
+import shutil
+import time
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - CSV-only install
+    pa = None
+
+# Logical table name → path without extension
+TABLES = {
+    'complaints': 'data/raw/311_complaints',
+    # Collectors fetch here and replace_table() it into 'complaints' once they have data
+    'complaints_staging': 'data/raw/311_complaints_staging',
+    'features_311': 'data/processed/features_311',
+    'features_images': 'data/processed/features_images',
+    'features_temporal': 'data/processed/features_temporal',
+    'labels': 'data/processed/labels',
+    'combined_features': 'data/processed/combined_features',
+    'predictions': 'data/processed/predictions',
+    'complaint_cells': 'data/processed/complaint_cells',
+    'tile_cells': 'data/processed/tile_cells',
+    'grid_ledger': 'data/processed/grid_ledger',
+    'complaint_retractions': 'data/raw/complaint_retractions',
+    'area_counts': 'data/processed/area_counts',
+}
+
+DATE_COLUMNS = ['created_date']
+
+DEFAULT_FORMAT = os.environ.get('CITYSENSE_FORMAT', 'parquet' if pa is not None else 'csv')
+
+def table_path(name, fmt=None):
+    """Path of a table in the given format ('parquet' or 'csv')"""
+    fmt = fmt or DEFAULT_FORMAT
+    return f"{TABLES.get(name, name)}.{fmt}"
+
+def _add_partition_columns(df, partition_by):
+    """Derive partition columns that aren't stored on the frame (e.g. month)"""
+    if 'month' in partition_by and 'month' not in df.columns:
+        months = pd.to_datetime(df['created_date']).values.astype('datetime64[M]')
+        df = df.assign(month=months.astype(str))
+    return df
+
+def save_table(df, name, fmt=None, partition_by=None):
+    """Save a table and return the path it was written to.
+
+    partition_by (e.g. ['borough', 'month']) writes a Hive-style Parquet
+    directory, one folder per value, so filtered reads skip whole files.
+    """
+    fmt = fmt or DEFAULT_FORMAT
+    path = table_path(name, fmt)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Replace rather than merge with whatever was stored before
+    _remove(path)
+
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif partition_by:
+        df = _add_partition_columns(df, partition_by)
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False), path,
+            format='parquet', partitioning=partition_by, partitioning_flavor='hive',
+            existing_data_behavior='overwrite_or_ignore',
+            # Buffer rows so each partition gets a few large row groups
+            # rather than one tiny group per input batch
+            min_rows_per_group=100_000, max_rows_per_group=1_000_000,
+        )
+    else:
+        df.to_parquet(path, index=False)
+
+    return path
+
+def append_table(df, name, partition_by=None):
+    """Append rows to a stored table without rewriting what is already there.
+
+    With Parquet the table becomes a dataset directory and every call adds
+    new part files (under the matching partitions when partition_by is set).
+    """
+    fmt = DEFAULT_FORMAT
+    path = table_path(name, fmt)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    if fmt == 'csv':
+        df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        return path
+
+    if os.path.isfile(path):
+        # One-time move from a single file to a dataset directory. Both parts
+        # are written next to it first, so a failed write leaves it untouched
+        tmp_path = path + '.tmp'
+        _remove(tmp_path)
+        try:
+            _write_part(pd.read_parquet(path), tmp_path, partition_by)
+            _write_part(df, tmp_path, partition_by)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+        os.remove(path)
+        os.replace(tmp_path, path)
+        return path
+
+    _write_part(df, path, partition_by)
+    return path
+
+def _write_part(df, path, partition_by=None):
+    """Add df to the dataset at path as new part-<time_ns>-... files"""
+    if partition_by:
+        df = _add_partition_columns(df, partition_by)
+    ds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False), path,
+        format='parquet', partitioning=partition_by, partitioning_flavor='hive',
+        basename_template=f"part-{time.time_ns()}-{os.getpid()}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def delete_table(name):
+    """Remove a stored table (in the current format) so it can be rebuilt from scratch"""
+    _remove(table_path(name))
+
+def replace_table(name, staged):
+    """Move the stored table `staged` into place as `name`, replacing what was there.
+
+    A file replaces a file in one atomic rename. A dataset directory can't
+    be renamed over anything, so the old table is moved aside to
+    <path>.old first and only removed once the new one is in place (and
+    moved back if that fails).
+    """
+    path, staged_path = table_path(name), table_path(staged)
+    if not (os.path.isdir(path) or os.path.isdir(staged_path)):
+        os.replace(staged_path, path)
+        return path
+    old_path = path + '.old'
+    _remove(old_path)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    try:
+        os.replace(staged_path, path)
+    except BaseException:
+        if os.path.exists(old_path):
+            os.replace(old_path, path)
+        raise
+    _remove(old_path)
+    return path
+
+def export_csv(name):
+    """Write a CSV copy of a stored table (for spreadsheets / sharing)"""
+    return save_table(load_table(name), name, fmt='csv')
+
+# Filter operators; these work on pyarrow fields and pandas Series alike
+FILTER_OPS = {
+    '==': lambda col, v: col == v,
+    '=': lambda col, v: col == v,
+    '!=': lambda col, v: col != v,
+    '<': lambda col, v: col < v,
+    '<=': lambda col, v: col <= v,
+    '>': lambda col, v: col > v,
+    '>=': lambda col, v: col >= v,
+    'in': lambda col, v: col.isin(list(v)),
+}
+
+def _to_expression(filters):
+    """Turn [(column, op, value), ...] into a pyarrow filter expression"""
+    expr = None
+    for column, op, value in filters:
+        term = FILTER_OPS[op](ds.field(column), value)
+        expr = term if expr is None else expr & term
+    return expr
+
+def _filter_frame(df, filters):
+    """Apply the same [(column, op, value), ...] filters to an in-memory frame"""
+    for column, op, value in filters:
+        df = df[FILTER_OPS[op](df[column], value)]
+    return df
+
+def stored_table_path(name):
+    """Path load_table would read for this table, or None if it isn't stored yet"""
+    parquet_path = table_path(name, 'parquet')
+    if pa is not None and os.path.exists(parquet_path) and DEFAULT_FORMAT == 'parquet':
+        return parquet_path
+    csv_path = table_path(name, 'csv')
+    return csv_path if os.path.exists(csv_path) else None
+
+def _append_order(path):
+    """Sort key of a part file: append_table's part-<time_ns>-... files by time, save_table's first"""
+    match = re.match(r'part-(\d+)-', os.path.basename(path))
+    return (int(match.group(1)) if match else 0, path)
+
+def table_files(name):
+    """{file: [size, mtime_ns]} of every file behind a stored table ({} if it isn't stored).
+
+    Files are in the order they were written (not path order, which would
+    put borough=BRONX before borough=QUEENS whatever was appended first), so
+    later versions of a row come later. Appends only ever add files, so
+    comparing two snapshots shows what was appended (new files) and whether
+    anything was rewritten (changed or missing ones).
+    """
+    path = stored_table_path(name)
+    if path is None:
+        return {}
+    if os.path.isdir(path):
+        paths = sorted((os.path.join(folder, f) for folder, _, files in os.walk(path)
+                        for f in files if f.endswith('.parquet')), key=_append_order)
+    else:
+        paths = [path]
+    return {p: [os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in paths}
+
+def load_table(name, columns=None, filters=None, files=None):
+    """Load a table, reading only the requested columns and rows.
+
+    filters is a list of (column, op, value) tuples, e.g.
+    [('borough', '==', 'BRONX'), ('created_date', '>=', pd.Timestamp('2025-01-01'))].
+    With Parquet they are pushed down to the reader, so row groups and
+    partitions that can't match are never decoded. files (from table_files)
+    restricts a Parquet dataset to those part files. Rows come back in the
+    order they were appended.
+    """
+    path = stored_table_path(name)
+
+    if path is not None and path.endswith('.parquet'):
+        if files is None and os.path.isdir(path):
+            files = table_files(name)
+        if files is not None:
+            dataset = ds.dataset(list(files), format='parquet', partitioning='hive',
+                                 partition_base_dir=path if os.path.isdir(path) else None)
+        else:
+            dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        table = dataset.to_table(columns=columns,
+                                 filter=_to_expression(filters) if filters else None)
+        df = table.to_pandas()
+        # Hive partition values come back as dictionary columns
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(str)
+        return df
+
+    if path is not None:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = None
+        if columns is not None:
+            usecols = list(columns) + [c for c, _, _ in filters or [] if c not in columns]
+        dates = [c for c in DATE_COLUMNS if c in header and (usecols is None or c in usecols)]
+        df = pd.read_csv(path, usecols=usecols, parse_dates=dates)
+        if filters:
+            df = _filter_frame(df, filters)
+        return df[list(columns)] if columns is not None else df
+
+    raise FileNotFoundError(f"No stored table '{name}' (looked for {table_path(name, 'parquet')} "
+                            f"and {table_path(name, 'csv')})")
@@ -0,0 +1,120 @@
+# sync_311.py - Incremental 311 sync with a created_date watermark
+import json
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+from soda_client import BASE_URL, SELECT, TokenBucket, get_json, make_session
+import instrumentation
+from storage import append_table
+
+STATE_PATH = "data/raw/311_sync_state.json"
+PAGE_SIZE = 10000
+PARTITION_BY = ['borough', 'month']
+
+def load_watermark(state_path=STATE_PATH):
+    """Last (created_date, unique_key) we have stored, or None on first run"""
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_watermark(watermark, state_path=STATE_PATH):
+    """Write the watermark atomically so a crash never leaves half a file"""
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+def keyset_params(watermark, page_size=PAGE_SIZE):
+    """SoQL for the next page strictly after the watermark.
+
+    Keyset pagination on (created_date, unique_key) instead of $offset:
+    the server seeks straight to the watermark, so every page costs the
+    same no matter how deep into the history we are.
+    """
+    created, key = watermark['created_date'], watermark['unique_key']
+    return {
+        "$select": SELECT,
+        "$where": (f"latitude IS NOT NULL AND longitude IS NOT NULL AND "
+                   f"(created_date > '{created}' OR "
+                   f"(created_date = '{created}' AND unique_key > '{key}'))"),
+        "$order": "created_date ASC, unique_key ASC",
+        "$limit": page_size,
+    }
+
+def clean_page(records):
+    """Same coercion and NYC bounds filter as the other collectors"""
+    df = pd.DataFrame(records, columns=SELECT.split(','))
+    df['unique_key'] = df['unique_key'].astype(str)
+    df['created_date'] = pd.to_datetime(df['created_date'], format='ISO8601')
+    df['borough'] = df['borough'].fillna('Unspecified')
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    df = df.dropna(subset=['latitude', 'longitude'])
+    return df[
+        (df['latitude'] > 40.4) & (df['latitude'] < 41.0) &
+        (df['longitude'] > -74.3) & (df['longitude'] < -73.7)
+    ]
+
+def sync_311(since_days=56, page_size=PAGE_SIZE, base_url=BASE_URL, state_path=STATE_PATH):
+    """Fetch only complaints newer than the stored watermark and append them"""
+    print("🔄 Incremental 311 sync...\n")
+
+    watermark = load_watermark(state_path)
+    if watermark is None:
+        start = datetime.now() - timedelta(days=since_days)
+        watermark = {'created_date': start.strftime('%Y-%m-%dT%H:%M:%S.000'), 'unique_key': ''}
+        print(f"🆕 No watermark yet, starting from {watermark['created_date']}")
+    else:
+        print(f"📌 Watermark: {watermark['created_date']} / {watermark['unique_key']}")
+
+    session = make_session(pool_size=1)
+    limiter = TokenBucket(rate=5.0)
+    total_rows = 0
+    total_bytes = 0
+    page = 0
+
+    while True:
+        page += 1
+        records = get_json(session, base_url, keyset_params(watermark, page_size), limiter)
+        total_bytes += len(json.dumps(records))
+
+        if not records:
+            break
+
+        df = clean_page(records)
+        if len(df):
+            with instrumentation.stage('append'):
+                append_table(df, 'complaints', partition_by=PARTITION_BY)
+        total_rows += len(df)
+        instrumentation.count('complaints_fetched', len(records))
+        instrumentation.count('complaints_saved', len(df))
+
+        # Advance past the last record we saw (even if it was filtered out),
+        # and only after its page is safely on disk
+        last = records[-1]
+        watermark = {'created_date': last['created_date'], 'unique_key': str(last['unique_key'])}
+        save_watermark(watermark, state_path)
+
+        print(f"  ✓ Page {page}: {len(records):,} fetched, {len(df):,} stored "
+              f"(up to {watermark['created_date']})")
+
+        if len(records) < page_size:
+            break
+
+    print(f"\n✅ Synced {total_rows:,} new complaints ({total_bytes / 1024:,.1f} KB transferred)")
+    print(f"📌 New watermark: {watermark['created_date']} / {watermark['unique_key']}")
+    return total_rows
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally sync NYC 311 complaints")
+    parser.add_argument("--since-days", type=int, default=56,
+                        help="How far back to start when there is no watermark yet")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    with instrumentation.stage('sync'):
+        sync_311(since_days=args.since_days, page_size=args.page_size)
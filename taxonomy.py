@@ -0,0 +1,103 @@
+# taxonomy.py - Canonical complaint families for raw 311 complaint types
+"""Complaint taxonomy shared by every stage that counts complaints by type.
+
+Raw types vary across sources and years: the API's complaint_type, the
+newer exports' "Problem (formerly Complaint Type)" (renamed to
+complaint_type by clean_311_data.py), upper-case legacy names such as
+"HEAT/HOT WATER", and one noise type per source ("Noise - Residential",
+"Noise - Street/Sidewalk", ...). Each distinct string is classified once
+into a family in FAMILIES, and rows carry the family as a small integer
+code, so counting per area is a single bincount over (area, family).
+"""
+import numpy as np
+import pandas as pd
+
+# Family names; a row's family code is its position here ('other' for anything unmatched)
+FAMILIES = (
+    'other',
+    'noise',
+    'street_condition',
+    'graffiti',
+    'heat_hot_water',
+    'illegal_parking',
+    'blocked_driveway',
+    'sanitation',
+    'water',
+    'sewer',
+    'street_light',
+    'traffic_signal',
+    'homeless',
+    'derelict_vehicle',
+    'rodent',
+    'construction',
+    'air_quality',
+)
+OTHER = FAMILIES.index('other')
+
+# Normalized raw type (see normalize) → family
+ALIASES = {
+    'street condition': 'street_condition',
+    'highway condition': 'street_condition',
+    'graffiti': 'graffiti',
+    'heat/hot water': 'heat_hot_water',
+    'heating': 'heat_hot_water',
+    'non-residential heat': 'heat_hot_water',
+    'illegal parking': 'illegal_parking',
+    'blocked driveway': 'blocked_driveway',
+    'sanitation condition': 'sanitation',
+    'dirty condition': 'sanitation',
+    'dirty conditions': 'sanitation',
+    'missed collection': 'sanitation',
+    'missed collection (all materials)': 'sanitation',
+    'overflowing litter baskets': 'sanitation',
+    'litter basket / request': 'sanitation',
+    'water system': 'water',
+    'water leak': 'water',
+    'water quality': 'water',
+    'sewer': 'sewer',
+    'street light condition': 'street_light',
+    'traffic signal condition': 'traffic_signal',
+    'homeless person assistance': 'homeless',
+    'homeless encampment': 'homeless',
+    'derelict vehicle': 'derelict_vehicle',
+    'derelict vehicles': 'derelict_vehicle',
+    'abandoned vehicle': 'derelict_vehicle',
+    'rodent': 'rodent',
+    'general construction': 'construction',
+    'general construction/plumbing': 'construction',
+    'building/use': 'construction',
+    'air quality': 'air_quality',
+}
+
+def normalize(complaint_type):
+    """Lower-case with single spaces, so 'HEAT/HOT WATER' and 'Heat/Hot  Water' match"""
+    return ' '.join(str(complaint_type).lower().split())
+
+def classify(complaint_type):
+    """Family of one raw complaint type"""
+    if complaint_type is None or pd.isna(complaint_type):
+        return 'other'
+    name = normalize(complaint_type)
+    # Every noise source has its own type: 'Noise - Residential', 'Collection Truck Noise', ...
+    if name.startswith('noise') or name.endswith('noise'):
+        return 'noise'
+    return ALIASES.get(name, 'other')
+
+def family_lookup(complaint_types):
+    """Family code of each given (distinct) complaint type, as an int8 array"""
+    return np.array([FAMILIES.index(classify(t)) for t in complaint_types], dtype=np.int8)
+
+def family_codes(complaint_types):
+    """Family code of every row (int8), classifying each distinct string only once.
+
+    Values that are already families (family_categorical) just hand back their codes.
+    """
+    dtype = getattr(complaint_types, 'dtype', None)
+    if isinstance(dtype, pd.CategoricalDtype) and list(dtype.categories) == list(FAMILIES):
+        return np.asarray(pd.Categorical(complaint_types).codes, dtype=np.int8)
+    codes, uniques = pd.factorize(pd.Series(complaint_types, copy=False), use_na_sentinel=False)
+    return family_lookup(uniques)[codes]
+
+def family_categorical(complaint_types):
+    """Rows' families as a pandas Categorical over FAMILIES (int8 codes, one copy of each name)"""
+    return pd.Categorical.from_codes(family_codes(complaint_types), categories=list(FAMILIES))
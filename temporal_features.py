@@ -0,0 +1,136 @@
+# temporal_features.py - Rolling time-window 311 features per neighborhood
+# Usage: python temporal_features.py [--as-of YYYY-MM-DD] [--boundaries nta.geojson --name-field ntaname]
+"""Time-aware 311 features, merged into the combined table by combine_features.py.
+
+For every area (1km circles around config.NEIGHBORHOODS, or polygons with
+--boundaries) and every complaint family in extract_311_features.TYPE_COLUMNS:
+  <column>_7d / _30d / _90d   complaints in the last 7, 30 and 90 days
+  complaints_7d / _30d / _90d the same for every complaint type together
+  complaints_wow_change       last 7 days vs the 7 before, as a relative change
+  hour_00 ... hour_23         share of the area's complaints in each hour of the day
+  dow_mon ... dow_sun         share in each day of the week
+
+"Last" is relative to --as-of, by default the newest complaint in the
+compact complaint store (complaint_store.py) the complaints are read from.
+Complaints are assigned to areas exactly (radius_pairs / polygon_pairs),
+as `extract_311_features.py --exact` does; the default grid counts of
+features_311 can differ by a few complaints near area edges.
+
+All windows come from one sort: (area, family, time) triples are sorted
+once, so every window count for every (area, family) is two binary searches
+on the sorted keys, however long the history.
+"""
+import numpy as np
+import pandas as pd
+import instrumentation
+from extract_311_features import TYPE_COLUMNS, polygon_pairs, radius_pairs
+from spatial import load_boundaries
+from complaint_store import STORE_DIR, ComplaintStore
+from storage import save_table
+from taxonomy import FAMILIES, family_codes
+
+WINDOW_DAYS = (7, 30, 90)
+TREND_DAYS = 7
+
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+def load_complaints(path=STORE_DIR):
+    """Just the columns we need from the compact complaint store (complaint_store.py), types as families"""
+    store = ComplaintStore.open(path)
+    df = store.frame(columns=['latitude', 'longitude', 'family', 'created_date'])
+    return df.rename(columns={'family': 'complaint_type'})
+
+def window_counts(group, seconds, n_groups, windows):
+    """Events per group in each (start, end] window of seconds.
+
+    One sort of group * span + time puts every group's events in time
+    order, back to back; a window's count for all groups at once is then
+    the difference of two searchsorted calls. Returns (n_groups, n_windows).
+    """
+    starts = np.array([start for start, _ in windows], dtype=np.int64)
+    ends = np.array([end for _, end in windows], dtype=np.int64)
+    # Shift times to start at 0 so each group gets its own block of `span` keys
+    origin = min(seconds.min(), starts.min()) if len(seconds) else starts.min()
+    span = max(seconds.max() if len(seconds) else 0, ends.max()) - origin + 1
+    keys = np.sort(group * span + (seconds - origin))
+
+    base = np.arange(n_groups, dtype=np.int64)[:, None] * span - origin
+    return (np.searchsorted(keys, base + ends, 'right') -
+            np.searchsorted(keys, base + starts, 'right'))
+
+def temporal_features(names, area, complaints, rows, as_of=None):
+    """The features_temporal table from (area, complaint row) pairs"""
+    n_areas = len(names)
+    created = pd.to_datetime(complaints['created_date']).to_numpy().astype('datetime64[s]')
+    seconds = created.astype(np.int64)[rows]
+    as_of = (int(pd.Timestamp(as_of).to_datetime64().astype('datetime64[s]').astype(np.int64))
+             if as_of is not None else int(seconds.max()) if len(seconds) else 0)
+
+    n_families = len(FAMILIES)
+    codes = family_codes(complaints['complaint_type']).astype(np.int64)[rows]
+
+    day = 86400
+    windows = [(as_of - days * day, as_of) for days in WINDOW_DAYS]
+    windows.append((as_of - 2 * TREND_DAYS * day, as_of - TREND_DAYS * day))
+    counts = window_counts(area * n_families + codes, seconds, n_areas * n_families, windows)
+    counts = counts.reshape(n_areas, n_families, len(windows))
+
+    features = {'name': names}
+    for column, family in TYPE_COLUMNS.items():
+        for w, days in enumerate(WINDOW_DAYS):
+            features[f'{column}_{days}d'] = counts[:, FAMILIES.index(family), w]
+    totals = counts.sum(axis=1)
+    for w, days in enumerate(WINDOW_DAYS):
+        features[f'complaints_{days}d'] = totals[:, w]
+
+    recent, previous = totals[:, WINDOW_DAYS.index(TREND_DAYS)], totals[:, -1]
+    features['complaints_wow_change'] = (recent - previous) / np.maximum(previous, 1)
+
+    # Hour-of-day and day-of-week shares over the whole history
+    hours = (seconds // 3600) % 24
+    weekdays = (seconds // day + 3) % 7   # 1970-01-01 was a Thursday
+    n_complaints = np.maximum(np.bincount(area, minlength=n_areas), 1)[:, None]
+    by_hour = np.bincount(area * 24 + hours, minlength=n_areas * 24).reshape(n_areas, 24) / n_complaints
+    by_day = np.bincount(area * 7 + weekdays, minlength=n_areas * 7).reshape(n_areas, 7) / n_complaints
+    features.update({f'hour_{h:02d}': by_hour[:, h] for h in range(24)})
+    features.update({f'dow_{name}': by_day[:, d] for d, name in enumerate(DAY_NAMES)})
+    return pd.DataFrame(features)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rolling time-window 311 features per neighborhood")
+    parser.add_argument("--as-of", help="End of every window (default: newest complaint)")
+    parser.add_argument("--boundaries", help="GeoJSON of boundary polygons (e.g. NTAs); "
+                                             "default is 1km circles around config.NEIGHBORHOODS")
+    parser.add_argument("--name-field", default="ntaname",
+                        help="GeoJSON property holding the area name")
+    args = parser.parse_args()
+
+    with instrumentation.stage('load'):
+        complaints = load_complaints()
+    instrumentation.count('complaints', len(complaints))
+
+    with instrumentation.stage('spatial_join'):
+        if args.boundaries:
+            names, geoms = load_boundaries(args.boundaries, args.name_field)
+            area, rows = polygon_pairs(complaints, geoms)
+        else:
+            from config import NEIGHBORHOODS
+            names = [hood['name'] for hood in NEIGHBORHOODS]
+            area, rows = radius_pairs(complaints, NEIGHBORHOODS)
+    print(f"📊 {len(rows):,} (area, complaint) pairs over {len(names)} areas")
+
+    with instrumentation.stage('windows'):
+        features = temporal_features(names, area, complaints, rows, as_of=args.as_of)
+    instrumentation.count('areas', len(features))
+
+    window_columns = [f'complaints_{days}d' for days in WINDOW_DAYS] + ['complaints_wow_change']
+    print(f"\n✅ Extracted {features.shape[1] - 1} temporal features!")
+    print(features[['name'] + window_columns])
+
+    with instrumentation.stage('save'):
+        path = save_table(features, 'features_temporal')
+    print(f"📁 Saved to {path}")
+    print("\n✅ Done!")
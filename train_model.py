@@ -1,16 +1,82 @@
 # train_model.py
+# Usage: python train_model.py [--candidates 27] [--jobs -1]
+import argparse
+import time
+import warnings
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingRandomSearchCV)
+from sklearn.model_selection import GroupKFold, HalvingRandomSearchCV
 from sklearn.preprocessing import StandardScaler
-import joblib
+import instrumentation
+from model_bundle import BUNDLE_PATH, save_bundle
+from spatial import project_km
+from storage import load_table, save_table
+
+CV_FOLDS = 5
+
+# Areas are grouped by borough for cross-validation; with fewer than two
+# boroughs in the data they are grouped into square blocks of this size
+BLOCK_KM = 5.0
+
+PARAM_SPACE = {
+    'max_depth': [3, 5, 8, 12, None],
+    'min_samples_leaf': [1, 2, 5, 10],
+    'max_features': ['sqrt', 0.5, None],
+    'class_weight': [None, 'balanced'],
+}
+
+# Successive halving: every candidate starts with MIN_TREES trees, and each
+# round keeps the best third of the candidates and gives them 3x the trees
+MIN_TREES = 10
+MAX_TREES = 270
+
+def cv_groups(data):
+    """Group label per area for spatially blocked CV, and a description of the grouping"""
+    if 'borough' in data.columns and data['borough'].nunique() >= 2:
+        return data['borough'].fillna('unknown').to_numpy(), "borough"
+    cells = np.floor(project_km(data['lat'], data['lon']) / BLOCK_KM).astype(np.int64)
+    return cells[:, 0] * 100_000 + cells[:, 1], f"{BLOCK_KM:g} km blocks"
+
+def search_model(X, y, groups, n_candidates=27, n_jobs=-1):
+    """Successive-halving random search over PARAM_SPACE, scored on held-out groups"""
+    n_splits = min(CV_FOLDS, len(np.unique(groups)))
+    search = HalvingRandomSearchCV(
+        RandomForestClassifier(random_state=42),
+        PARAM_SPACE,
+        n_candidates=n_candidates,
+        resource='n_estimators',
+        min_resources=MIN_TREES,
+        max_resources=MAX_TREES,
+        factor=3,
+        cv=GroupKFold(n_splits=n_splits),
+        scoring='balanced_accuracy',
+        random_state=42,
+        n_jobs=n_jobs,
+    )
+    with warnings.catch_warnings():
+        # A held-out borough often has no areas of some class; that's expected here
+        warnings.filterwarnings('ignore', message='y_pred contains classes not in y_true')
+        search.fit(X, y, groups=groups)
+    return search
+
+parser = argparse.ArgumentParser(description="Train the atmosphere model with a cross-validated search")
+parser.add_argument("--candidates", type=int, default=27,
+                    help="Hyperparameter settings to start the search with")
+parser.add_argument("--jobs", type=int, default=-1,
+                    help="Parallel fits (-1 = all cores)")
+args = parser.parse_args()
 
 print("=" * 60)
 print("🤖 CITYSENSE ML MODEL TRAINING")
 print("=" * 60)
 
 # Load data
-data = pd.read_csv("data/processed/combined_features.csv")
+with instrumentation.stage('load'):
+    data = load_table('combined_features')
+
+instrumentation.count('areas', len(data))
 
 print(f"\n📊 Dataset: {len(data)} neighborhoods")
 print(f"📋 Features: {data.shape[1]} columns\n")
@@ -30,21 +96,40 @@ print("🎯 Target distribution:")
 print(y.value_counts())
 print()
 
-# Normalize features
+# Normalize features once; every CV fit reuses this matrix. Trees only
+# compare values within a feature, so scaling before splitting leaks nothing
 scaler = StandardScaler()
 X_scaled = scaler.fit_transform(X)
 
-# Train Random Forest (works better with small datasets)
-print("🔬 Training Random Forest model...\n")
-
-model = RandomForestClassifier(
-    n_estimators=100, 
-    max_depth=3, 
-    random_state=42,
-    min_samples_split=2
-)
-
-model.fit(X_scaled, y)
+groups, grouping = cv_groups(data)
+n_groups = len(np.unique(groups))
+
+if n_groups >= 2:
+    print(f"🔬 Searching Random Forest settings ({args.candidates} candidates, "
+          f"{min(CV_FOLDS, n_groups)}-fold CV grouped by {grouping})...\n")
+    start = time.perf_counter()
+    with instrumentation.stage('search'):
+        search = search_model(X_scaled, y, groups, args.candidates, args.jobs)
+    instrumentation.count('cv_fits', len(search.cv_results_['params']) * search.n_splits_)
+
+    spread = search.cv_results_['std_test_score'][search.best_index_]
+    print(f"  {search.n_iterations_} halving rounds, "
+          f"{len(search.cv_results_['params'])} fits x {search.n_splits_} folds "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"  Best: {search.best_params_}")
+    print(f"  Held-out balanced accuracy: {search.best_score_:.1%} ± {spread:.1%}\n")
+    model = search.best_estimator_
+    cv_metrics = {'cv_balanced_accuracy': round(float(search.best_score_), 4),
+                  'cv_grouping': grouping, 'cv_folds': int(search.n_splits_),
+                  'params': {k: v for k, v in model.get_params().items()
+                             if k in PARAM_SPACE or k == 'n_estimators'}}
+else:
+    # Every area is in one group: nothing to hold out, keep the old fixed settings
+    print(f"⚠️  All areas share one {grouping} group, skipping the CV search\n")
+    model = RandomForestClassifier(n_estimators=100, max_depth=3, random_state=42)
+    with instrumentation.stage('train'):
+        model.fit(X_scaled, y)
+    cv_metrics = {}
 
 # Feature importance
 importances = pd.DataFrame({
@@ -58,7 +143,8 @@ for idx, row in importances.head(5).iterrows():
     print(f"  {row['feature']:25s} {bar} {row['importance']:.3f}")
 
 # Make predictions on training data
-predictions = model.predict(X_scaled)
+with instrumentation.stage('predict'):
+    predictions = model.predict(X_scaled)
 data['predicted_category'] = predictions
 
 # Show results
@@ -88,19 +174,23 @@ for i, row in data.iterrows():
         bar = "█" * int(prob * 30)
         print(f"    {class_name:8s} {bar} {prob:.1%}")
 
-# Save everything
-import os
-os.makedirs("models", exist_ok=True)
+# Save everything: model, scaler and schema go into one versioned bundle
+metrics = {
+    'training_accuracy': accuracy,
+    **cv_metrics,
+    'neighborhoods': len(data),
+    'class_counts': {str(k): int(v) for k, v in y.value_counts().items()},
+    'feature_importances': dict(zip(feature_cols, model.feature_importances_.round(4).tolist())),
+}
 
-joblib.dump(model, "models/atmosphere_model.pkl")
-joblib.dump(scaler, "models/scaler.pkl")
-joblib.dump(feature_cols, "models/feature_columns.pkl")
-data.to_csv("data/processed/predictions.csv", index=False)
+with instrumentation.stage('save'):
+    version = save_bundle(model, scaler, feature_cols, training_data=data[feature_cols + ['category']],
+                          metrics=metrics)
+    predictions_path = save_table(data, 'predictions')
 
 print("\n💾 Saved:")
-print("  • models/atmosphere_model.pkl")
-print("  • models/scaler.pkl")
-print("  • data/processed/predictions.csv")
+print(f"  • {BUNDLE_PATH} (version {version})")
+print(f"  • {predictions_path}")
 
 print("\n" + "=" * 60)
 print("🎉 MODEL TRAINING COMPLETE!")
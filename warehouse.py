@@ -0,0 +1,316 @@
+# warehouse.py - Optional SQLite complaint warehouse with an R*Tree on coordinates and time
+# Usage: python warehouse.py ingest [--db PATH]
+#        python warehouse.py query --bbox LAT0,LON0,LAT1,LON1 [--since DATE] [--until DATE] [--type TYPE ...]
+"""Complaint warehouse: one local SQLite file (stdlib, no server).
+
+  complaints           unique_key TEXT PRIMARY KEY, so re-ingesting a page
+                       replaces rows instead of duplicating them; B-tree
+                       indexes on created_date and complaint_type
+  complaint_locations  R*Tree over (latitude, longitude, created time),
+                       kept in step with complaints by triggers
+  ingested_files       complaint / retraction part files already loaded
+
+`ingest` loads only the complaint part files that are new since the last
+run, in append order and executemany batches in WAL mode, then applies
+complaint_retractions; if the table was rewritten it reloads everything.
+Bounding-box queries (with or without a time range) are one R*Tree search
+and time-only ones use the created_date index, so they read only the
+matching rows. AreaCounts answers extract_311_features.py --warehouse from it, and
+create_map.py --warehouse draws the complaints of a box and time range.
+"""
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import instrumentation
+from complaint_grid import load_retractions
+from spatial import KM_PER_DEG_LAT, KM_PER_DEG_LON, project_km
+from storage import load_table, table_files
+
+WAREHOUSE_PATH = os.environ.get('CITYSENSE_WAREHOUSE', 'data/warehouse.sqlite')
+
+# Rows per executemany call (and per transaction)
+BATCH_ROWS = 100_000
+
+# R*Tree time unit. The tree splits nodes by extent, so time needs a scale
+# comparable to the degrees of a city: in seconds a box query with no time
+# range visits ~50x more nodes
+TIME_UNIT = 7 * 86400   # a week
+
+COLUMNS = ['unique_key', 'created_date', 'complaint_type', 'borough', 'latitude', 'longitude']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS complaints (
+    unique_key TEXT PRIMARY KEY,
+    created_date TEXT,
+    complaint_type TEXT,
+    borough TEXT,
+    latitude REAL,
+    longitude REAL
+);
+CREATE INDEX IF NOT EXISTS complaints_created_date ON complaints (created_date);
+CREATE INDEX IF NOT EXISTS complaints_complaint_type ON complaints (complaint_type);
+
+-- Time is in TIME_UNITs since the epoch (0 when created_date is missing).
+-- With it in the tree a box + time range is a single search; SQLite can't
+-- tell how selective a date range is and would otherwise scan the
+-- created_date index
+CREATE VIRTUAL TABLE IF NOT EXISTS complaint_locations
+USING rtree (id, min_lat, max_lat, min_lon, max_lon, min_time, max_time);
+
+CREATE TRIGGER IF NOT EXISTS complaints_locate AFTER INSERT ON complaints
+WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+BEGIN
+    INSERT INTO complaint_locations VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude,
+                                            coalesce(strftime('%s', new.created_date) / {TIME_UNIT}.0, 0),
+                                            coalesce(strftime('%s', new.created_date) / {TIME_UNIT}.0, 0));
+END;
+CREATE TRIGGER IF NOT EXISTS complaints_relocate AFTER UPDATE OF latitude, longitude, created_date ON complaints
+WHEN old.latitude IS NOT new.latitude OR old.longitude IS NOT new.longitude
+     OR old.created_date IS NOT new.created_date
+BEGIN
+    DELETE FROM complaint_locations WHERE id = old.rowid;
+    INSERT INTO complaint_locations
+    SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude,
+           coalesce(strftime('%s', new.created_date) / {TIME_UNIT}.0, 0),
+           coalesce(strftime('%s', new.created_date) / {TIME_UNIT}.0, 0)
+    WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS complaints_unlocate AFTER DELETE ON complaints
+BEGIN
+    DELETE FROM complaint_locations WHERE id = old.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+"""
+
+# Re-ingested rows that haven't changed are left alone (no write, no R*Tree churn)
+UPSERT = f"""
+INSERT INTO complaints ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})
+ON CONFLICT (unique_key) DO UPDATE SET
+    {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}
+WHERE ({', '.join(COLUMNS[1:])}) IS NOT ({', '.join(f'excluded.{c}' for c in COLUMNS[1:])})
+"""
+
+def connect(path=WAREHOUSE_PATH):
+    """Open (creating if needed) the warehouse in WAL mode"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # With WAL, NORMAL only syncs at checkpoints; a crash can lose the last
+    # batches but never corrupts the file, and ingest is idempotent anyway
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -262144")   # 256 MB
+    conn.executescript(SCHEMA)
+    return conn
+
+def to_text(timestamps):
+    """created_date values as the ISO text stored in the warehouse (None for missing)"""
+    text = pd.to_datetime(timestamps).to_numpy().astype('datetime64[s]').astype(str)
+    return np.where(text == 'NaT', None, text)
+
+def ingest_frame(conn, complaints):
+    """Upsert complaint rows (NaN coordinates are stored as NULL); returns the row count"""
+    columns = [complaints['unique_key'].astype(str).tolist(),
+               to_text(complaints['created_date']).tolist(),
+               complaints['complaint_type'].astype(object).tolist(),
+               complaints['borough'].astype(object).tolist(),
+               complaints['latitude'].astype(float).tolist(),
+               complaints['longitude'].astype(float).tolist()]
+    rows = list(zip(*columns))
+    for start in range(0, len(rows), BATCH_ROWS):
+        with conn:
+            conn.executemany(UPSERT, rows[start:start + BATCH_ROWS])
+    return len(rows)
+
+def retract(conn, unique_keys):
+    """Delete complaints by unique_key (their R*Tree entries go with them)"""
+    with conn:
+        conn.executemany("DELETE FROM complaints WHERE unique_key = ?", [(str(k),) for k in unique_keys])
+
+def ingested_files(conn):
+    """{file: [size, mtime_ns]} of the complaint / retraction part files already loaded"""
+    return {path: [size, mtime_ns] for path, size, mtime_ns in conn.execute("SELECT * FROM ingested_files")}
+
+def mark_ingested(conn, files):
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?)",
+                         [(path, size, mtime_ns) for path, (size, mtime_ns) in files.items()])
+
+def reset(conn):
+    """Empty the warehouse (dropping the tables is much faster than deleting 10M rows through the triggers)"""
+    conn.executescript("""
+        DROP TABLE IF EXISTS complaints;
+        DROP TABLE IF EXISTS complaint_locations;
+        DELETE FROM ingested_files;
+    """)
+    conn.executescript(SCHEMA)
+
+def ingest(conn):
+    """Bring the warehouse up to date with the complaint table; returns (rows, retracted).
+
+    New part files are upserted in append order (table_files), so a fix
+    wins over the version it replaces whatever partition it landed in.
+    Then the retractions are applied: all of them when complaints were
+    added (a newer file may bring a retracted key back), else only the new
+    ones. A loaded file that changed or went away means the table was
+    rewritten, so the warehouse is emptied and reloaded rather than keep
+    rows that are no longer there.
+    """
+    files, retraction_files = table_files('complaints'), table_files('complaint_retractions')
+    known = ingested_files(conn)
+    current = {**files, **retraction_files}
+    rewritten = [path for path, stat in known.items() if current.get(path) != stat]
+    if rewritten:
+        print(f"⚠️  {len(rewritten)} loaded file(s) changed or went away since the last run: reloading")
+        reset(conn)
+        known = {}
+
+    new_files = {path: stat for path, stat in files.items() if path not in known}
+    new_retraction_files = {path: stat for path, stat in retraction_files.items() if path not in known}
+    rows = 0
+    for path, stat in new_files.items():
+        with instrumentation.stage('load'):
+            complaints = load_table('complaints', columns=COLUMNS, files={path: stat})
+        with instrumentation.stage('insert'):
+            rows += ingest_frame(conn, complaints)
+    with instrumentation.stage('retract'):
+        retracted = load_retractions(None if new_files else new_retraction_files)
+        retract(conn, retracted)
+    # Only now: a run cut short loads the same files again, and upserts are idempotent
+    mark_ingested(conn, {**new_files, **new_retraction_files})
+    instrumentation.count('complaints', rows)
+    return rows, len(retracted)
+
+def _filters(since=None, until=None, types=None):
+    """SQL conditions and parameters for a created_date range [since, until) and complaint types"""
+    sql, params = [], []
+    if since is not None:
+        sql.append("c.created_date >= ?")
+        params.append(to_text([since])[0])
+    if until is not None:
+        sql.append("c.created_date < ?")
+        params.append(to_text([until])[0])
+    if types:
+        sql.append(f"c.complaint_type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+    return sql, params
+
+def _tree_time(timestamp):
+    return pd.Timestamp(timestamp).timestamp() / TIME_UNIT
+
+def query(conn, bbox=None, since=None, until=None, types=None, columns=COLUMNS):
+    """Complaints in a (lat0, lon0, lat1, lon1) box and/or time range [since, until), as a DataFrame"""
+    sql, params = _filters(since, until, types)
+    tables = "complaints c"
+    if bbox is not None:
+        lat0, lon0, lat1, lon1 = bbox
+        # CROSS JOIN keeps the R*Tree as the outer loop. It stores 32-bit floats
+        # rounded outward, so it's searched for overlap and the exact values
+        # are checked on the rows it returns
+        tables = "complaint_locations r CROSS JOIN complaints c ON c.rowid = r.id"
+        tree = ["r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?"]
+        tree_params = [lat0, lat1, lon0, lon1]
+        if since is not None:
+            tree.append("r.max_time >= ?")
+            tree_params.append(_tree_time(since))
+        if until is not None:
+            tree.append("r.min_time < ?")
+            tree_params.append(_tree_time(until))
+        sql = tree + ["c.latitude BETWEEN ? AND ? AND c.longitude BETWEEN ? AND ?"] + sql
+        params = tree_params + [lat0, lat1, lon0, lon1] + params
+    where = f" WHERE {' AND '.join(sql)}" if sql else ""
+    return pd.read_sql_query(f"SELECT {', '.join('c.' + c for c in columns)} FROM {tables}{where}",
+                             conn, params=params)
+
+def _area_counts(area, rows):
+    """complaint_grid.AREA_COUNT_COLUMNS counts from matched rows and the area each matched"""
+    months = pd.to_datetime(rows['created_date']).to_numpy().astype('datetime64[M]').astype('datetime64[s]')
+    matched = pd.DataFrame({'area': area, 'complaint_type': rows['complaint_type'].to_numpy(),
+                            'borough': rows['borough'].to_numpy(), 'month': months})
+    return (matched.groupby(['area', 'complaint_type', 'borough', 'month'], dropna=False)
+                   .size().rename('count').reset_index())
+
+class AreaCounts:
+    """Per-area counts straight from the warehouse.
+
+    Answers the same radius_counts / polygon_counts calls as
+    complaint_grid.ComplaintGrid (complaint_grid.AREA_COUNT_COLUMNS rows),
+    with exact point tests and creation times limited to [since, until).
+    """
+
+    COLUMNS = ['created_date', 'complaint_type', 'borough', 'latitude', 'longitude']
+
+    def __init__(self, conn, since=None, until=None):
+        self.conn, self.since, self.until = conn, since, until
+
+    def _counts(self, shapes, rows_in):
+        """Counts from rows_in(shape) → (bbox, keep(rows)) for each shape"""
+        areas, parts = [], []
+        for a, shape in enumerate(shapes):
+            bbox, keep = rows_in(shape)
+            rows = query(self.conn, bbox, self.since, self.until, columns=self.COLUMNS)
+            rows = rows[keep(rows)]
+            areas.append(np.full(len(rows), a))
+            parts.append(rows)
+        return _area_counts(np.concatenate(areas), pd.concat(parts, ignore_index=True))
+
+    def radius_counts(self, lats, lons, radius_km):
+        dlat, dlon = radius_km / KM_PER_DEG_LAT, radius_km / KM_PER_DEG_LON
+
+        def rows_in(center):
+            lat, lon = center
+            origin = project_km(np.array([lat]), np.array([lon]))[0]
+            return ((lat - dlat, lon - dlon, lat + dlat, lon + dlon),
+                    lambda rows: np.hypot(*(project_km(rows['latitude'].to_numpy(np.float64),
+                                                       rows['longitude'].to_numpy(np.float64)) - origin).T)
+                                 <= radius_km)
+
+        return self._counts(list(zip(lats, lons)), rows_in)
+
+    def polygon_counts(self, geoms):
+        import shapely
+
+        def rows_in(geom):
+            lon0, lat0, lon1, lat1 = geom.bounds
+            return ((lat0, lon0, lat1, lon1),
+                    lambda rows: shapely.contains_xy(geom, rows['longitude'].to_numpy(np.float64),
+                                                     rows['latitude'].to_numpy(np.float64)))
+
+        return self._counts(geoms, rows_in)
+
+def parse_bbox(text):
+    """'lat0,lon0,lat1,lon1' → tuple of floats"""
+    values = tuple(float(v) for v in text.split(','))
+    if len(values) != 4:
+        raise ValueError(f"Expected lat0,lon0,lat1,lon1, got {text!r}")
+    return values
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Optional SQLite complaint warehouse")
+    parser.add_argument("command", choices=['ingest', 'query'])
+    parser.add_argument("--db", default=WAREHOUSE_PATH, help="Warehouse file")
+    parser.add_argument("--bbox", type=parse_bbox, help="lat0,lon0,lat1,lon1")
+    parser.add_argument("--since", help="Only complaints created on or after this time")
+    parser.add_argument("--until", help="Only complaints created before this time")
+    parser.add_argument("--type", action="append", dest="types", help="Complaint type (repeatable)")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == 'ingest':
+        rows, retracted = ingest(conn)
+        total, = conn.execute("SELECT COUNT(*) FROM complaints").fetchone()
+        print(f"🏛️  Ingested {rows:,} rows and {retracted:,} retractions: {total:,} complaints in {args.db}")
+    else:
+        start = time.perf_counter()
+        result = query(conn, args.bbox, args.since, args.until, args.types)
+        print(result)
+        print(f"\n✓ {len(result):,} complaints in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print("\n✅ Done!")